@@ -1,8 +1,6 @@
 # app/__init__.py
 import os
 from flask import Flask
-from datetime import datetime
-import pytz
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
@@ -19,36 +17,39 @@ migrate = Migrate()
 login_manager = LoginManager()
 csrf = CSRFProtect()
 
-def create_app(config_class='config.Config'):
-    app = Flask(__name__, instance_relative_config=True)
+def create_app(config_class='config.Config', instance_path=None):
+    # `instance_path` permite aislar la carpeta instance (benchmarks y pruebas)
+    app = Flask(__name__, instance_path=instance_path, instance_relative_config=True)
     app.config.from_object(config_class)
-    # --- AÑADIR ESTA SECCIÓN PARA EL FILTRO ---
-    
-    # Cargar la zona horaria desde la configuración
-    try:
-        local_tz = pytz.timezone(app.config.get('LOCAL_TIMEZONE', 'UTC'))
-    except pytz.UnknownTimeZoneError:
-        print(f"ADVERTENCIA: Zona horaria '{app.config.get('LOCAL_TIMEZONE')}' no reconocida. Usando UTC por defecto.")
-        local_tz = pytz.utc
 
-    @app.template_filter('localtime')
-    def localtime_filter(utc_dt):
-        if not isinstance(utc_dt, datetime):
-            return utc_dt # Devuelve el valor original si no es un objeto datetime
-        
-        # 1. Asignar la zona horaria UTC al objeto datetime (ya que viene "naive" de la DB)
-        utc_dt = pytz.utc.localize(utc_dt)
-        # 2. Convertir a la zona horaria local
-        local_dt = utc_dt.astimezone(local_tz)
-        return local_dt
+    # Filtro 'localtime' para las plantillas (zona horaria cacheada en app/tz.py)
+    from . import tz
+    tz.init_app(app)
+
+    # Modo de envío de archivos protegidos (X-Sendfile / X-Accel-Redirect)
+    from . import sendfile
+    sendfile.init_app(app)
 
-    # --- FIN DE LA SECCIÓN DEL FILTRO ---
     # Asegurarse que la carpeta 'instance' exista
     try:
         os.makedirs(app.instance_path)
     except OSError:
         pass
 
+    # Límite de subida propio del ZIP de fotos; debe ir antes de csrf.init_app
+    from . import photos
+    photos.init_app(app)
+
+    # Sedes (una base de datos por sede); debe ir antes de db.init_app
+    from . import campus
+    campus.init_app(app)
+    # Réplica de solo lectura opcional (SQLALCHEMY_REPLICA_URL)
+    from . import replica
+    replica.init_app(app)
+    # Driver y pool de conexiones para workers gevent (después de registrar los binds)
+    from . import concurrency
+    concurrency.init_app(app)
+
     # Inicializar extensiones
     db.init_app(app)
     migrate.init_app(app, db)
@@ -62,7 +63,12 @@ def create_app(config_class='config.Config'):
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        user_campus, _, raw_id = user_id.rpartition(':')
+        if (user_campus or None) != campus.current_campus():
+            return None # Sesión emitida por otra sede
+        user = User.query.get(int(raw_id))
+        # Un usuario deshabilitado pierde también las sesiones ya abiertas
+        return user if user is not None and user.is_active else None
 
     with app.app_context():
         from . import routes
@@ -73,4 +79,7 @@ def create_app(config_class='config.Config'):
         from . import commands
         commands.init_app(app)
 
+        from . import assets
+        assets.init_app(app)
+
     return app
\ No newline at end of file
@@ -0,0 +1,196 @@
+# app/assets.py
+"""
+Pipeline de assets estáticos: librerías vendorizadas, nombres con hash de
+contenido y precompresión gzip/brotli.
+
+Flujo de despliegue:
+    flask assets-vendor   # descarga las librerías de terceros a static/vendor
+    flask assets-build    # genera static/dist con hashes + manifest.json
+
+Las plantillas usan `asset_url('js/scanner.js')`, que resuelve la URL con hash
+si existe en el manifiesto y, si no, cae en la ruta estática normal (o en la CDN
+para librerías que aún no se han vendorizado).
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import urllib.request
+from functools import lru_cache
+from flask import current_app, url_for
+
+try:
+    import brotli  # Opcional: si no está instalado solo se genera .gz
+except ImportError:
+    brotli = None
+
+DIST_FOLDER = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Librerías de terceros con versión fijada: ruta local (relativa a static) -> URL de origen
+VENDOR_ASSETS = {
+    'vendor/tailwindcss.js': 'https://cdn.tailwindcss.com/3.4.16',
+    'vendor/html5-qrcode.min.js': 'https://unpkg.com/html5-qrcode@2.3.8/html5-qrcode.min.js',
+    'vendor/alpine.min.js': 'https://unpkg.com/alpinejs@3.14.9/dist/cdn.min.js',
+}
+
+# Carpetas (relativas a static) que se publican con hash
+BUILD_SOURCES = ['js', 'audio', 'img', 'vendor']
+
+# Extensiones que vale la pena precomprimir
+COMPRESSIBLE = ('.js', '.css', '.json', '.svg', '.html', '.txt')
+
+# Assets que el service worker guarda para funcionar sin conexión (templates/sw.js)
+PRECACHE_ASSETS = [
+    'js/scanner.js',
+    'audio/success.mp3',
+    'audio/error.mp3',
+    'vendor/tailwindcss.js',
+    'vendor/html5-qrcode.min.js',
+    'vendor/alpine.min.js',
+]
+
+_manifest = None
+
+
+def _static_path(*parts):
+    return os.path.join(current_app.static_folder, *parts)
+
+
+def _digest(content):
+    return hashlib.sha256(content).hexdigest()[:10]
+
+
+@lru_cache(maxsize=256)
+def _file_digest(path, mtime_ns, size):
+    with open(path, 'rb') as fh:
+        return _digest(fh.read())
+
+
+def _source_digest(path):
+    """Hash del contenido actual de un asset en static, o None si no existe."""
+    full_path = _static_path(path)
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        return None
+    return _file_digest(full_path, stat.st_mtime_ns, stat.st_size)
+
+
+def load_manifest(reload=False):
+    """
+    Carga (una vez por proceso) el manifiesto ruta lógica -> ruta con hash.
+    Las entradas cuyo archivo cambió desde el último `flask assets-build` se
+    descartan: ese asset se sirve sin hash en lugar de servir la versión vieja.
+    """
+    global _manifest
+    if _manifest is None or reload:
+        path = _static_path(DIST_FOLDER, MANIFEST_NAME)
+        try:
+            with open(path, encoding='utf-8') as fh:
+                manifest = json.load(fh)
+        except (OSError, ValueError):
+            manifest = {}
+        _manifest = {
+            logical: hashed for logical, hashed in manifest.items()
+            if hashed == _hashed_name(logical, _source_digest(logical))
+        }
+        stale = sorted(set(manifest) - set(_manifest))
+        if stale:
+            current_app.logger.warning(
+                'Assets modificados después de `flask assets-build` (se sirven sin hash): %s', ', '.join(stale)
+            )
+    return _manifest
+
+
+def asset_url(path):
+    """Devuelve la URL de un asset, con hash y caché inmutable cuando está construido."""
+    hashed = load_manifest().get(path)
+    if hashed:
+        return url_for('routes.hashed_asset', filename=hashed)
+    if path in VENDOR_ASSETS and not os.path.isfile(_static_path(path)):
+        return VENDOR_ASSETS[path]
+    return url_for('static', filename=path)
+
+
+def vendor_assets(force=False):
+    """Descarga las librerías de terceros a static/vendor. Devuelve las rutas descargadas."""
+    downloaded = []
+    for path, source_url in VENDOR_ASSETS.items():
+        target = _static_path(path)
+        if os.path.isfile(target) and not force:
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with urllib.request.urlopen(source_url, timeout=30) as response:
+            content = response.read()
+        with open(target, 'wb') as fh:
+            fh.write(content)
+        downloaded.append(path)
+    return downloaded
+
+
+def _hashed_name(path, digest):
+    root, ext = os.path.splitext(path)
+    return f'{root}.{digest}{ext}'
+
+
+def build_assets():
+    """
+    Copia los assets a static/dist con el hash del contenido en el nombre,
+    genera las variantes .gz/.br y escribe el manifiesto.
+    """
+    dist_dir = _static_path(DIST_FOLDER)
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+    os.makedirs(dist_dir)
+
+    manifest = {}
+    for folder in BUILD_SOURCES:
+        source_dir = _static_path(folder)
+        if not os.path.isdir(source_dir):
+            continue
+        for root, dirs, files in os.walk(source_dir):
+            for filename in sorted(files):
+                if filename.startswith('.'):
+                    continue
+                source = os.path.join(root, filename)
+                logical = os.path.relpath(source, current_app.static_folder).replace(os.sep, '/')
+                with open(source, 'rb') as fh:
+                    content = fh.read()
+
+                hashed = _hashed_name(logical, _digest(content))
+                target = os.path.join(dist_dir, hashed)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, 'wb') as fh:
+                    fh.write(content)
+
+                if filename.endswith(COMPRESSIBLE):
+                    with open(target + '.gz', 'wb') as fh:
+                        fh.write(gzip.compress(content, compresslevel=9, mtime=0))
+                    if brotli is not None:
+                        with open(target + '.br', 'wb') as fh:
+                            fh.write(brotli.compress(content))
+                manifest[logical] = hashed
+
+    with open(os.path.join(dist_dir, MANIFEST_NAME), 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+    load_manifest(reload=True)
+    return manifest
+
+
+def precache_version():
+    """
+    Versión del caché del service worker: hash de las URLs y del contenido de
+    los assets precacheados. Cambia con cualquier cambio en esos archivos,
+    se haya ejecutado `flask assets-build` o no.
+    """
+    version = hashlib.sha256()
+    for path in PRECACHE_ASSETS:
+        version.update(f'{path}:{asset_url(path)}:{_source_digest(path)}\n'.encode('utf-8'))
+    return version.hexdigest()[:10]
+
+
+def init_app(app):
+    """Expone `asset_url` en las plantillas."""
+    app.jinja_env.globals['asset_url'] = asset_url
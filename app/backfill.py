@@ -0,0 +1,271 @@
+# app/backfill.py
+"""
+Carga masiva de salidas históricas (migración desde papel u hojas de cálculo).
+
+Columnas del archivo (CSV o XLSX):
+- `student_id` o `student` (nombre completo del estudiante)
+- `timestamp`  fecha y hora *local* de la salida
+- `door`       nombre (o id) de la puerta
+- `operator`   usuario que registró la salida (opcional: se usa el operador por defecto)
+- `course`     curso en ese momento (opcional: se toma el actual del estudiante)
+
+Estudiantes, puertas y usuarios se precargan con una consulta por tabla y todo
+el archivo se valida con operaciones vectorizadas de pandas. Las filas válidas
+se insertan en lotes con un único INSERT de varias filas (executemany).
+
+Tras cada lote se guarda un punto de control (última fila del archivo
+insertada) en `instance/backfill/`, indexado por el hash del archivo: si la
+carga se interrumpe, volver a lanzarla con el mismo archivo continúa donde
+quedó. Además, las salidas que ya existen (mismo estudiante y misma hora) se
+omiten, así que repetir una carga es inofensivo.
+"""
+import hashlib
+import io
+import json
+import os
+import pandas as pd
+from flask import current_app
+from sqlalchemy import insert
+from .models import db, Student, Exit, Door, User
+from . import tz
+
+BATCH_SIZE = 5000
+# Máximo de errores detallados que se devuelven (el total se cuenta siempre)
+MAX_REPORTED_ERRORS = 50
+
+
+def _noop(percent, message=None):
+    pass
+
+
+def read_file(path_or_file, filename=None):
+    """Lee un CSV o XLSX como texto (los IDs y nombres no se convierten)."""
+    name = (filename or getattr(path_or_file, 'filename', None) or str(path_or_file)).lower()
+    if name.endswith('.csv'):
+        return pd.read_csv(path_or_file, dtype=str, keep_default_na=False)
+    return pd.read_excel(path_or_file, dtype=str, keep_default_na=False)
+
+
+def read_upload(data, filename):
+    """(DataFrame, hash) de un archivo subido, ya leído en memoria."""
+    return read_file(io.BytesIO(data), filename), hashlib.sha256(data).hexdigest()
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _checkpoint_path(digest):
+    return os.path.join(current_app.instance_path, 'backfill', f'{digest}.json')
+
+
+def load_checkpoint(digest):
+    try:
+        with open(_checkpoint_path(digest), encoding='utf-8') as fh:
+            return json.load(fh).get('last_row', -1)
+    except (OSError, ValueError):
+        return -1
+
+
+def save_checkpoint(digest, last_row):
+    path = _checkpoint_path(digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump({'last_row': last_row}, fh)
+    os.replace(tmp_path, path)
+
+
+def clear_checkpoint(digest):
+    try:
+        os.unlink(_checkpoint_path(digest))
+    except OSError:
+        pass
+
+
+def _normalize(series):
+    return series.astype(str).str.strip().str.lower()
+
+
+def _lookups():
+    """Una consulta por tabla: estudiantes (también eliminados), puertas y usuarios."""
+    students = pd.DataFrame(
+        db.session.query(Student.id, Student.name, Student.course).all(),
+        columns=['id', 'name', 'course'],
+    )
+    doors = {name.strip().lower(): id for id, name in db.session.query(Door.id, Door.name)}
+    doors.update({str(id): id for id in doors.values()})
+    users = {username.strip().lower(): id for id, username in db.session.query(User.id, User.username)}
+    return students, doors, users
+
+
+def prepare(df, default_operator_id=None):
+    """
+    Valida el archivo completo. Devuelve (filas_listas, errores, total_errores),
+    donde `filas_listas` es un DataFrame con las columnas de `exits`.
+    """
+    df = df.rename(columns=lambda c: str(c).strip().lower())
+    missing = [c for c in ('timestamp', 'door') if c not in df.columns]
+    if 'student_id' not in df.columns and 'student' not in df.columns:
+        missing.insert(0, 'student_id (o student)')
+    if 'operator' not in df.columns and default_operator_id is None:
+        missing.append('operator')
+    if missing:
+        raise ValueError(f'Faltan columnas en el archivo: {", ".join(missing)}')
+
+    students, doors, users = _lookups()
+    problems = pd.Series('', index=df.index)
+
+    # Estudiante: por ID o por nombre (los nombres repetidos son ambiguos)
+    student_id = pd.Series(pd.NA, index=df.index, dtype='Int64')
+    if 'student_id' in df.columns:
+        student_id = pd.to_numeric(df['student_id'].str.strip(), errors='coerce').astype('Int64')
+    if 'student' in df.columns:
+        names = students.assign(key=_normalize(students['name']))
+        unique = names.drop_duplicates('key', keep=False).set_index('key')['id']
+        by_name = _normalize(df['student']).map(unique).astype('Int64')
+        ambiguous = _normalize(df['student']).isin(names.loc[names['key'].duplicated(), 'key'])
+        problems = problems.where(~(student_id.isna() & ambiguous), 'nombre de estudiante repetido')
+        student_id = student_id.fillna(by_name)
+    known = student_id.isin(students['id'])
+    problems = problems.where(problems.ne('') | known.fillna(False).astype(bool), 'estudiante no encontrado')
+
+    timestamp = tz.local_series_to_utc(df['timestamp'].str.strip())
+    problems = problems.where(problems.ne('') | timestamp.notna(), 'fecha/hora inválida')
+
+    door_id = _normalize(df['door']).map(doors)
+    problems = problems.where(problems.ne('') | door_id.notna(), 'puerta no encontrada')
+
+    if 'operator' in df.columns:
+        given = df['operator'].str.strip().ne('')
+        operator_id = _normalize(df['operator']).map(users)
+        problems = problems.where(problems.ne('') | operator_id.notna() | ~given, 'operador no encontrado')
+        operator_id = operator_id.where(given, default_operator_id)
+    else:
+        operator_id = pd.Series(default_operator_id, index=df.index)
+    problems = problems.where(problems.ne('') | operator_id.notna(), 'falta el operador')
+
+    valid = problems.eq('')
+    info = students.set_index('id')
+    ready = pd.DataFrame({
+        'student_id': student_id[valid].astype(int),
+        'timestamp': timestamp[valid],
+        'door_id': door_id[valid].astype(int),
+        'operator_id': operator_id[valid].astype(int),
+    })
+    ready['student_name'] = ready['student_id'].map(info['name'])
+    ready['course'] = ready['student_id'].map(info['course'])
+    if 'course' in df.columns:
+        given_course = df.loc[valid, 'course'].str.strip()
+        ready['course'] = given_course.where(given_course.ne(''), ready['course'])
+
+    invalid = problems[~valid]
+    # +2: la fila 1 del archivo es la cabecera
+    errors = [(int(index) + 2, message) for index, message in invalid.head(MAX_REPORTED_ERRORS).items()]
+    return ready, errors, len(invalid)
+
+
+def _existing_keys(ready):
+    """(student_id, timestamp) ya registrados en el rango de fechas del archivo."""
+    if ready.empty:
+        return set()
+    query = db.session.query(Exit.student_id, Exit.timestamp).filter(
+        Exit.timestamp >= ready['timestamp'].min().to_pydatetime(),
+        Exit.timestamp <= ready['timestamp'].max().to_pydatetime(),
+    )
+    student_ids = ready['student_id'].unique()
+    if len(student_ids) <= 1000:
+        query = query.filter(Exit.student_id.in_([int(i) for i in student_ids]))
+    return {(student_id, pd.Timestamp(ts)) for student_id, ts in query}
+
+
+def import_exits(df, digest=None, default_operator_id=None, dry_run=False, restart=False,
+                 batch_size=BATCH_SIZE, progress=_noop):
+    """
+    Valida e inserta las salidas de `df`. Con `digest` (hash del archivo) guarda
+    y retoma puntos de control. Devuelve un resumen con los contadores y errores.
+    """
+    progress(5, 'Validando archivo...')
+    ready, errors, error_count = prepare(df, default_operator_id)
+    ready = ready.sort_index()
+
+    existing = _existing_keys(ready)
+    duplicated = pd.Series(
+        [key in existing for key in zip(ready['student_id'], ready['timestamp'])], index=ready.index, dtype=bool
+    ) | ready.duplicated(['student_id', 'timestamp'])
+    pending = ready[~duplicated]
+
+    summary = {
+        'total': len(df),
+        'valid': len(ready),
+        'duplicates': int(duplicated.sum()),
+        'error_count': error_count,
+        'errors': errors,
+        'inserted': 0,
+        'resumed_from': 0,
+        'dry_run': dry_run,
+    }
+    if dry_run:
+        progress(100, f"Validación: {len(pending)} salidas listas, {summary['duplicates']} ya existentes, {error_count} con errores.")
+        return summary
+
+    if digest and not restart:
+        # Las filas ya insertadas antes del corte aparecen además como duplicadas
+        last_row = load_checkpoint(digest)
+        if last_row >= 0:
+            summary['resumed_from'] = last_row + 2
+            pending = pending[pending.index > last_row]
+    elif digest:
+        clear_checkpoint(digest)
+
+    total = len(pending) or 1
+    for offset in range(0, len(pending), batch_size):
+        batch = pending.iloc[offset:offset + batch_size]
+        records = [
+            {
+                'student_id': int(row.student_id),
+                'student_name': row.student_name,
+                'course': row.course if isinstance(row.course, str) else None,
+                'door_id': int(row.door_id),
+                'timestamp': row.timestamp.to_pydatetime(),
+                'operator_id': int(row.operator_id),
+            }
+            for row in batch.itertuples(index=False)
+        ]
+        db.session.execute(insert(Exit), records)
+        db.session.commit()
+        summary['inserted'] += len(records)
+        if digest:
+            save_checkpoint(digest, int(batch.index[-1]))
+        progress(10 + int(85 * (offset + len(records)) / total),
+                 f'{offset + len(records)} de {len(pending)} salidas insertadas')
+
+    if digest:
+        clear_checkpoint(digest)
+    _refresh_cooldown()
+    progress(100, f"{summary['inserted']} salidas importadas, {summary['duplicates']} ya existentes, {error_count} con errores.")
+    return summary
+
+
+def summary_message(summary):
+    if summary['dry_run']:
+        head = f"Validación: {summary['valid'] - summary['duplicates']} salidas listas para importar"
+    else:
+        head = f"{summary['inserted']} salidas importadas"
+    message = f"{head}, {summary['duplicates']} ya existentes, {summary['error_count']} filas con errores."
+    if summary['errors']:
+        row, error = summary['errors'][0]
+        message += f' Primer error: fila {row}, {error}.'
+    return message
+
+
+def _refresh_cooldown():
+    # Salidas recientes en el archivo deben contar para el cooldown compartido
+    from .cooldown import get_table
+    table = get_table()
+    if table is not None:
+        table.rebuild_from_db()
@@ -0,0 +1,453 @@
+# app/benchmarks.py
+"""
+Micro-benchmarks de las rutas críticas.
+
+Cada escenario crea su propia base SQLite y carpeta instance temporales con
+`create_app` (así no toca los cachés de la instalación), siembra
+los datos que necesita y mide solo la operación de interés a través del
+cliente de pruebas de Flask. Los resultados (mediana en segundos) se comparan
+con una línea base guardada en JSON para detectar regresiones:
+
+    flask bench --save          # guarda la línea base
+    flask bench                 # compara y falla si algo es más lento
+
+`flask bench-load` es distinto: lanza escaneos concurrentes contra un servidor
+ya en marcha (p. ej. gunicorn con workers sync y luego gevent en la misma
+máquina) y mide el rendimiento real de extremo a extremo. `flask bench-logins`
+simula el cambio de turno: muchos inicios de sesión a la vez mientras otros
+escáneres siguen escaneando.
+"""
+import http.cookiejar
+import io
+import json
+import os
+import random
+import re
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta
+import pandas as pd
+
+# Diferencia mínima (segundos) para considerar una regresión y no ruido
+NOISE_FLOOR = 0.005
+
+
+def _bench_config(db_path, csrf=False):
+    import config
+
+    class BenchConfig(config.Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+        WTF_CSRF_ENABLED = csrf
+        TESTING = True
+        COOLDOWN_SHARED_TABLE = False
+        SCAN_RATE_LIMIT_ENABLED = False
+        MAX_CONTENT_LENGTH = 50 * 1024 * 1024
+
+    return BenchConfig
+
+
+class BenchContext:
+    """
+    App + cliente autenticado sobre una base SQLite desechable. Con `csrf=True`
+    la protección CSRF queda activa y el cliente no inicia sesión.
+    """
+
+    def __init__(self, csrf=False):
+        from . import create_app
+        from .models import db, User, Role, Door
+
+        self.tmpdir = tempfile.mkdtemp(prefix='exit-bench-')
+        self.app = create_app(_bench_config(os.path.join(self.tmpdir, 'bench.db'), csrf),
+                              instance_path=os.path.join(self.tmpdir, 'instance'))
+        self.db = db
+        with self.app.app_context():
+            db.create_all()
+            admin = User(username='bench-admin', role=Role.ADMIN)
+            admin.set_password('bench-admin')
+            db.session.add_all([admin, Door(name='Puerta A'), Door(name='Puerta B')])
+            db.session.commit()
+        self.client = self.app.test_client()
+        if not csrf:
+            self.client.post('/login', data={'username': 'bench-admin', 'password': 'bench-admin'})
+
+    def seed_students(self, count, authorized=True):
+        from .models import Student
+        with self.app.app_context():
+            self.db.session.bulk_insert_mappings(Student, [
+                {'id': i, 'name': f'Estudiante {i}', 'course': f'{i % 11 + 1}° {"AB"[i % 2]}',
+                 'authorized': authorized, 'created_at': datetime.utcnow(), 'updated_at': datetime.utcnow()}
+                for i in range(1, count + 1)
+            ])
+            self.db.session.commit()
+
+    def seed_exits(self, count, when=None):
+        from .models import Exit, User
+        when = when or datetime.utcnow()
+        with self.app.app_context():
+            operator_id = User.query.first().id
+            self.db.session.bulk_insert_mappings(Exit, [
+                {'student_id': i, 'student_name': f'Estudiante {i}', 'course': '5° A',
+                 'door_id': 1 + i % 2, 'operator_id': operator_id,
+                 'timestamp': when - timedelta(seconds=i)}
+                for i in range(1, count + 1)
+            ])
+            self.db.session.commit()
+
+    def close(self):
+        with self.app.app_context():
+            self.db.session.remove()
+            self.db.engine.dispose()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+
+def _students_xlsx(count):
+    df = pd.DataFrame({
+        'id': range(1, count + 1),
+        'name': [f'Estudiante {i}' for i in range(1, count + 1)],
+        'course': [f'{i % 11 + 1}° A' for i in range(1, count + 1)],
+        'authorized': [i % 2 for i in range(1, count + 1)],
+    })
+    output = io.BytesIO()
+    df.to_excel(output, index=False)
+    return output.getvalue()
+
+
+def _check(response, expected):
+    if response.status_code != expected:
+        raise AssertionError(f'Código HTTP {response.status_code}, se esperaba {expected}')
+
+
+# --- Escenarios ---
+# Cada escenario recibe un BenchContext y devuelve una función sin argumentos a medir.
+
+def scan_accepted(ctx):
+    ctx.seed_students(5000)
+    ids = iter(range(1, 5001))
+    return lambda: _check(ctx.client.post('/api/scan', json={'student_id': next(ids), 'door': 1}), 200)
+
+
+def scan_cooldown(ctx):
+    ctx.seed_students(100)
+    ctx.seed_exits(100)
+    return lambda: _check(ctx.client.post('/api/scan', json={'student_id': 1, 'door': 1}), 429)
+
+
+def scan_unauthorized(ctx):
+    ctx.seed_students(100, authorized=False)
+    return lambda: _check(ctx.client.post('/api/scan', json={'student_id': 1, 'door': 1}), 403)
+
+
+def scan_rate_limited(ctx):
+    # Coste de rechazar una ráfaga en el limitador (sin consultas a la DB)
+    ctx.seed_students(100)
+    ctx.app.config['SCAN_RATE_LIMIT_ENABLED'] = True
+    for _ in range(10):
+        ctx.client.post('/api/scan', json={'student_id': 1, 'door': 1})
+    return lambda: _check(ctx.client.post('/api/scan', json={'student_id': 1, 'door': 1}), 429)
+
+
+def _import(count):
+    def scenario(ctx):
+        payload = _students_xlsx(count)
+
+        def run():
+            data = {'file': (io.BytesIO(payload), 'estudiantes.xlsx')}
+            _check(ctx.client.post('/students/import', data=data, content_type='multipart/form-data'), 302)
+        return run
+    return scenario
+
+
+def daily_report_export(ctx):
+    ctx.seed_students(2000)
+    ctx.seed_exits(2000)
+    from .tz import today_local
+    with ctx.app.app_context():
+        today = today_local().isoformat()
+    return lambda: _check(ctx.client.post('/report', data={'report_date': today, 'export': 'true'}), 200)
+
+
+def generate_qrs(ctx):
+    ctx.seed_students(200)
+    return lambda: _check(ctx.client.get('/students/qrs'), 200)
+
+
+def student_qr_svg(ctx):
+    ctx.seed_students(200)
+    ids = iter(range(1, 201))
+    return lambda: _check(ctx.client.get(f'/students/{next(ids)}/qr.svg'), 200)
+
+
+def download_qr_codes_zip(ctx):
+    # Primera descarga tras un cambio del roster: sin ZIP en caché, se genera
+    from .tasks import qr_cache_dir
+    ctx.seed_students(50)
+    with ctx.app.app_context():
+        cache_dir = qr_cache_dir()
+
+    def run():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        _check(ctx.client.get('/students/qrs/download'), 200)
+    return run
+
+
+def download_qr_codes_zip_cached(ctx):
+    # Descargas siguientes: el ZIP ya está en disco (lo genera el calentamiento)
+    ctx.seed_students(50)
+    return lambda: _check(ctx.client.get('/students/qrs/download'), 200)
+
+
+def sync_photos(ctx):
+    # La lógica de `flask sync-photos`, en el contexto de la app del benchmark:
+    # invocar el comando desde `flask bench` reutilizaría el de la app configurada
+    from . import photos
+    ctx.seed_students(5000)
+
+    def run():
+        with ctx.app.app_context():
+            photos.sync_folder()
+    return run
+
+
+# nombre -> (escenario, muestras)
+SCENARIOS = {
+    'scan_accepted': (scan_accepted, 50),
+    'scan_cooldown': (scan_cooldown, 50),
+    'scan_unauthorized': (scan_unauthorized, 50),
+    'scan_rate_limited': (scan_rate_limited, 200),
+    'import_students_1k': (_import(1000), 3),
+    'import_students_10k': (_import(10000), 1),
+    'daily_report_export': (daily_report_export, 5),
+    'generate_qrs': (generate_qrs, 3),
+    'student_qr_svg': (student_qr_svg, 100),
+    'download_qr_codes_zip': (download_qr_codes_zip, 3),
+    'download_qr_codes_zip_cached': (download_qr_codes_zip_cached, 20),
+    'sync_photos': (sync_photos, 5),
+}
+
+
+def run_scenario(name, samples=None):
+    """Ejecuta un escenario en una base nueva y devuelve la mediana en segundos."""
+    scenario, default_samples = SCENARIOS[name]
+    ctx = BenchContext()
+    try:
+        fn = scenario(ctx)
+        fn()  # calentamiento (plantillas, conexiones, cachés)
+        timings = []
+        for _ in range(samples or default_samples):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings)
+    finally:
+        ctx.close()
+
+
+def load_baseline(path):
+    try:
+        with open(path, encoding='utf-8') as fh:
+            return json.load(fh).get('results', {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_baseline(path, results):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump({'created_at': datetime.utcnow().isoformat() + 'Z', 'results': results}, fh, indent=2, sort_keys=True)
+
+
+def compare(results, baseline, tolerance):
+    """Devuelve [(nombre, actual, base, ratio)] de los escenarios que empeoraron."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current > previous * (1 + tolerance) and current - previous > NOISE_FLOOR:
+            regressions.append((name, current, previous, current / previous))
+    return regressions
+
+
+# --- Prueba de carga contra un servidor en marcha ---
+
+_CSRF_INPUT = re.compile(r'id="csrf_token"[^>]*value="([^"]+)"')
+
+
+class _ScanClient:
+    """Un escáner simulado: su propia sesión (cookies) y su token CSRF."""
+
+    def __init__(self, base_url, username, password):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        token = self._csrf('/login')
+        body = urllib.parse.urlencode({'username': username, 'password': password, 'csrf_token': token}).encode()
+        self.opener.open(self.base_url + '/login', body).read()
+        self.token = self._csrf('/scan')
+
+    def _csrf(self, path):
+        page = self.opener.open(self.base_url + path).read().decode('utf-8')
+        match = _CSRF_INPUT.search(page)
+        if not match:
+            raise RuntimeError(f'No se encontró el token CSRF en {path} (¿credenciales correctas?).')
+        return match.group(1)
+
+    def scan(self, student_id, door):
+        request = urllib.request.Request(
+            self.base_url + '/api/scan',
+            data=json.dumps({'student_id': student_id, 'door': door}).encode(),
+            headers={'Content-Type': 'application/json', 'X-CSRFToken': self.token},
+        )
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+def load_test(base_url, username, password, clients=50, duration=30.0, students=1000, doors=(1,)):
+    """
+    `clients` escáneres en paralelo enviando escaneos durante `duration` segundos.
+    Cualquier respuesta HTTP < 500 cuenta como atendida (200, 403, 404 y 429 son
+    respuestas válidas de la vista). Devuelve un dict con rendimiento y latencias.
+    """
+    scanners = [_ScanClient(base_url, username, password) for _ in range(clients)]
+    latencies, statuses, errors = [], {}, []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index, scanner):
+        rng = random.Random(index)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status = scanner.scan(rng.randint(1, students), rng.choice(doors))
+            except OSError as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i, s), daemon=True) for i, s in enumerate(scanners)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else 0.0
+
+    served = sum(count for status, count in statuses.items() if status < 500)
+    return {
+        'clients': clients,
+        'duration': wall,
+        'requests': len(latencies),
+        'throughput': served / wall if wall else 0.0,
+        'p50': percentile(0.50),
+        'p95': percentile(0.95),
+        'p99': percentile(0.99),
+        'statuses': statuses,
+        'errors': len(errors),
+    }
+
+
+def _login(base_url, username, password):
+    """Un inicio de sesión completo (formulario + POST). Devuelve (segundos, correcto)."""
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    started = time.perf_counter()
+    page = opener.open(base_url + '/login').read().decode('utf-8')
+    match = _CSRF_INPUT.search(page)
+    body = urllib.parse.urlencode({'username': username, 'password': password,
+                                   'csrf_token': match.group(1) if match else ''}).encode()
+    with opener.open(base_url + '/login', body) as response:
+        response.read()
+        # Un login correcto redirige al panel; uno rechazado (o sin turno de hash) vuelve a /login
+        ok = not urllib.parse.urlparse(response.geturl()).path.endswith('/login')
+    return time.perf_counter() - started, ok
+
+
+def login_storm(base_url, username, password, logins=50, scanners=5, students=1000, doors=(1,)):
+    """
+    `logins` inicios de sesión simultáneos (el cambio de turno) mientras `scanners`
+    escáneres ya autenticados siguen escaneando. Mide la latencia de los logins
+    y la de /api/scan antes y durante la ola. Devuelve un dict con los resultados.
+    """
+    base_url = base_url.rstrip('/')
+    clients = [_ScanClient(base_url, username, password) for _ in range(scanners)]
+    login_times, failed, errors = [], [], []
+    scan_times = {'before': [], 'during': []}
+    lock = threading.Lock()
+    phase = {'name': 'before', 'stop': False}
+
+    def scanner(index, client):
+        rng = random.Random(index)
+        while not phase['stop']:
+            started = time.perf_counter()
+            try:
+                client.scan(rng.randint(1, students), rng.choice(doors))
+            except OSError as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            with lock:
+                scan_times[phase['name']].append(time.perf_counter() - started)
+
+    def login(_):
+        try:
+            elapsed, ok = _login(base_url, username, password)
+        except OSError as e:
+            with lock:
+                errors.append(str(e))
+            return
+        with lock:
+            (login_times if ok else failed).append(elapsed)
+
+    scan_threads = [threading.Thread(target=scanner, args=(i, c), daemon=True) for i, c in enumerate(clients)]
+    for thread in scan_threads:
+        thread.start()
+    time.sleep(2)  # Latencia de referencia sin logins
+
+    phase['name'] = 'during'
+    started = time.perf_counter()
+    login_threads = [threading.Thread(target=login, args=(i,), daemon=True) for i in range(logins)]
+    for thread in login_threads:
+        thread.start()
+    for thread in login_threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    phase['stop'] = True
+    for thread in scan_threads:
+        thread.join()
+
+    def percentile(values, p):
+        values = sorted(values)
+        return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+    return {
+        'logins': logins,
+        'duration': wall,
+        'ok': len(login_times),
+        'failed': len(failed),
+        'errors': len(errors),
+        'login_p50': percentile(login_times, 0.50),
+        'login_p95': percentile(login_times, 0.95),
+        'login_max': max(login_times, default=0.0),
+        'scan_before_p95': percentile(scan_times['before'], 0.95),
+        'scan_during_p50': percentile(scan_times['during'], 0.50),
+        'scan_during_p95': percentile(scan_times['during'], 0.95),
+        'scans_during': len(scan_times['during']),
+    }
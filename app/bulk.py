@@ -0,0 +1,76 @@
+# app/bulk.py
+"""
+Operaciones masivas sobre estudiantes.
+
+Los cambios se aplican con un único UPDATE por conjuntos (no se cargan los
+estudiantes en memoria), se registran en `AuditLog` e invalidan el roster
+cacheado de los escáneres.
+"""
+import json
+import re
+from datetime import datetime
+import pandas as pd
+from .models import db, Student, AuditLog
+from .roster import invalidate_roster_cache
+
+
+def parse_ids(text):
+    """Convierte '1, 2\\n3' en [1, 2, 3]. Lanza ValueError si hay valores no numéricos."""
+    tokens = [t for t in re.split(r'[\s,;]+', text or '') if t]
+    return [int(t) for t in tokens]
+
+
+def read_ids_file(file_storage):
+    """Lee la columna 'id' de un XLSX o CSV subido."""
+    filename = (file_storage.filename or '').lower()
+    if filename.endswith('.csv'):
+        df = pd.read_csv(file_storage, usecols=['id'])
+    else:
+        df = pd.read_excel(file_storage, usecols=['id'])
+    return [int(v) for v in df['id'].dropna()]
+
+
+ALL_COURSES = '*'
+
+
+def _criteria(course=None, ids=None):
+    criteria = [Student.deleted_at.is_(None)]
+    if course and course != ALL_COURSES:
+        criteria.append(Student.course == course)
+    if ids is not None:
+        criteria.append(Student.id.in_(ids))
+    return criteria
+
+
+def count_changes(authorized, course=None, ids=None):
+    """Dry-run: (estudiantes que coinciden, estudiantes que cambiarían)."""
+    criteria = _criteria(course, ids)
+    matched = Student.query.filter(*criteria).count()
+    changed = Student.query.filter(*criteria, Student.authorized != authorized).count()
+    return matched, changed
+
+
+def set_authorization(authorized, user, course=None, ids=None):
+    """Aplica el cambio con un único UPDATE y deja registro en la auditoría."""
+    updated = Student.query.filter(
+        *_criteria(course, ids), Student.authorized != authorized
+    ).update(
+        # updated_at explícito para que el roster de los escáneres publique el delta
+        {Student.authorized: authorized, Student.updated_at: datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.session.add(AuditLog(
+        user_id=user.id,
+        action='bulk_authorize' if authorized else 'bulk_deauthorize',
+        details=json.dumps({'course': course, 'ids': ids, 'updated': updated})
+    ))
+    db.session.commit()
+    invalidate_roster_cache()
+    return updated
+
+
+def course_choices():
+    courses = db.session.query(Student.course).filter(
+        Student.deleted_at.is_(None), Student.course.isnot(None)
+    ).distinct().order_by(Student.course)
+    return [('', '— Sin filtro de curso —'), (ALL_COURSES, 'Todos los cursos')] + [(c, c) for (c,) in courses]
@@ -0,0 +1,121 @@
+# app/campus.py
+"""
+Enrutamiento por sede (campus) para despliegues multi-sede.
+
+Una sola instalación atiende varias sedes, cada una con su propia base de datos.
+La sede de cada petición se decide por el nombre de host (`CAMPUS_HOSTS`) o por
+un prefijo en la URL (`/<sede>/...`, con `CAMPUS_URL_PREFIX`). Cada sede se
+registra como un bind de Flask-SQLAlchemy, así que tiene su propio engine y su
+propio pool de conexiones; `CampusSession` elige el engine en cada consulta.
+
+Fuera de una petición (comandos CLI) la sede se toma de `g.campus` o de la
+variable de entorno `CAMPUS`, p. ej. `CAMPUS=norte flask init-db`.
+"""
+import os
+from flask import g, has_app_context, has_request_context, request, current_app
+from flask.sessions import SecureCookieSessionInterface
+from flask_sqlalchemy.session import Session
+from . import replica
+
+ENVIRON_KEY = 'exit_control.campus'
+
+
+def bind_key(campus):
+    return f'campus_{campus}'
+
+
+def current_campus():
+    """Sede activa, o None si se usa la base de datos por defecto."""
+    if has_request_context():
+        campus = request.environ.get(ENVIRON_KEY)
+        if campus:
+            return campus
+    campus = g.get('campus') if has_app_context() else None
+    return campus or os.environ.get('CAMPUS') or None
+
+
+def cache_namespace():
+    """Prefijo para separar cachés en memoria entre sedes."""
+    return current_campus() or ''
+
+
+class CampusSession(Session):
+    """
+    Sesión que dirige cada consulta al engine de la sede activa o, en las vistas
+    de solo lectura, a la réplica (ver app/replica.py).
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            campus = current_campus()
+            if campus is not None:
+                try:
+                    return self._db.engines[bind_key(campus)]
+                except KeyError:
+                    raise RuntimeError(f"Sede '{campus}' no configurada en CAMPUS_DATABASES.")
+            engine = replica.select_engine(self._db, clause, self._flushing)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class CampusSessionInterface(SecureCookieSessionInterface):
+    """Cookie de sesión distinta por sede (una sesión de una sede no sirve en otra)."""
+
+    def get_cookie_name(self, app):
+        name = super().get_cookie_name(app)
+        campus = current_campus()
+        return f'{name}_{campus}' if campus else name
+
+
+class CampusMiddleware:
+    """
+    Resuelve la sede antes de que Flask procese la petición. Con prefijo en la URL,
+    el segmento `/<sede>` se mueve a SCRIPT_NAME para que `url_for` lo conserve.
+    """
+
+    def __init__(self, wsgi_app, campuses, hosts, use_prefix):
+        self.wsgi_app = wsgi_app
+        self.campuses = set(campuses)
+        self.hosts = {host.lower(): campus for host, campus in hosts.items()}
+        self.use_prefix = use_prefix
+
+    def __call__(self, environ, start_response):
+        campus = None
+        host = environ.get('HTTP_HOST', '').split(':')[0].lower()
+        if host in self.hosts:
+            campus = self.hosts[host]
+        elif self.use_prefix:
+            path = environ.get('PATH_INFO', '')
+            segment = path.lstrip('/').split('/', 1)[0]
+            if segment in self.campuses:
+                environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + '/' + segment
+                environ['PATH_INFO'] = path[len(segment) + 1:] or '/'
+                campus = segment
+        environ[ENVIRON_KEY] = campus
+        return self.wsgi_app(environ, start_response)
+
+
+def configured_campuses(app=None):
+    return list((app or current_app).config.get('CAMPUS_DATABASES') or {})
+
+
+def init_app(app):
+    """Registra los binds de cada sede y el middleware. Llamar antes de `db.init_app`."""
+    campuses = app.config.get('CAMPUS_DATABASES') or {}
+    if not campuses:
+        return
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for campus, url in campuses.items():
+        binds[bind_key(campus)] = url
+    app.config['SQLALCHEMY_BINDS'] = binds
+    app.session_interface = CampusSessionInterface()
+    app.wsgi_app = CampusMiddleware(
+        app.wsgi_app, campuses, app.config.get('CAMPUS_HOSTS') or {}, app.config.get('CAMPUS_URL_PREFIX', False)
+    )
+
+    @app.before_request
+    def require_campus():
+        # Sin base de datos por defecto, toda petición debe pertenecer a una sede
+        if current_campus() is None and not app.config.get('SQLALCHEMY_DATABASE_URI') and request.endpoint != 'static':
+            return 'Sede no encontrada.', 404
@@ -1,15 +1,22 @@
 # app/commands.py
 import click
 import os
+import time
 from flask.cli import with_appcontext
-from flask import current_app
-from .models import db, User, Role, Student
+from flask import g
+from flask_migrate import upgrade as migrate_upgrade
+from .models import db, User, Role, ApiToken
+from .assets import vendor_assets, build_assets, brotli, DIST_FOLDER
+from .cooldown import get_table as get_cooldown_table
+from . import benchmarks, jobs, backfill, edge, photos
+from .campus import configured_campuses
 
 @click.command('init-db')
 @with_appcontext
 def init_db_command():
     """Crea un usuario administrador inicial y las tablas."""
-    db.create_all()
+    # get_bind() respeta la sede activa (CAMPUS=<sede> flask init-db)
+    db.metadata.create_all(bind=db.session.get_bind())
     if User.query.filter_by(username='admin').first() is None:
         admin_user = User(username='admin', role=Role.ADMIN)
         admin_user.set_password('admin123')
@@ -29,59 +36,18 @@ def sync_photos_command():
     Nombra las fotos como {student_id}.jpg para que funcione.
     """
     click.echo("Iniciando sincronización de fotos...")
-    
-    # 1. Obtener la ruta a la carpeta de fotos
-    photo_folder_path = os.path.join(current_app.root_path, current_app.config['STUDENT_PHOTOS_FOLDER'])
-    
+    photo_folder_path = photos.photos_dir()
     if not os.path.isdir(photo_folder_path):
         click.echo(f"Error: La carpeta de fotos '{photo_folder_path}' no existe. Por favor, créala.")
         return
-
-    # 2. Listar todos los archivos en la carpeta
     try:
-        all_files = os.listdir(photo_folder_path)
+        updated_count, not_found_count, skipped_count = photos.sync_folder()
     except OSError as e:
         click.echo(f"Error al leer la carpeta de fotos: {e}")
         return
-
-    updated_count = 0
-    not_found_count = 0
-    skipped_count = 0
-    
-    # 3. Iterar sobre cada archivo
-    with click.progressbar(all_files, label="Procesando fotos") as bar:
-        for filename in bar:
-            # Asegurarse de que sea un archivo JPG
-            if filename.lower().endswith(('.jpg', '.jpeg')):
-                # Extraer el ID del estudiante del nombre del archivo
-                student_id_str = os.path.splitext(filename)[0]
-                
-                if student_id_str.isdigit():
-                    student_id = int(student_id_str)
-                    
-                    # 4. Buscar al estudiante en la base de datos
-                    student = Student.query.get(student_id)
-                    
-                    if student:
-                        # 5. Actualizar el campo si ha cambiado
-                        if student.photo_filename != filename:
-                            student.photo_filename = filename
-                            updated_count += 1
-                        else:
-                            skipped_count += 1
-                    else:
-                        not_found_count += 1
-                else:
-                    skipped_count += 1 # Archivos con nombres no numéricos
-            else:
-                skipped_count += 1 # Archivos que no son JPG
-
-    # 6. Guardar todos los cambios en la base de datos de una sola vez
     if updated_count > 0:
-        db.session.commit()
         click.echo(f"\nCambios guardados en la base de datos.")
 
-    # 7. Mostrar un resumen
     click.echo("\n--- Resumen de la Sincronización ---")
     click.echo(f"Estudiantes actualizados con foto: {updated_count}")
     click.echo(f"Fotos donde no se encontró el estudiante: {not_found_count}")
@@ -89,7 +55,270 @@ def sync_photos_command():
     click.echo("------------------------------------")
     click.echo("Sincronización completada.")
 
+@click.command('photos-split-campus')
+@with_appcontext
+def photos_split_campus_command():
+    """Mueve las fotos de la carpeta común a la carpeta de cada sede (una sola vez)."""
+    campuses = configured_campuses()
+    if not campuses:
+        click.echo("No hay sedes configuradas (CAMPUS_DATABASES): las fotos no se separan.")
+        return
+    moved, ambiguous = photos.split_by_campus(campuses)
+    for filename, claimed_by in ambiguous:
+        click.echo(f"{filename}: lo usan las sedes {', '.join(claimed_by)}; se deja en la carpeta común.")
+    click.echo(f"{moved} fotos movidas a la carpeta de su sede, {len(ambiguous)} ambiguas.")
+    if ambiguous:
+        click.echo("Vuelve a subir las fotos ambiguas en cada sede (Estudiantes → Subir Fotos).")
+
+@click.command('assets-vendor')
+@click.option('--force', is_flag=True, help='Volver a descargar aunque el archivo ya exista.')
+@with_appcontext
+def assets_vendor_command(force):
+    """Descarga las librerías de terceros (Tailwind, html5-qrcode, Alpine) a static/vendor."""
+    try:
+        downloaded = vendor_assets(force=force)
+    except OSError as e:
+        click.echo(f"Error al descargar las librerías: {e}")
+        return
+    for path in downloaded:
+        click.echo(f"Descargado: {path}")
+    click.echo(f"{len(downloaded)} librerías descargadas.")
+
+@click.command('assets-build')
+@with_appcontext
+def assets_build_command():
+    """Genera static/dist con nombres con hash, variantes .gz/.br y el manifiesto."""
+    manifest = build_assets()
+    if brotli is None:
+        click.echo("Aviso: el paquete 'brotli' no está instalado; solo se generaron variantes .gz.")
+    click.echo(f"{len(manifest)} assets publicados en static/{DIST_FOLDER}.")
+    click.echo("Reinicia los workers para que carguen el nuevo manifiesto.")
+
+@click.command('cooldown-rebuild')
+@with_appcontext
+def cooldown_rebuild_command():
+    """Reconstruye la tabla compartida de cooldown a partir de la base de datos."""
+    table = get_cooldown_table()
+    if table is None:
+        click.echo("La tabla compartida de cooldown está deshabilitada (COOLDOWN_SHARED_TABLE=1 para activarla).")
+        return
+    count = table.rebuild_from_db()
+    click.echo(f"Tabla de cooldown reconstruida: {count} estudiantes con salidas recientes.")
+
+@click.command('create-api-token')
+@click.argument('name')
+@click.option('--scope', type=click.Choice(ApiToken.SCOPES), default='feed', show_default=True,
+              help='Alcance: feed de salidas, sincronización de una sede (edge) o métricas.')
+@with_appcontext
+def create_api_token_command(name, scope):
+    """Crea un token de acceso para una integración (p. ej. el feed de salidas)."""
+    if ApiToken.query.filter_by(name=name).first():
+        click.echo(f'Ya existe un token con el nombre "{name}".')
+        return
+    api_token, token = ApiToken.generate(name, scope)
+    db.session.add(api_token)
+    db.session.commit()
+    click.echo(f'Token "{scope}" creado para "{name}". Guárdalo ahora, no se volverá a mostrar:')
+    click.echo(token)
+
+@click.command('set-api-token-scope')
+@click.argument('name')
+@click.argument('scope', type=click.Choice(ApiToken.SCOPES))
+@with_appcontext
+def set_api_token_scope_command(name, scope):
+    """Cambia el alcance de un token existente (p. ej. el de una sede remota)."""
+    api_token = ApiToken.query.filter_by(name=name).first()
+    if api_token is None:
+        click.echo(f'No existe un token con el nombre "{name}".')
+        return
+    api_token.scope = scope
+    db.session.commit()
+    click.echo(f'Token "{name}" con alcance "{scope}".')
+
+@click.command('revoke-api-token')
+@click.argument('name')
+@with_appcontext
+def revoke_api_token_command(name):
+    """Desactiva el token de acceso de una integración."""
+    api_token = ApiToken.query.filter_by(name=name).first()
+    if api_token is None:
+        click.echo(f'No existe un token con el nombre "{name}".')
+        return
+    api_token.is_active = False
+    db.session.commit()
+    click.echo(f'Token "{name}" revocado.')
+
+@click.command('bench')
+@click.option('--only', multiple=True, type=click.Choice(sorted(benchmarks.SCENARIOS)), help='Ejecutar solo estos escenarios.')
+@click.option('--samples', type=int, default=None, help='Número de muestras por escenario.')
+@click.option('--baseline', 'baseline_path', default=os.path.join('benchmarks', 'baseline.json'), show_default=True,
+              help='Archivo JSON con la línea base.')
+@click.option('--tolerance', type=float, default=0.25, show_default=True,
+              help='Empeoramiento relativo permitido antes de fallar.')
+@click.option('--save', is_flag=True, help='Guardar los resultados como nueva línea base.')
+def bench_command(only, samples, baseline_path, tolerance, save):
+    """Mide las rutas críticas sobre una base SQLite temporal y detecta regresiones."""
+    results = {}
+    for name in (only or benchmarks.SCENARIOS):
+        results[name] = benchmarks.run_scenario(name, samples)
+        click.echo(f"{name:<25} {results[name] * 1000:>10.2f} ms")
+
+    if save:
+        merged = {**benchmarks.load_baseline(baseline_path), **results}
+        benchmarks.save_baseline(baseline_path, merged)
+        click.echo(f"Línea base guardada en {baseline_path}.")
+        return
+
+    baseline = benchmarks.load_baseline(baseline_path)
+    if not baseline:
+        click.echo(f"No hay línea base en {baseline_path}; ejecuta 'flask bench --save' para crearla.")
+        return
+    regressions = benchmarks.compare(results, baseline, tolerance)
+    for name, current, previous, ratio in regressions:
+        click.echo(f"REGRESIÓN {name}: {current * 1000:.2f} ms (base {previous * 1000:.2f} ms, x{ratio:.2f})")
+    if regressions:
+        raise SystemExit(1)
+    click.echo("Sin regresiones respecto a la línea base.")
+
+@click.command('bench-load')
+@click.argument('base_url')
+@click.option('--username', required=True, help='Usuario operador para los escáneres simulados.')
+@click.option('--password', prompt=True, hide_input=True)
+@click.option('--clients', type=int, default=50, show_default=True, help='Escáneres concurrentes.')
+@click.option('--duration', type=float, default=30.0, show_default=True, help='Segundos de carga.')
+@click.option('--students', type=int, default=1000, show_default=True, help='Rango de IDs de estudiante a escanear.')
+@click.option('--door', 'doors', type=int, multiple=True, default=(1,), show_default=True, help='IDs de puerta.')
+def bench_load_command(base_url, username, password, clients, duration, students, doors):
+    """Prueba de carga de /api/scan contra un servidor en marcha (comparar workers sync y gevent)."""
+    result = benchmarks.load_test(base_url, username, password, clients, duration, students, doors)
+    click.echo(f"Clientes:     {result['clients']}")
+    click.echo(f"Peticiones:   {result['requests']} en {result['duration']:.1f} s")
+    click.echo(f"Rendimiento:  {result['throughput']:.1f} escaneos/s")
+    click.echo(f"Latencia:     p50 {result['p50'] * 1000:.1f} ms | p95 {result['p95'] * 1000:.1f} ms | p99 {result['p99'] * 1000:.1f} ms")
+    click.echo(f"Códigos HTTP: {dict(sorted(result['statuses'].items()))}  Errores de red: {result['errors']}")
+
+@click.command('bench-logins')
+@click.argument('base_url')
+@click.option('--username', required=True, help='Usuario con el que inician sesión los clientes simulados.')
+@click.option('--password', prompt=True, hide_input=True)
+@click.option('--logins', type=int, default=50, show_default=True, help='Inicios de sesión simultáneos.')
+@click.option('--scanners', type=int, default=5, show_default=True, help='Escáneres escaneando durante la ola.')
+@click.option('--students', type=int, default=1000, show_default=True, help='Rango de IDs de estudiante a escanear.')
+@click.option('--door', 'doors', type=int, multiple=True, default=(1,), show_default=True, help='IDs de puerta.')
+def bench_logins_command(base_url, username, password, logins, scanners, students, doors):
+    """Ola de inicios de sesión simultáneos contra un servidor en marcha, midiendo su efecto en /api/scan."""
+    result = benchmarks.login_storm(base_url, username, password, logins, scanners, students, doors)
+    click.echo(f"Logins:        {result['ok']} correctos, {result['failed']} rechazados, {result['errors']} errores de red en {result['duration']:.1f} s")
+    click.echo(f"Latencia login: p50 {result['login_p50'] * 1000:.0f} ms | p95 {result['login_p95'] * 1000:.0f} ms | máx {result['login_max'] * 1000:.0f} ms")
+    click.echo(f"/api/scan p95: {result['scan_before_p95'] * 1000:.1f} ms antes | {result['scan_during_p95'] * 1000:.1f} ms durante la ola "
+               f"(p50 {result['scan_during_p50'] * 1000:.1f} ms, {result['scans_during']} escaneos)")
+
+@click.command('gevent-check')
+@click.option('--clients', type=int, default=50, show_default=True, help='Greenlets (usuarios) simultáneos.')
+def gevent_check_command(clients):
+    """Comprueba que usuario y token CSRF no se mezclan entre greenlets."""
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        raise click.ClickException("gevent no está instalado (pip install gevent).")
+    from .concurrency import check_isolation
+    errors = check_isolation(clients)
+    for error in errors:
+        click.echo(f"ERROR: {error}")
+    if errors:
+        raise SystemExit(1)
+    click.echo(f"OK: {clients} sesiones concurrentes sin mezcla de usuario ni de token CSRF.")
+
+@click.command('import-exits')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--operator', help='Usuario asignado a las filas sin operador.')
+@click.option('--dry-run', is_flag=True, help='Solo validar el archivo, sin guardar nada.')
+@click.option('--restart', is_flag=True, help='Ignorar el punto de control y empezar desde el principio.')
+@click.option('--batch-size', type=int, default=backfill.BATCH_SIZE, show_default=True, help='Filas por INSERT.')
+@with_appcontext
+def import_exits_command(path, operator, dry_run, restart, batch_size):
+    """Carga salidas históricas desde un CSV o XLSX."""
+    operator_id = None
+    if operator:
+        user = User.query.filter_by(username=operator).first()
+        if user is None:
+            raise click.ClickException(f"No existe el usuario '{operator}'.")
+        operator_id = user.id
+
+    started = time.perf_counter()
+    try:
+        summary = backfill.import_exits(
+            backfill.read_file(path), digest=backfill.file_digest(path), default_operator_id=operator_id,
+            dry_run=dry_run, restart=restart, batch_size=batch_size,
+            progress=lambda percent, message=None: message and click.echo(f'[{percent:3d}%] {message}'),
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    if summary['resumed_from']:
+        click.echo(f"Retomado desde la fila {summary['resumed_from']} del archivo.")
+    for row, error in summary['errors']:
+        click.echo(f'Fila {row}: {error}')
+    click.echo(f"{backfill.summary_message(summary)} ({time.perf_counter() - started:.1f} s)")
+
+@click.command('campus-upgrade')
+@click.option('--revision', default='head', show_default=True, help='Revisión de destino.')
+@with_appcontext
+def campus_upgrade_command(revision):
+    """Aplica las migraciones en la base de datos de cada sede."""
+    campuses = configured_campuses()
+    if not campuses:
+        click.echo("No hay sedes configuradas (CAMPUS_DATABASES).")
+        return
+    for campus in campuses:
+        click.echo(f"Migrando sede '{campus}'...")
+        g.campus = campus
+        try:
+            migrate_upgrade(revision=revision)
+        finally:
+            g.pop('campus', None)
+    click.echo(f"{len(campuses)} sedes migradas.")
+
+@click.command('jobs-worker')
+@click.option('--poll', 'poll_interval', type=float, default=2.0, show_default=True, help='Segundos entre consultas a la cola.')
+@click.option('--once', is_flag=True, help='Procesar los trabajos pendientes y terminar.')
+@with_appcontext
+def jobs_worker_command(poll_interval, once):
+    """Ejecuta los trabajos en segundo plano (importaciones, ZIP de QRs, exportaciones)."""
+    click.echo("Worker de trabajos iniciado.")
+    jobs.run_worker(poll_interval=poll_interval, once=once, echo=click.echo)
+
+@click.command('edge-sync')
+@click.option('--interval', type=float, default=None, help='Segundos entre sincronizaciones (EDGE_SYNC_INTERVAL).')
+@click.option('--once', is_flag=True, help='Sincronizar una vez y terminar.')
+@with_appcontext
+def edge_sync_command(interval, once):
+    """Envía las salidas de esta sede a la central y trae roster y settings."""
+    try:
+        edge.client_from_config()
+    except edge.SyncError as e:
+        raise click.ClickException(str(e))
+    click.echo("Sincronización con la central iniciada.")
+    try:
+        edge.run(interval=interval, once=once, echo=click.echo)
+    except edge.SyncError as e:
+        raise click.ClickException(str(e))
+
 def init_app(app):
     """Registra los comandos de la CLI en la aplicación Flask."""
     app.cli.add_command(init_db_command)
-    app.cli.add_command(sync_photos_command)
\ No newline at end of file
+    app.cli.add_command(sync_photos_command)
+    app.cli.add_command(photos_split_campus_command)
+    app.cli.add_command(assets_vendor_command)
+    app.cli.add_command(assets_build_command)
+    app.cli.add_command(cooldown_rebuild_command)
+    app.cli.add_command(create_api_token_command)
+    app.cli.add_command(revoke_api_token_command)
+    app.cli.add_command(set_api_token_scope_command)
+    app.cli.add_command(bench_command)
+    app.cli.add_command(campus_upgrade_command)
+    app.cli.add_command(jobs_worker_command)
+    app.cli.add_command(bench_load_command)
+    app.cli.add_command(bench_logins_command)
+    app.cli.add_command(gevent_check_command)
+    app.cli.add_command(import_exits_command)
+    app.cli.add_command(edge_sync_command)
\ No newline at end of file
@@ -0,0 +1,140 @@
+# app/concurrency.py
+"""
+Soporte para workers cooperativos de gunicorn (gevent).
+
+Con `GUNICORN_WORKER_CLASS=gevent` (ver gunicorn.conf.py) gunicorn parchea la
+librería estándar antes de cargar la app, y cada worker atiende hasta
+`WORKER_CONNECTIONS` peticiones concurrentes en greenlets. Aquí se ajusta lo que
+depende de ese modo:
+
+- Driver de la base de datos: PyMySQL es Python puro y coopera una vez que
+  `socket` está parcheado; el driver en C (`mysqlclient`, el de `mysql://`)
+  bloquearía todo el worker en cada consulta, así que se cambia a PyMySQL.
+- Pool de conexiones: del tamaño del número de greenlets, para que una ráfaga
+  de escaneos espere su conexión cooperativamente en lugar de fallar.
+
+El estado por petición (usuario de Flask-Login en `g`, token CSRF en la sesión)
+vive en los contextos de Flask, que usan `contextvars`; greenlet ≥ 1.0 da a cada
+greenlet su propio contexto. `flask gevent-check` lo comprueba con greenlets
+intercalados a propósito en mitad de las peticiones.
+"""
+import random
+import re
+from sqlalchemy.engine import make_url
+
+try:
+    from gevent import monkey
+except ImportError:  # gevent es opcional
+    monkey = None
+
+
+def gevent_active():
+    """True si el proceso corre con la librería estándar parcheada por gevent."""
+    return monkey is not None and monkey.is_module_patched('socket')
+
+
+def cooperative_url(url):
+    """Cambia los drivers MySQL en C por PyMySQL (Python puro, coopera con gevent)."""
+    if not url:
+        return url
+    parsed = make_url(url)
+    if parsed.get_backend_name() == 'mysql' and parsed.get_driver_name() in ('mysqldb', 'mysqlconnector'):
+        return parsed.set(drivername='mysql+pymysql').render_as_string(hide_password=False)
+    return url
+
+
+def pool_options(config):
+    """Opciones del pool para que cada greenlet del worker pueda tener su conexión."""
+    greenlets = config.get('WORKER_CONNECTIONS', 100)
+    pool_size = min(config.get('DB_POOL_SIZE') or greenlets, greenlets)
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max(greenlets - pool_size, 0),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+    }
+
+
+def init_app(app):
+    """Ajusta driver y pool si corre bajo gevent. Llamar antes de `db.init_app`."""
+    if not gevent_active():
+        return
+    config = app.config
+    config['SQLALCHEMY_DATABASE_URI'] = cooperative_url(config.get('SQLALCHEMY_DATABASE_URI'))
+    config['SQLALCHEMY_BINDS'] = {
+        key: cooperative_url(url) if isinstance(url, str) else url
+        for key, url in (config.get('SQLALCHEMY_BINDS') or {}).items()
+    }
+    url = config.get('SQLALCHEMY_DATABASE_URI') or ''
+    if not url.startswith('sqlite'):
+        # Las opciones explícitas de SQLALCHEMY_ENGINE_OPTIONS tienen prioridad
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = {**pool_options(config), **(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})}
+    app.logger.info('Modo gevent: %s greenlets por worker.', config.get('WORKER_CONNECTIONS'))
+
+
+_USERNAME = re.compile(r'Cerrar Sesión \(([^)]*)\)')
+_CSRF = re.compile(r'id="csrf_token"[^>]*value="([^"]+)"')
+
+
+def check_isolation(clients=50, rounds=3):
+    """
+    Lanza `clients` greenlets, cada uno con su propio usuario, que se ceden el
+    control en mitad de cada petición. Devuelve la lista de errores (vacía si el
+    usuario de Flask-Login y el token CSRF nunca se mezclan entre greenlets).
+    """
+    import gevent
+    from flask import g
+    from flask_login import current_user
+    from .benchmarks import BenchContext
+    from .models import User, Role
+
+    ctx = BenchContext(csrf=True)
+    errors = []
+    try:
+        with ctx.app.app_context():
+            for i in range(clients):
+                user = User(username=f'greenlet-{i}', role=Role.OPERATOR)
+                user.set_password('greenlet')
+                ctx.db.session.add(user)
+            ctx.db.session.commit()
+        ctx.seed_students(clients * rounds)
+
+        @ctx.app.before_request
+        def interleave():
+            # Carga el usuario y cede el control a otros greenlets antes de la vista
+            g.expected_user = current_user.username if current_user.is_authenticated else None
+            gevent.sleep(random.random() / 100)
+
+        @ctx.app.after_request
+        def verify(response):
+            if g.get('expected_user') and current_user.username != g.expected_user:
+                errors.append(f'{g.expected_user} terminó la petición como {current_user.username}')
+            return response
+
+        def client(i):
+            username = f'greenlet-{i}'
+            http = ctx.app.test_client()
+            login_page = http.get('/login').get_data(as_text=True)
+            token = _CSRF.search(login_page).group(1)
+            http.post('/login', data={'username': username, 'password': 'greenlet', 'csrf_token': token})
+            for round_ in range(rounds):
+                page = http.get('/scan').get_data(as_text=True)
+                seen = _USERNAME.search(page)
+                if not seen or seen.group(1) != username:
+                    errors.append(f'{username} vio la página de {seen.group(1) if seen else "nadie"}')
+                csrf = _CSRF.search(page).group(1)
+                response = http.post('/api/scan', json={'student_id': i * rounds + round_ + 1, 'door': 1},
+                                     headers={'X-CSRFToken': csrf})
+                if response.status_code != 200:
+                    errors.append(f'{username}: escaneo con su propio token CSRF devolvió {response.status_code}')
+            return csrf
+
+        greenlets = [gevent.spawn(client, i) for i in range(clients)]
+        gevent.joinall(greenlets, raise_error=True)
+        tokens = [greenlet.value for greenlet in greenlets]
+        if len(set(tokens)) != len(tokens):
+            errors.append('Dos sesiones distintas recibieron el mismo token CSRF.')
+    finally:
+        ctx.close()
+    return errors
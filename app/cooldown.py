@@ -0,0 +1,203 @@
+# app/cooldown.py
+"""
+Tabla compartida de cooldown entre workers de un mismo host.
+
+Es un archivo mapeado en memoria (mmap) con un float64 por estudiante: la hora
+UTC (epoch) de su última salida, indexada por `student_id`. Todos los workers de
+gunicorn abren el mismo archivo, así que la decisión de cooldown es una lectura
+de memoria en lugar de una consulta a la base de datos.
+
+La base de datos sigue siendo la fuente de verdad:
+- Al abrir la tabla cada proceso la reconstruye (fusionando con `max`) a partir
+  de las salidas recientes, así que un reinicio nunca pierde información.
+- Un "positivo" de la tabla (salida reciente) se confirma contra la DB antes de
+  rechazar, de modo que una entrada obsoleta nunca bloquea a un estudiante.
+  Las entradas de menos de `COOLDOWN_RESERVATION_GRACE_SECONDS` no se confirman:
+  pueden ser reservas de otro worker cuya salida aún no se ha guardado, y la DB
+  todavía no las ve. Si ese worker falla sin llegar a `release`, el estudiante
+  queda bloqueado como mucho esos segundos.
+
+Solo es válida cuando todas las salidas de la instalación pasan por este host.
+Requiere `fcntl` (Linux/macOS); en otros sistemas se usa siempre la DB.
+"""
+import calendar
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from .models import db, Exit
+from .campus import cache_namespace
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+MAGIC = b'EXITCD01'
+HEADER = struct.Struct('<8sQ')  # magic, capacidad
+SLOT = struct.Struct('<d')
+
+# Ventana máxima de cooldown permitida por SettingsForm (minutos)
+MAX_COOLDOWN_MINUTES = 1440
+
+
+def to_epoch(dt):
+    return calendar.timegm(dt.utctimetuple()) + dt.microsecond / 1e6
+
+
+class SharedCooldownTable:
+    def __init__(self, path, capacity):
+        self.path = path
+        self.capacity = capacity
+        self._thread_lock = threading.Lock()
+        size = HEADER.size + capacity * SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._locked():
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+            self._map = mmap.mmap(self._fd, size)
+            magic, stored_capacity = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC or stored_capacity != capacity:
+                self._map[:size] = bytes(size)
+                HEADER.pack_into(self._map, 0, MAGIC, capacity)
+
+    @contextmanager
+    def _locked(self):
+        # flock excluye a otros procesos; el lock de hilo, a los hilos del mismo worker
+        with self._thread_lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def covers(self, student_id):
+        return 0 <= student_id < self.capacity
+
+    def _offset(self, student_id):
+        return HEADER.size + student_id * SLOT.size
+
+    def get(self, student_id):
+        """Última salida conocida (epoch) o 0.0 si no hay registro."""
+        return SLOT.unpack_from(self._map, self._offset(student_id))[0]
+
+    def set(self, student_id, value):
+        with self._locked():
+            SLOT.pack_into(self._map, self._offset(student_id), value)
+
+    def replace(self, student_id, expected, value):
+        """Escribe `value` solo si la entrada sigue valiendo `expected`. Devuelve si escribió."""
+        offset = self._offset(student_id)
+        with self._locked():
+            if SLOT.unpack_from(self._map, offset)[0] != expected:
+                return False
+            SLOT.pack_into(self._map, offset, value)
+            return True
+
+    def reserve(self, student_id, now, window_seconds):
+        """
+        Operación atómica de comprobar-y-marcar entre workers.
+        Devuelve (reservado, valor_anterior).
+        """
+        offset = self._offset(student_id)
+        with self._locked():
+            previous = SLOT.unpack_from(self._map, offset)[0]
+            if previous and now - previous < window_seconds:
+                return False, previous
+            SLOT.pack_into(self._map, offset, now)
+            return True, previous
+
+    def merge(self, rows):
+        """Fusiona (student_id, epoch) con la tabla, quedándose con el valor mayor."""
+        with self._locked():
+            for student_id, value in rows:
+                if not self.covers(student_id):
+                    continue
+                offset = self._offset(student_id)
+                if SLOT.unpack_from(self._map, offset)[0] < value:
+                    SLOT.pack_into(self._map, offset, value)
+
+    def rebuild_from_db(self):
+        """Carga las salidas recientes desde la DB. Devuelve el número de estudiantes."""
+        since = datetime.utcnow() - timedelta(minutes=MAX_COOLDOWN_MINUTES)
+        rows = db.session.query(Exit.student_id, func.max(Exit.timestamp)).filter(
+            Exit.timestamp >= since
+        ).group_by(Exit.student_id).all()
+        self.merge((student_id, to_epoch(ts)) for student_id, ts in rows)
+        return len(rows)
+
+
+def get_table():
+    """Tabla compartida del proceso actual, o None si está deshabilitada."""
+    app = current_app._get_current_object()
+    if not app.config.get('COOLDOWN_SHARED_TABLE') or fcntl is None:
+        return None
+    # Una tabla por sede: los ids de estudiante se repiten entre bases
+    tables = app.extensions.setdefault('cooldown_tables', {})
+    namespace = cache_namespace()
+    table = tables.get(namespace)
+    if table is None:
+        path = app.config.get('COOLDOWN_TABLE_PATH') or os.path.join(app.instance_path, 'cooldown.bin')
+        if namespace:
+            path = f'{path}.{namespace}'
+        table = SharedCooldownTable(path, app.config.get('COOLDOWN_TABLE_SIZE', 200000))
+        table.rebuild_from_db()
+        tables[namespace] = table
+    return table
+
+
+def _last_exit_from_db(student_id):
+    last_exit = Exit.query.filter_by(student_id=student_id).order_by(Exit.timestamp.desc()).first()
+    return last_exit.timestamp if last_exit else None
+
+
+def check_cooldown(student_id, cooldown_minutes):
+    """
+    Decide si el estudiante puede salir ahora.
+
+    Devuelve `(None, token)` si la salida está permitida (y queda reservada en la
+    tabla compartida) o `(ultima_salida, None)` si sigue en cooldown. El token se
+    pasa a `release` si la salida finalmente no se guarda.
+    """
+    now = datetime.utcnow()
+    window = timedelta(minutes=cooldown_minutes)
+    table = get_table()
+    if table is None or not table.covers(student_id):
+        last = _last_exit_from_db(student_id)
+        if last and now - last < window:
+            return last, None
+        return None, None
+
+    stamp = to_epoch(now)
+    reserved, previous = table.reserve(student_id, stamp, window.total_seconds())
+    if reserved:
+        return None, (student_id, previous, stamp)
+
+    # Una entrada reciente puede ser una reserva en curso que la DB aún no ve
+    grace = current_app.config.get('COOLDOWN_RESERVATION_GRACE_SECONDS', 10)
+    if stamp - previous < grace:
+        return datetime.utcfromtimestamp(previous), None
+
+    # Positivo de la tabla: se confirma en la DB por si la entrada es obsoleta
+    last = _last_exit_from_db(student_id)
+    if last and now - last < window:
+        return last, None
+    # La DB confirma que es obsoleta: se reserva solo si nadie la cambió mientras
+    # tanto (otro worker pudo reservar al mismo estudiante durante la consulta)
+    if not table.replace(student_id, previous, stamp):
+        return datetime.utcfromtimestamp(table.get(student_id)), None
+    return None, (student_id, to_epoch(last) if last else 0.0, stamp)
+
+
+def release(token):
+    """Deshace una reserva cuando la salida no llegó a guardarse."""
+    table = get_table()
+    if token is None or table is None:
+        return
+    student_id, previous, stamp = token
+    # Si otro worker ya escribió una salida posterior, se conserva la suya
+    table.replace(student_id, stamp, previous)
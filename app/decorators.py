@@ -1,8 +1,8 @@
 # app/decorators.py
 from functools import wraps
-from flask import abort
+from flask import abort, request, jsonify, g
 from flask_login import current_user
-from .models import Role
+from .models import Role, ApiToken
 
 def admin_required(f):
     @wraps(f)
@@ -10,4 +10,27 @@ def admin_required(f):
         if not current_user.is_authenticated or current_user.role != Role.ADMIN:
             abort(403) # Forbidden
         return f(*args, **kwargs)
-    return decorated_function
\ No newline at end of file
+    return decorated_function
+
+def token_required(scope):
+    """
+    Autenticación para integraciones: cabecera `Authorization: Bearer <token>`.
+    Solo se aceptan tokens emitidos para `scope` (ver ApiToken.SCOPES).
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+            api_token = None
+            if scheme.lower() == 'bearer' and token:
+                api_token = ApiToken.query.filter_by(
+                    token_hash=ApiToken.hash_token(token.strip()), is_active=True
+                ).first()
+            if api_token is None:
+                return jsonify({'success': False, 'message': 'Token de acceso inválido.'}), 401
+            if api_token.scope != scope:
+                return jsonify({'success': False, 'message': 'El token no tiene acceso a este recurso.'}), 403
+            g.api_token = api_token
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
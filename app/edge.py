@@ -0,0 +1,509 @@
+# app/edge.py
+"""
+Modo sede remota (edge): una instancia local, normalmente con SQLite, atiende los
+escaneos de una sede con un enlace WAN inestable y se sincroniza con la central.
+
+- Las salidas registradas en la sede se envían a la central en lotes, como un
+  registro de solo anexado. Cada salida lleva el identificador
+  `<sede>:<id local>` (`Exit.source_uid`, único en la central), así que reenviar
+  un lote tras un corte es inofensivo.
+- De la central se traen los cambios de estudiantes, puertas, usuarios y la
+  tabla `settings`, y las salidas recientes de las demás sedes. Los usuarios
+  eliminados en la central dejan de poder iniciar sesión en la sede.
+
+Reglas de cooldown entre sedes:
+- Cada sede decide con lo que sabe: sus propias salidas más las de otras sedes
+  ya recibidas (que se guardan como salidas locales con su `source_uid`).
+- Una salida enviada nunca se rechaza por cooldown: el estudiante ya salió.
+  Si la central tenía otra salida del mismo estudiante, de otra sede, dentro de
+  la ventana, la guarda igualmente y deja el conflicto en la auditoría
+  (`edge_cooldown_conflict`).
+- La ventana siempre cuenta desde la salida más reciente conocida, venga de
+  donde venga (la tabla compartida de cooldown se fusiona con `max`).
+
+La sede es el nombre del token de acceso con el que se autentica la instancia
+local (`flask create-api-token <sede> --scope edge` en la central): los tokens
+de otros alcances no acceden a estos endpoints, que exponen los hashes de
+contraseña y aceptan salidas. `flask edge-sync` ejecuta
+la sincronización en la sede.
+"""
+import json
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import insert, or_
+from .models import db, Student, Exit, Door, User, Role, Setting, AuditLog
+from .roster import encode_version, decode_version, invalidate_roster_cache
+from .cooldown import get_table as get_cooldown_table, to_epoch, MAX_COOLDOWN_MINUTES
+from .ratelimit import invalidate_limits
+from . import passwords, qr
+
+# Prefijo de los `source_uid` de las salidas registradas directamente en la central
+CENTRAL_SITE = 'central'
+# Estado de la sincronización en la sede; estas claves nunca se replican
+STATE_PREFIX = 'edge_'
+STATE_ROSTER_VERSION = 'edge_roster_version'
+STATE_EXITS_AFTER = 'edge_exits_after'
+STATE_SHIPPED_ID = 'edge_shipped_id'
+
+MAX_PUSH_BATCH = 1000
+MAX_PULL_EXITS = 5000
+
+STUDENT_FIELDS = ['id', 'name', 'course', 'authorized', 'photo', 'deleted']
+EXIT_FIELDS = ['id', 'student_id', 'student_name', 'course', 'door_id', 'timestamp', 'operator']
+
+
+class SyncError(Exception):
+    """La central no respondió o rechazó la petición."""
+
+
+def source_uid(site, local_id):
+    return f'{site}:{local_id}'
+
+
+# --- Central ---
+
+def changes(site, since_token=None, exits_after=0):
+    """
+    Cambios para la sede `site`: estudiantes modificados desde `since_token`
+    (todos si es None, incluidos los eliminados para que la sede los oculte),
+    puertas, usuarios, settings y salidas de otras sedes con id > `exits_after`.
+    """
+    since = decode_version(since_token) if since_token else None
+    max_updated = db.session.query(db.func.max(Student.updated_at)).scalar()
+    total = Student.active().count()
+
+    query = db.session.query(
+        Student.id, Student.name, Student.course, Student.authorized, Student.photo_filename, Student.deleted_at
+    )
+    if since is not None:
+        # >= como en el roster: repetir una fila es inofensivo, perderla no
+        query = query.filter(Student.updated_at >= since)
+    students = [
+        [sid, name, course, 1 if authorized else 0, photo, 1 if deleted_at else 0]
+        for sid, name, course, authorized, photo, deleted_at in query.order_by(Student.id)
+    ]
+
+    # Solo salidas dentro de la ventana máxima de cooldown: las anteriores no deciden nada
+    recent = datetime.utcnow() - timedelta(minutes=MAX_COOLDOWN_MINUTES)
+    rows = db.session.query(
+        Exit.id, Exit.source_uid, Exit.student_id, Exit.student_name, Exit.course,
+        Exit.door_id, Exit.timestamp, User.username
+    ).join(User, Exit.operator_id == User.id).filter(
+        Exit.id > exits_after,
+        Exit.timestamp >= recent,
+        or_(Exit.source_uid.is_(None), ~Exit.source_uid.startswith(source_uid(site, ''), autoescape=True)),
+    ).order_by(Exit.id.asc()).limit(MAX_PULL_EXITS + 1).all()
+    more_exits = len(rows) > MAX_PULL_EXITS
+    rows = rows[:MAX_PULL_EXITS]
+
+    return {
+        'version': encode_version(max_updated),
+        'total': total,
+        'full': since is None,
+        'student_fields': STUDENT_FIELDS,
+        'students': students,
+        'doors': [[id, name, is_active] for id, name, is_active in db.session.query(Door.id, Door.name, Door.is_active)],
+        'users': [
+            [username, role.value, password_hash]
+            for username, role, password_hash in db.session.query(User.username, User.role, User.password_hash)
+        ],
+        'settings': {
+            key: value for key, value in db.session.query(Setting.key, Setting.value)
+            if not key.startswith(STATE_PREFIX)
+        },
+        'exit_fields': EXIT_FIELDS,
+        'exits': [
+            [uid or source_uid(CENTRAL_SITE, id), student_id, student_name, course, door_id,
+             timestamp.isoformat(), operator]
+            for id, uid, student_id, student_name, course, door_id, timestamp, operator in rows
+        ],
+        'exits_after': rows[-1][0] if rows else exits_after,
+        'more_exits': more_exits,
+    }
+
+
+def _cooldown_minutes():
+    setting = Setting.query.filter_by(key='exit_cooldown_minutes').first()
+    return int(setting.value) if setting else 60
+
+
+def receive_exits(site, rows):
+    """
+    Guarda en la central las salidas enviadas por `site` (filas en el orden de
+    `EXIT_FIELDS`). Las ya recibidas, o repetidas dentro del lote, se ignoran. Devuelve un resumen con los
+    contadores y las filas rechazadas `[id_local, motivo]`.
+    """
+    if not isinstance(rows, list):
+        raise ValueError('Lote inválido.')
+    rows = rows[:MAX_PUSH_BATCH]
+    parsed, rejected, seen, repeated = [], [], set(), 0
+    for row in rows:
+        try:
+            local_id, student_id, student_name, course, door_id, timestamp, operator = row
+            local_id = int(local_id)
+            if local_id in seen:
+                repeated += 1  # Repetida dentro del lote: la primera es la que cuenta
+                continue
+            timestamp = datetime.fromisoformat(timestamp)
+            if timestamp.tzinfo is not None:
+                # Las salidas se guardan en UTC sin zona; una hora con zona se convierte
+                timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+            parsed.append({
+                'local_id': local_id,
+                'student_id': qr.check_id(student_id),
+                'student_name': str(student_name),
+                'course': None if course is None else str(course),
+                'door_id': int(door_id),
+                'timestamp': timestamp,
+                'operator': str(operator),
+            })
+            seen.add(local_id)
+        except (TypeError, ValueError):
+            rejected.append([row[0] if isinstance(row, list) and row else None, 'datos inválidos'])
+
+    uids = [source_uid(site, row['local_id']) for row in parsed]
+    existing = {uid for (uid,) in db.session.query(Exit.source_uid).filter(Exit.source_uid.in_(uids))}
+    student_ids = {row['student_id'] for row in parsed}
+    known_students = {id for (id,) in db.session.query(Student.id).filter(Student.id.in_(list(student_ids)))}
+    known_doors = {id for (id,) in db.session.query(Door.id)}
+    operators = dict(db.session.query(User.username, User.id))
+
+    records = []
+    for row, uid in zip(parsed, uids):
+        if uid in existing:
+            continue
+        if row['student_id'] not in known_students:
+            rejected.append([row['local_id'], 'estudiante no encontrado'])
+        elif row['door_id'] not in known_doors:
+            rejected.append([row['local_id'], 'puerta no encontrada'])
+        elif row['operator'] not in operators:
+            rejected.append([row['local_id'], 'operador no encontrado'])
+        else:
+            records.append({
+                'source_uid': uid,
+                'student_id': row['student_id'],
+                'student_name': row['student_name'],
+                'course': row['course'],
+                'door_id': row['door_id'],
+                'timestamp': row['timestamp'],
+                'operator_id': operators[row['operator']],
+            })
+
+    conflicts = _cooldown_conflicts(site, records)
+    if records:
+        db.session.execute(insert(Exit), records)
+    if conflicts:
+        db.session.add(AuditLog(action='edge_cooldown_conflict', details=json.dumps(
+            {'site': site, 'exits': conflicts}, ensure_ascii=False, default=str
+        )))
+    db.session.commit()
+    _merge_cooldown(records)
+    return {
+        'accepted': len(records),
+        'duplicates': len(existing) + repeated,
+        'rejected': rejected,
+        'conflicts': len(conflicts),
+    }
+
+
+def _cooldown_conflicts(site, records):
+    """Salidas de `records` a menos de la ventana de cooldown de una salida de otra sede."""
+    if not records:
+        return []
+    window = timedelta(minutes=_cooldown_minutes())
+    timestamps = [record['timestamp'] for record in records]
+    others = {}
+    query = db.session.query(Exit.student_id, Exit.timestamp, Exit.source_uid).filter(
+        Exit.student_id.in_(list({record['student_id'] for record in records})),
+        Exit.timestamp > min(timestamps) - window,
+        Exit.timestamp < max(timestamps) + window,
+    )
+    for student_id, timestamp, uid in query:
+        if uid is None or not uid.startswith(source_uid(site, '')):
+            others.setdefault(student_id, []).append((timestamp, uid or CENTRAL_SITE))
+    conflicts = []
+    for record in records:
+        for timestamp, uid in others.get(record['student_id'], ()):
+            if abs(record['timestamp'] - timestamp) < window:
+                conflicts.append({'student_id': record['student_id'], 'exit': record['source_uid'],
+                                  'timestamp': record['timestamp'], 'other': uid, 'other_timestamp': timestamp})
+                break
+    return conflicts
+
+
+def _merge_cooldown(records):
+    table = get_cooldown_table()
+    if table is not None and records:
+        table.merge((record['student_id'], to_epoch(record['timestamp'])) for record in records)
+
+
+# --- Sede ---
+
+class CentralClient:
+    """Cliente HTTP de la API de la central (token de acceso de la sede)."""
+
+    def __init__(self, base_url, token, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+
+    def _request(self, path, params=None, payload=None):
+        url = self.base_url + path
+        if params:
+            url += '?' + urllib.parse.urlencode(params)
+        request = urllib.request.Request(url, headers={'Authorization': f'Bearer {self.token}'})
+        if payload is not None:
+            request.data = json.dumps(payload).encode('utf-8')
+            request.add_header('Content-Type', 'application/json')
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            raise SyncError(f'{path}: HTTP {e.code}')
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise SyncError(f'{path}: {e}')
+
+    def get(self, path, params=None):
+        return self._request(path, params=params)
+
+    def post(self, path, payload):
+        return self._request(path, payload=payload)
+
+
+def client_from_config():
+    config = current_app.config
+    if not config.get('EDGE_CENTRAL_URL') or not config.get('EDGE_TOKEN'):
+        raise SyncError('Configure EDGE_CENTRAL_URL y EDGE_TOKEN para sincronizar con la central.')
+    return CentralClient(config['EDGE_CENTRAL_URL'], config['EDGE_TOKEN'], timeout=config.get('EDGE_TIMEOUT', 30))
+
+
+def _get_state(key, default=None):
+    setting = Setting.query.filter_by(key=key).first()
+    return setting.value if setting else default
+
+
+def _set_state(key, value):
+    setting = Setting.query.filter_by(key=key).first()
+    if setting is None:
+        db.session.add(Setting(key=key, value=str(value)))
+    else:
+        setting.value = str(value)
+
+
+def push_exits(client, batch_size=500):
+    """Envía las salidas locales aún no confirmadas por la central. Devuelve el resumen."""
+    batch_size = min(batch_size, MAX_PUSH_BATCH)
+    summary = {'sent': 0, 'accepted': 0, 'duplicates': 0, 'rejected': [], 'conflicts': 0}
+    while True:
+        shipped = int(_get_state(STATE_SHIPPED_ID, 0))
+        rows = db.session.query(
+            Exit.id, Exit.student_id, Exit.student_name, Exit.course, Exit.door_id, Exit.timestamp, User.username
+        ).join(User, Exit.operator_id == User.id).filter(
+            Exit.id > shipped, Exit.source_uid.is_(None)  # Las recibidas de otras sedes no se reenvían
+        ).order_by(Exit.id.asc()).limit(batch_size).all()
+        if not rows:
+            return summary
+        result = client.post('/api/edge/exits', {
+            'fields': EXIT_FIELDS,
+            'exits': [[id, sid, name, course, door_id, ts.isoformat(), operator]
+                      for id, sid, name, course, door_id, ts, operator in rows],
+        })
+        summary['sent'] += len(rows)
+        for key in ('accepted', 'duplicates', 'conflicts'):
+            summary[key] += result.get(key, 0)
+        summary['rejected'].extend(result.get('rejected', []))
+        # Las rechazadas no se reintentan: el motivo (p. ej. estudiante borrado en
+        # la central) no cambia al reenviar; quedan en el resumen y en el log
+        _set_state(STATE_SHIPPED_ID, rows[-1][0])
+        db.session.commit()
+        if len(rows) < batch_size:
+            return summary
+
+
+def _apply_students(payload):
+    fields = payload['student_fields']
+    rows = [dict(zip(fields, values)) for values in payload['students']]
+    if payload['full'] or len(rows) > 1000:
+        existing = {student.id: student for student in Student.query}
+    else:
+        existing = {student.id: student for student in Student.query.filter(Student.id.in_([r['id'] for r in rows]))}
+    now = datetime.utcnow()
+    for row in rows:
+        student = existing.get(row['id'])
+        if student is None:
+            student = Student(id=row['id'])
+            db.session.add(student)
+        student.name = row['name']
+        student.course = row['course']
+        student.authorized = bool(row['authorized'])
+        student.photo_filename = row['photo']
+        if row['deleted']:
+            student.deleted_at = student.deleted_at or now
+        else:
+            student.deleted_at = None
+    if payload['full']:
+        # Estudiantes borrados físicamente en la central: aquí se ocultan (conservan su historial)
+        received = {row['id'] for row in rows}
+        for student_id, student in existing.items():
+            if student_id not in received and student.deleted_at is None:
+                student.deleted_at = now
+    return len(rows)
+
+
+def _apply_doors(doors):
+    by_id = {door.id: door for door in Door.query}
+    by_name = {door.name: door for door in by_id.values()}
+    for id, name, is_active in doors:
+        door = by_id.get(id)
+        clash = by_name.get(name)
+        if clash is not None and clash is not door:
+            # Otra puerta local con el mismo nombre: se renombra para no violar la unicidad
+            del by_name[name]
+            clash.name = f'{name} (local {clash.id})'[:50]
+            by_name[clash.name] = clash
+            db.session.flush()
+        if door is None:
+            door = Door(id=id)
+            db.session.add(door)
+            by_id[id] = door
+        else:
+            by_name.pop(door.name, None)
+        door.name = name
+        door.is_active = bool(is_active)
+        by_name[name] = door
+
+
+def _apply_users(users):
+    """
+    La central envía siempre la lista completa de usuarios: los que ya no están
+    se eliminan, o se deshabilitan si registraron salidas en la sede.
+    """
+    existing = {user.username: user for user in User.query}
+    for username, role, password_hash in users:
+        user = existing.pop(username, None)
+        if user is None:
+            user = User(username=username)
+            db.session.add(user)
+        user.role = Role(role)
+        user.password_hash = password_hash
+    for user in existing.values():
+        if db.session.query(Exit.query.filter_by(operator_id=user.id).exists()).scalar():
+            user.password_hash = passwords.DISABLED_HASH
+        else:
+            user.detach_records()
+            db.session.delete(user)
+
+
+def _apply_settings(settings):
+    existing = {setting.key: setting for setting in Setting.query}
+    for key, value in settings.items():
+        if key.startswith(STATE_PREFIX):
+            continue
+        if key in existing:
+            existing[key].value = value
+        else:
+            db.session.add(Setting(key=key, value=value))
+
+
+def _apply_exits(payload):
+    """Guarda las salidas de otras sedes (para el cooldown y el historial). Devuelve las nuevas."""
+    rows = [dict(zip(payload['exit_fields'], values)) for values in payload['exits']]
+    if not rows:
+        return []
+    existing = {uid for (uid,) in db.session.query(Exit.source_uid).filter(
+        Exit.source_uid.in_([row['id'] for row in rows]))}
+    students = {id for (id,) in db.session.query(Student.id).filter(
+        Student.id.in_(list({row['student_id'] for row in rows})))}
+    doors = {id for (id,) in db.session.query(Door.id)}
+    operators = dict(db.session.query(User.username, User.id))
+    records = [
+        {
+            'source_uid': row['id'],
+            'student_id': row['student_id'],
+            'student_name': row['student_name'],
+            'course': row['course'],
+            'door_id': row['door_id'],
+            'timestamp': datetime.fromisoformat(row['timestamp']),
+            'operator_id': operators[row['operator']],
+        }
+        for row in rows
+        if row['id'] not in existing and row['student_id'] in students
+        and row['door_id'] in doors and row['operator'] in operators
+    ]
+    if records:
+        db.session.execute(insert(Exit), records)
+    return records
+
+
+def pull_changes(client):
+    """Trae y aplica los cambios de la central. Devuelve el resumen."""
+    summary = {'students': 0, 'exits': 0, 'full': False}
+    version = _get_state(STATE_ROSTER_VERSION)
+    exits_after = int(_get_state(STATE_EXITS_AFTER, 0))
+    while True:
+        params = {'exits_after': exits_after}
+        if version:
+            params['since'] = version
+        payload = client.get('/api/edge/changes', params)
+        summary['students'] += _apply_students(payload)
+        _apply_doors(payload['doors'])
+        _apply_users(payload['users'])
+        _apply_settings(payload['settings'])
+        db.session.flush()
+        records = _apply_exits(payload)
+        summary['exits'] += len(records)
+        summary['full'] = summary['full'] or payload['full']
+        version, exits_after = payload['version'], payload['exits_after']
+        _set_state(STATE_ROSTER_VERSION, version)
+        _set_state(STATE_EXITS_AFTER, exits_after)
+        db.session.commit()
+        _merge_cooldown(records)
+
+        if not payload['full'] and Student.active().count() != payload['total']:
+            # Hubo borrados físicos en la central: pedir el listado completo
+            version = None
+            continue
+        if not payload['more_exits']:
+            break
+    invalidate_roster_cache()
+    invalidate_limits()
+    return summary
+
+
+def sync(client=None, batch_size=None):
+    """Un ciclo completo: enviar salidas y traer cambios. Devuelve el resumen."""
+    client = client or client_from_config()
+    batch_size = batch_size or current_app.config.get('EDGE_BATCH_SIZE', 500)
+    pushed = push_exits(client, batch_size)
+    pulled = pull_changes(client)
+    for local_id, reason in pushed['rejected']:
+        current_app.logger.warning('Salida %s rechazada por la central: %s', local_id, reason)
+    return {'push': pushed, 'pull': pulled}
+
+
+def summary_message(summary):
+    push, pull = summary['push'], summary['pull']
+    message = (f"{push['accepted']} salidas enviadas ({push['duplicates']} ya recibidas, "
+               f"{len(push['rejected'])} rechazadas, {push['conflicts']} conflictos de cooldown); "
+               f"{pull['students']} estudiantes y {pull['exits']} salidas de otras sedes recibidos")
+    return message + (' (listado completo).' if pull['full'] else '.')
+
+
+def run(interval=None, once=False, echo=print):
+    """Bucle de sincronización de la sede. Un corte de la WAN solo retrasa el envío."""
+    interval = interval or current_app.config.get('EDGE_SYNC_INTERVAL', 15)
+    while True:
+        try:
+            echo(summary_message(sync()))
+        except SyncError as e:
+            db.session.rollback()
+            echo(f'Central no disponible: {e}')
+            if once:
+                raise
+        if once:
+            return
+        time.sleep(interval)
@@ -0,0 +1,65 @@
+# app/feed.py
+"""
+Feed incremental de salidas para sistemas externos.
+
+Las salidas se recorren en orden de `Exit.id` a partir de un cursor opaco, así
+que una integración puede consultar cada pocos segundos y recibir solo lo nuevo.
+"""
+import base64
+import binascii
+import json
+from .models import db, Exit, Door, User
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+# Mayor id que cabe en un BIGINT con signo: un cursor con más no llega a la base
+MAX_ID = 2 ** 63 - 1
+
+
+def encode_cursor(exit_id):
+    return base64.urlsafe_b64encode(f'exit:{exit_id}'.encode('ascii')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Devuelve el último `Exit.id` entregado. Lanza ValueError si el cursor es inválido."""
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError('Cursor inválido.')
+    prefix, _, value = raw.partition(':')
+    if prefix != 'exit' or not value.isdigit() or int(value) > MAX_ID:
+        raise ValueError('Cursor inválido.')
+    return int(value)
+
+
+def fetch_page(after_id, limit):
+    """
+    Una página de salidas con id > `after_id`, con puerta y operador resueltos
+    en la misma consulta. Devuelve (filas, siguiente_cursor, hay_mas).
+    """
+    rows = db.session.query(
+        Exit.id, Exit.student_id, Exit.student_name, Exit.course, Exit.timestamp,
+        Door.name, User.username
+    ).join(Door, Exit.door_id == Door.id).join(User, Exit.operator_id == User.id).filter(
+        Exit.id > after_id
+    ).order_by(Exit.id.asc()).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1][0] if rows else after_id)
+    return rows, next_cursor, has_more
+
+
+def to_ndjson(rows):
+    for exit_id, student_id, student_name, course, timestamp, door_name, operator in rows:
+        yield json.dumps({
+            'id': exit_id,
+            'student_id': student_id,
+            'student_name': student_name,
+            'course': course,
+            'timestamp': timestamp.isoformat() + 'Z',
+            'door': door_name,
+            'operator': operator,
+        }, ensure_ascii=False) + '\n'
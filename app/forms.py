@@ -1,7 +1,7 @@
 # app/forms.py
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, BooleanField, SubmitField, SelectField, FileField, DateField, SubmitField, IntegerField
-from wtforms.validators import DataRequired, EqualTo, ValidationError, Length, NumberRange
+from wtforms import StringField, PasswordField, BooleanField, SubmitField, SelectField, FileField, DateField, SubmitField, IntegerField, TextAreaField
+from wtforms.validators import DataRequired, EqualTo, ValidationError, Length, NumberRange, Regexp
 from .models import User
 from flask_wtf.file import FileField, FileAllowed
 
@@ -38,18 +38,55 @@ class ImportForm(FlaskForm):
     submit = SubmitField('Importar')
 
 
+class PhotoZipForm(FlaskForm):
+    file = FileField('Archivo ZIP con fotos', validators=[DataRequired(), FileAllowed(['zip'], 'Solo archivos ZIP.')])
+    submit = SubmitField('Subir Fotos')
+
+
+class ExitImportForm(FlaskForm):
+    file = FileField('Archivo CSV o XLSX', validators=[DataRequired(), FileAllowed(['csv', 'xlsx'], 'Solo archivos CSV o XLSX.')])
+    dry_run = BooleanField('Solo validar (no guardar nada)', default=True)
+    submit = SubmitField('Importar Historial')
+
+
+SCAN_LIMIT_PATTERN = r'^\s*(0|[1-9]\d*/[1-9]\d*)\s*$'
+SCAN_LIMIT_MESSAGE = 'Use el formato lecturas/segundos, p. ej. 60/60, o 0.'
+
+
 class SettingsForm(FlaskForm):
     exit_cooldown_minutes = IntegerField(
         'Intervalo de Salida (minutos)',
         validators=[DataRequired(), NumberRange(min=0, max=1440)],
         description='Tiempo mínimo en minutos que debe pasar antes de que un mismo estudiante pueda registrar otra salida.'
     )
+    scan_limit_operator = StringField(
+        'Límite de lecturas por operador',
+        validators=[DataRequired(), Regexp(SCAN_LIMIT_PATTERN, message=SCAN_LIMIT_MESSAGE)],
+        description='Lecturas permitidas por intervalo, con el formato lecturas/segundos (p. ej. 120/60). 0 deshabilita el límite.'
+    )
+    scan_limit_door = StringField(
+        'Límite de lecturas por puerta',
+        validators=[DataRequired(), Regexp(SCAN_LIMIT_PATTERN, message=SCAN_LIMIT_MESSAGE)],
+        description='Evita que un escáner defectuoso sature el servidor y afecte a las demás puertas.'
+    )
+    scan_limit_student = StringField(
+        'Límite de lecturas por estudiante',
+        validators=[DataRequired(), Regexp(SCAN_LIMIT_PATTERN, message=SCAN_LIMIT_MESSAGE)],
+        description='Corta las lecturas repetidas de un mismo QR olvidado frente a la cámara.'
+    )
     submit = SubmitField('Guardar Cambios')
 
 
 class DoorForm(FlaskForm):
     name = StringField('Nombre de la Puerta', validators=[DataRequired(), Length(max=50)])
     is_active = BooleanField('Activa', default=True)
+    # Perfil de lectura del escáner en esta puerta (ver app/scan_profile.py)
+    scan_fps = IntegerField('Lecturas por segundo', default=10, validators=[NumberRange(min=1, max=30)],
+                            description='Menos lecturas por segundo reducen el consumo de batería en tabletas modestas.')
+    scan_qrbox = IntegerField('Tamaño del recuadro de lectura (px)', default=250, validators=[NumberRange(min=150, max=600)])
+    scan_resolution = SelectField('Resolución de la cámara', default='640x480',
+                                  choices=[('480x360', '480x360 (bajo consumo)'), ('640x480', '640x480'), ('1280x720', '1280x720 (QR pequeños o lejanos)')])
+    scan_native = BooleanField('Usar el lector nativo del navegador cuando esté disponible', default=True)
     submit = SubmitField('Guardar')
 
 
@@ -61,4 +98,14 @@ class ChangePasswordForm(FlaskForm):
     password = PasswordField('Nueva Contraseña', validators=[DataRequired(), Length(min=6)])
     password2 = PasswordField(
         'Repetir Nueva Contraseña', validators=[DataRequired(), EqualTo('password', message='Las contraseñas deben coincidir.')])
-    submit = SubmitField('Cambiar Contraseña')
\ No newline at end of file
+    submit = SubmitField('Cambiar Contraseña')
+
+class BulkAuthorizationForm(FlaskForm):
+    action = SelectField('Acción', choices=[('authorize', 'Autorizar'), ('deauthorize', 'Quitar autorización')], validators=[DataRequired()])
+    course = SelectField('Curso', choices=[], validate_choice=False)
+    student_ids = TextAreaField('IDs de Estudiantes', description='Separados por comas, espacios o saltos de línea.')
+    file = FileField('Archivo con IDs (XLSX o CSV, columna "id")', validators=[
+        FileAllowed(['xlsx', 'xls', 'csv'], '¡Solo se permiten archivos XLSX o CSV!')
+    ])
+    preview = SubmitField('Previsualizar')
+    submit = SubmitField('Aplicar')
@@ -0,0 +1,96 @@
+# app/history.py
+"""
+Historial de salidas de un estudiante en un rango de fechas.
+
+La consulta se resuelve completa con el índice `ix_exits_student_history`
+(student_id, timestamp, id, door_id, operator_id): filtra por estudiante y
+fechas, viene ya ordenada y trae puerta y operador sin leer las filas de
+`exits`, así que solo toca las salidas de ese estudiante. El `id` en el índice
+desempata salidas con la misma hora sin un ordenamiento aparte.
+
+La paginación es por cursor (la última salida entregada), de la más reciente a
+la más antigua: pedir la página siguiente cuesta lo mismo que la primera.
+"""
+import base64
+import binascii
+from datetime import date, timedelta
+from sqlalchemy import and_, or_
+from .models import db, Exit, Door, User
+from .roster import encode_version, decode_version
+from .feed import MAX_ID
+from . import tz
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+# Rango por defecto (en días) cuando no se indican fechas
+DEFAULT_DAYS = 365
+
+
+def encode_cursor(timestamp, exit_id):
+    raw = f'hist:{encode_version(timestamp)}:{exit_id}'
+    return base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(timestamp, id) de la última salida entregada, o None. ValueError si es inválido."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError('Cursor inválido.')
+    prefix, _, rest = raw.partition(':')
+    version, _, exit_id = rest.partition(':')
+    if prefix != 'hist' or not version.isdigit() or not exit_id.isdigit() or int(exit_id) > MAX_ID:
+        raise ValueError('Cursor inválido.')
+    try:
+        return decode_version(version), int(exit_id)
+    except ValueError:
+        raise ValueError('Cursor inválido.')
+
+
+def parse_range(start_text, end_text):
+    """
+    Días locales (inicio, fin) a partir de textos `YYYY-MM-DD`; los que falten
+    toman el último año hasta hoy. Lanza ValueError si son inválidos.
+    """
+    try:
+        end = date.fromisoformat(end_text) if end_text else tz.today_local()
+        start = date.fromisoformat(start_text) if start_text else end - timedelta(days=DEFAULT_DAYS - 1)
+    except ValueError:
+        raise ValueError('Fecha inválida, usa el formato AAAA-MM-DD.')
+    if start > end:
+        raise ValueError('La fecha de inicio es posterior a la de fin.')
+    return start, end
+
+
+def fetch_page(student_id, start_day, end_day, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Salidas del estudiante entre los días locales `start_day` y `end_day`
+    (inclusive), más recientes primero. Devuelve (filas, siguiente_cursor, hay_mas).
+    """
+    start, end = tz.range_bounds_utc(start_day, end_day)
+    query = db.session.query(
+        Exit.id, Exit.timestamp, Door.name, User.username
+    ).join(Door, Exit.door_id == Door.id).join(User, Exit.operator_id == User.id).filter(
+        Exit.student_id == student_id,
+        Exit.timestamp >= start,
+        Exit.timestamp < end,
+    )
+    after = decode_cursor(cursor)
+    if after is not None:
+        timestamp, exit_id = after
+        query = query.filter(or_(Exit.timestamp < timestamp, and_(Exit.timestamp == timestamp, Exit.id < exit_id)))
+    rows = query.order_by(Exit.timestamp.desc(), Exit.id.desc()).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1][1], rows[-1][0]) if has_more else None
+    return rows, next_cursor, has_more
+
+
+def to_json(rows):
+    return [
+        {'id': exit_id, 'timestamp': timestamp.isoformat() + 'Z', 'door': door, 'operator': operator}
+        for exit_id, timestamp, door, operator in rows
+    ]
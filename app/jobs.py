@@ -0,0 +1,266 @@
+# app/jobs.py
+"""
+Trabajos en segundo plano para tareas pesadas de administración.
+
+La cola vive en la tabla `jobs` de la propia base de datos; un proceso aparte
+(`flask jobs-worker`) reclama y ejecuta los trabajos, así los workers web
+quedan libres para los escaneos. El progreso se guarda en la fila del trabajo
+y los resultados en `instance/jobs/<sede>/<id>/`. Con varias sedes cada una
+tiene su cola y su worker (`CAMPUS=<sede> flask jobs-worker`).
+
+Se activa con JOBS_BACKGROUND=1; sin worker en marcha los trabajos quedan en cola.
+"""
+import json
+import os
+import shutil
+import time
+import traceback
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+import pandas as pd
+from .models import db, Job, Student, User
+from .campus import cache_namespace
+from . import tasks, backfill, photos
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# tipo de trabajo -> función(job, progress)
+JOB_HANDLERS = {}
+
+
+def job_handler(kind):
+    def register(f):
+        JOB_HANDLERS[kind] = f
+        return f
+    return register
+
+
+def background_enabled():
+    return current_app.config.get('JOBS_BACKGROUND', False)
+
+
+def jobs_root():
+    return os.path.join(current_app.instance_path, 'jobs')
+
+
+def job_relpath(job_id, filename=''):
+    """Ruta dentro de `jobs_root()`: los ids de trabajo se repiten entre sedes."""
+    return os.path.join(cache_namespace(), str(job_id), filename)
+
+
+def job_dir(job_id):
+    return os.path.join(jobs_root(), job_relpath(job_id))
+
+
+def enqueue(kind, user, params=None, input_file=None, input_name=None):
+    """
+    Crea un trabajo en cola y devuelve su id. `input_file` (FileStorage) se
+    guarda junto al trabajo.
+
+    El id se toma antes del commit: después el objeto queda expirado y leerlo
+    desde una vista `@use_replica` consultaría la réplica, que aún no tiene la fila.
+    """
+    params = dict(params or {})
+    if input_file is not None:
+        params['input'] = input_name or 'input'
+    job = Job(kind=kind, status=QUEUED, params=json.dumps(params), created_by=user.id)
+    db.session.add(job)
+    db.session.flush()
+    job_id = job.id
+    db.session.commit()
+    if input_file is not None:
+        os.makedirs(job_dir(job_id), exist_ok=True)
+        input_file.save(os.path.join(job_dir(job_id), params['input']))
+    return job_id
+
+
+class Progress:
+    """Actualiza el progreso en una conexión aparte (no interfiere con la sesión del trabajo)."""
+
+    def __init__(self, job_id, min_interval=1.0):
+        self.job_id = job_id
+        self.min_interval = min_interval
+        self._last = 0.0
+
+    def __call__(self, percent, message=None):
+        now = time.monotonic()
+        if percent < 100 and now - self._last < self.min_interval:
+            return
+        self._last = now
+        values = {'progress': max(0, min(100, int(percent)))}
+        if message:
+            values['message'] = message[:255]
+        try:
+            with db.session.get_bind().begin() as conn:
+                conn.execute(Job.__table__.update().where(Job.__table__.c.id == self.job_id).values(**values))
+        except SQLAlchemyError:
+            pass # El progreso es informativo; no debe tumbar el trabajo
+
+
+def claim_next():
+    """
+    Reclama el siguiente trabajo en cola respetando JOBS_MAX_CONCURRENT.
+
+    El límite se comprueba dentro del mismo UPDATE que reclama el trabajo, así
+    dos workers no pueden pasarlo a la vez contando por separado.
+    """
+    max_concurrent = current_app.config.get('JOBS_MAX_CONCURRENT', 2)
+    job = Job.query.filter_by(status=QUEUED).order_by(Job.id).first()
+    if job is None:
+        db.session.rollback()
+        return None
+    # Conteo como tabla derivada con agregado: MySQL no deja leer en una
+    # subconsulta directa la tabla que se está actualizando
+    running = db.session.query(func.count(Job.id).label('n')).filter(Job.status == RUNNING).subquery()
+    try:
+        # Actualización condicional: si otro worker lo tomó antes o se llegó al límite, no se reclama
+        claimed = Job.query.filter(
+            Job.id == job.id, Job.status == QUEUED, select(running.c.n).scalar_subquery() < max_concurrent
+        ).update({'status': RUNNING, 'started_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+    except OperationalError:
+        # Bloqueo con otro worker que reclamaba a la vez (MySQL lo resuelve abortando uno)
+        db.session.rollback()
+        return None
+    if not claimed:
+        return None
+    db.session.refresh(job)
+    return job
+
+
+def run_job(job):
+    handler = JOB_HANDLERS.get(job.kind)
+    progress = Progress(job.id)
+    try:
+        if handler is None:
+            raise ValueError(f'Tipo de trabajo desconocido: {job.kind}')
+        handler(job, progress)
+        job = db.session.get(Job, job.id)
+        job.status = DONE
+        job.progress = 100
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error('Trabajo %s falló:\n%s', job.id, traceback.format_exc())
+        job = db.session.get(Job, job.id)
+        job.status = FAILED
+        job.message = str(e)[:255]
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return job
+
+
+def recover_stale():
+    """
+    Marca como fallidos los trabajos 'running' abandonados por un worker caído.
+    No se reencolan: un trabajo que tumba al worker se repetiría sin fin.
+    """
+    limit = datetime.utcnow() - timedelta(minutes=current_app.config.get('JOBS_STALE_MINUTES', 60))
+    count = Job.query.filter(Job.status == RUNNING, Job.started_at < limit).update(
+        {'status': FAILED, 'message': 'Trabajo abandonado (worker detenido).', 'finished_at': datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.session.commit()
+    return count
+
+
+def purge_old_results():
+    """Borra los archivos de resultados más antiguos que JOBS_RESULT_TTL_HOURS."""
+    limit = datetime.utcnow() - timedelta(hours=current_app.config.get('JOBS_RESULT_TTL_HOURS', 24))
+    old = Job.query.filter(Job.finished_at < limit, Job.result_filename.isnot(None)).all()
+    for job in old:
+        shutil.rmtree(job_dir(job.id), ignore_errors=True)
+        job.result_filename = None
+    db.session.commit()
+    return len(old)
+
+
+# --- Tipos de trabajo ---
+
+@job_handler('import_students')
+def _import_students(job, progress):
+    params = json.loads(job.params or '{}')
+    path = os.path.join(job_dir(job.id), params['input'])
+    df = pd.read_excel(path)
+    added, updated = tasks.import_students_df(df, progress)
+    job = db.session.get(Job, job.id)
+    job.message = f'Importación completa. {added} estudiantes añadidos, {updated} actualizados.'
+
+
+@job_handler('import_exits')
+def _import_exits(job, progress):
+    params = json.loads(job.params or '{}')
+    path = os.path.join(job_dir(job.id), params['input'])
+    summary = backfill.import_exits(
+        backfill.read_file(path), digest=backfill.file_digest(path),
+        default_operator_id=job.created_by, dry_run=params.get('dry_run', False), progress=progress,
+    )
+    job = db.session.get(Job, job.id)
+    job.message = backfill.summary_message(summary)
+
+
+@job_handler('import_photos')
+def _import_photos(job, progress):
+    params = json.loads(job.params or '{}')
+    with open(os.path.join(job_dir(job.id), params['input']), 'rb') as fh:
+        summary = photos.import_zip(fh, db.session.get(User, job.created_by), progress)
+    # El detalle por archivo no cabe en el mensaje: se ofrece como CSV descargable
+    filename = 'resultado_fotos.csv'
+    with open(os.path.join(job_dir(job.id), filename), 'wb') as fh:
+        fh.write(photos.summary_csv(summary))
+    job = db.session.get(Job, job.id)
+    job.result_filename = filename
+    job.message = photos.summary_message(summary)
+
+
+@job_handler('qr_zip')
+def _qr_zip(job, progress):
+    students = Student.active().order_by(Student.id).all()
+    filename = f"qr_codes_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.zip"
+    os.makedirs(job_dir(job.id), exist_ok=True)
+    tasks.write_qr_zip(students, os.path.join(job_dir(job.id), filename), progress)
+    job = db.session.get(Job, job.id)
+    job.result_filename = filename
+    job.message = f'{len(students)} códigos QR generados.'
+
+
+@job_handler('report_export')
+def _report_export(job, progress):
+    params = json.loads(job.params or '{}')
+    selected_date = datetime.strptime(params['date'], '%Y-%m-%d').date()
+    progress(10, 'Consultando salidas...')
+    exits_for_date, local_times = tasks.report_exits(selected_date)
+    progress(50, 'Generando archivo...')
+    filename = tasks.report_filename(selected_date)
+    os.makedirs(job_dir(job.id), exist_ok=True)
+    with open(os.path.join(job_dir(job.id), filename), 'wb') as fh:
+        fh.write(tasks.report_xlsx(selected_date, exits_for_date, local_times))
+    job = db.session.get(Job, job.id)
+    job.result_filename = filename
+    job.message = f'{len(exits_for_date)} salidas exportadas.'
+
+
+def run_worker(poll_interval=2.0, once=False, echo=print):
+    """Bucle principal del worker. Con `once` procesa lo pendiente y termina."""
+    recovered = recover_stale()
+    if recovered:
+        echo(f'{recovered} trabajos abandonados marcados como fallidos.')
+    last_purge = 0.0
+    while True:
+        if time.monotonic() - last_purge > 3600:
+            purge_old_results()
+            last_purge = time.monotonic()
+        job = claim_next()
+        if job is None:
+            db.session.remove()
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+        echo(f'Ejecutando trabajo {job.id} ({job.kind})...')
+        job = run_job(job)
+        echo(f'Trabajo {job.id}: {job.status}. {job.message or ""}')
@@ -1,11 +1,15 @@
 # app/models.py
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from flask_sqlalchemy import SQLAlchemy
+from .campus import CampusSession, current_campus
+from . import passwords
 import enum
+import hashlib
+import secrets
 
-db = SQLAlchemy()
+# CampusSession dirige cada consulta a la base de la sede activa (ver app/campus.py)
+db = SQLAlchemy(session_options={'class_': CampusSession})
 
 class Role(enum.Enum):
     ADMIN = 'admin'
@@ -20,10 +24,30 @@ class User(UserMixin, db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        # Turnos limitados de hash por proceso: puede lanzar passwords.HashBusy
+        return passwords.verify(self.password_hash, password)
+
+    @property
+    def is_active(self):
+        # Flask-Login no deja iniciar sesión con usuarios inactivos
+        return self.password_hash != passwords.DISABLED_HASH
+
+    def password_needs_rehash(self):
+        """True si el hash se generó con otros parámetros que PASSWORD_HASH_METHOD."""
+        return passwords.needs_rehash(self.password_hash)
+
+    def detach_records(self):
+        """Desvincula la auditoría y los trabajos del usuario antes de borrarlo (sus FK no tienen ON DELETE)."""
+        AuditLog.query.filter_by(user_id=self.id).update({'user_id': None}, synchronize_session=False)
+        Job.query.filter_by(created_by=self.id).update({'created_by': None}, synchronize_session=False)
+
+    def get_id(self):
+        # Con varias sedes el id de sesión incluye la sede: los ids se repiten entre bases
+        campus = current_campus()
+        return f'{campus}:{self.id}' if campus else str(self.id)
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -37,7 +61,15 @@ class Student(db.Model):
     photo_filename = db.Column(db.String(100), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    exits = db.relationship('Exit', backref='student', lazy=True, cascade="all, delete-orphan")
+    # Borrado lógico (STUDENT_SOFT_DELETE): el estudiante se oculta pero conserva su historial
+    deleted_at = db.Column(db.DateTime, nullable=True)
+    # passive_deletes: al borrar no se carga la colección; las salidas se eliminan en bloque
+    exits = db.relationship('Exit', backref='student', lazy=True, cascade="all, delete-orphan", passive_deletes=True)
+
+    @classmethod
+    def active(cls):
+        """Consulta de estudiantes no eliminados."""
+        return cls.query.filter(cls.deleted_at.is_(None))
 
     def __repr__(self):
         return f'<Student {self.id}: {self.name}>'
@@ -57,11 +89,18 @@ class Exit(db.Model):
     
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     operator_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # Origen de las salidas replicadas entre sedes: '<sede>:<id en la sede>' (ver app/edge.py)
+    source_uid = db.Column(db.String(64), nullable=True, unique=True, index=True)
     
     operator = db.relationship('User', backref='exits_recorded')
     # Añadimos la relación para poder acceder a los datos de la puerta fácilmente
     door = db.relationship('Door', backref='exits')
 
+    # Índice cubriente del historial por estudiante (ver app/history.py)
+    __table_args__ = (
+        db.Index('ix_exits_student_history', 'student_id', 'timestamp', 'id', 'door_id', 'operator_id'),
+    )
+
     def __repr__(self):
         return f'<Exit for student {self.student_id} at {self.timestamp}>'
 
@@ -84,4 +123,89 @@ class Door(db.Model):
     is_active = db.Column(db.Boolean, default=True, nullable=False)
 
     def __repr__(self):
-        return f'<Door {self.name}>'
\ No newline at end of file
+        return f'<Door {self.name}>'
+
+
+class ApiToken(db.Model):
+    """Token de acceso para integraciones (sistemas externos sin sesión de login)."""
+    __tablename__ = 'api_tokens'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), unique=True, nullable=False)
+    # Solo se guarda el SHA-256 del token; el valor en claro se muestra una única vez
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    # Qué puede hacer el token: cada endpoint acepta solo los de su alcance
+    scope = db.Column(db.String(20), default='feed', server_default='feed', nullable=False)
+    is_active = db.Column(db.Boolean, default=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # feed: salidas para el SIS; edge: sincronización de sedes remotas; metrics: monitoreo
+    SCOPES = ('feed', 'edge', 'metrics')
+
+    @staticmethod
+    def hash_token(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def generate(cls, name, scope='feed'):
+        """Crea un token nuevo. Devuelve (instancia, token_en_claro)."""
+        token = secrets.token_urlsafe(32)
+        return cls(name=name, token_hash=cls.hash_token(token), scope=scope), token
+
+    def __repr__(self):
+        return f'<ApiToken {self.name}>'
+
+
+class AuditLog(db.Model):
+    """Registro de acciones administrativas masivas."""
+    __tablename__ = 'audit_log'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    action = db.Column(db.String(50), nullable=False)
+    details = db.Column(db.Text, nullable=True)  # JSON con los parámetros y el resultado
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    user = db.relationship('User')
+
+    def __repr__(self):
+        return f'<AuditLog {self.action} by {self.user_id}>'
+
+
+class Job(db.Model):
+    """Trabajo en segundo plano (importaciones, ZIP de QRs, exportaciones)."""
+    __tablename__ = 'jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), default='queued', nullable=False, index=True)
+    progress = db.Column(db.Integer, default=0, nullable=False)
+    message = db.Column(db.String(255), nullable=True)
+    params = db.Column(db.Text, nullable=True)  # JSON
+    result_filename = db.Column(db.String(255), nullable=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    user = db.relationship('User')
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+
+class ScanTiming(db.Model):
+    """
+    Tiempos de un escaneo medidos en el escáner (milisegundos). Sin claves
+    foráneas ni texto libre para que cada fila ocupe lo mínimo.
+    """
+    __tablename__ = 'scan_timings'
+    id = db.Column(db.Integer, primary_key=True)
+    recorded_at = db.Column(db.DateTime, nullable=False, index=True)
+    door_id = db.Column(db.Integer, nullable=True)
+    device = db.Column(db.String(16), nullable=False)
+    status = db.Column(db.SmallInteger, nullable=False)
+    decode_ms = db.Column(db.Integer, nullable=True)
+    rtt_ms = db.Column(db.Integer, nullable=True)
+    server_ms = db.Column(db.Integer, nullable=True)
+    photo_ms = db.Column(db.Integer, nullable=True)
+
+    def __repr__(self):
+        return f'<ScanTiming {self.device} {self.recorded_at}>'
@@ -0,0 +1,141 @@
+# app/passwords.py
+"""
+Hash de contraseñas con parámetros configurables y concurrencia acotada.
+
+Al inicio de cada turno todos los operadores inician sesión a la vez, y cada
+verificación (scrypt o pbkdf2) consume CPU y memoria durante decenas o cientos
+de milisegundos. Para que una ola de logins no deje sin CPU a `/api/scan`:
+
+- Como mucho `PASSWORD_HASH_CONCURRENCY` hashes a la vez en todo el host; el
+  resto de los logins espera su turno (hasta `PASSWORD_HASH_WAIT_SECONDS`) en
+  lugar de competir con los escaneos. Los turnos son archivos de la carpeta
+  instance tomados con `flock`, así que el límite se reparte entre todos los
+  workers, también con workers sync (un login por proceso). Sin `fcntl`
+  (Windows) el límite es por proceso.
+- Con workers gevent el hash corre en el pool de hilos del hub: hashlib libera
+  el GIL, así que los greenlets de escaneo siguen atendiéndose mientras tanto.
+
+`PASSWORD_HASH_METHOD` usa el formato de werkzeug (`scrypt:32768:8:1`,
+`pbkdf2:sha256:600000`...). Si cambia, cada usuario se rehashea de forma
+transparente en su próximo login correcto.
+"""
+import os
+import threading
+import time
+from functools import lru_cache
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+from .concurrency import gevent_active
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+# Hash que ninguna contraseña satisface: usuario deshabilitado (ver app/edge.py)
+DISABLED_HASH = '!'
+
+
+class HashBusy(Exception):
+    """No hubo un turno libre para hashear dentro del tiempo de espera."""
+
+
+class HostSlots:
+    """
+    `count` turnos compartidos por todos los procesos del host: un archivo por
+    turno en `directory`, tomado con flock. flock no distingue entre hilos de un
+    mismo proceso, así que cada turno lo usa como mucho un hilo (o greenlet) a la vez.
+    """
+    POLL_SECONDS = 0.02
+
+    def __init__(self, directory, count):
+        self._fds = [
+            os.open(os.path.join(directory, f'password_hash.slot{i}'), os.O_RDWR | os.O_CREAT, 0o600)
+            for i in range(count)
+        ]
+        self._lock = threading.Lock()
+        self._free = list(range(count))
+
+    def acquire(self, timeout):
+        """Índice del turno obtenido, o None si no hubo uno libre a tiempo."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                for index in self._free:
+                    try:
+                        fcntl.flock(self._fds[index], fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue  # Lo tiene otro worker
+                    self._free.remove(index)
+                    return index
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(self.POLL_SECONDS)
+
+    def release(self, index):
+        with self._lock:
+            fcntl.flock(self._fds[index], fcntl.LOCK_UN)
+            self._free.append(index)
+
+
+class ProcessSlots:
+    """Turnos solo para este proceso (sistemas sin `fcntl`)."""
+
+    def __init__(self, count):
+        self._semaphore = threading.BoundedSemaphore(count)
+
+    def acquire(self, timeout):
+        return True if self._semaphore.acquire(timeout=timeout) else None
+
+    def release(self, token):
+        self._semaphore.release()
+
+
+def _slots():
+    app = current_app._get_current_object()
+    cached = app.extensions.get('password_hash_slots')
+    # Por pid: los descriptores abiertos antes de un fork compartirían el flock
+    if cached is None or cached[0] != os.getpid():
+        count = app.config.get('PASSWORD_HASH_CONCURRENCY', 2)
+        slots = HostSlots(app.instance_path, count) if fcntl is not None else ProcessSlots(count)
+        cached = app.extensions['password_hash_slots'] = (os.getpid(), slots)
+    return cached[1]
+
+
+def _run(func, *args):
+    slots = _slots()
+    token = slots.acquire(current_app.config.get('PASSWORD_HASH_WAIT_SECONDS', 10))
+    if token is None:
+        raise HashBusy()
+    try:
+        if gevent_active():
+            import gevent
+            return gevent.get_hub().threadpool.apply(func, args)
+        return func(*args)
+    finally:
+        slots.release(token)
+
+
+def method():
+    return current_app.config.get('PASSWORD_HASH_METHOD') or 'scrypt'
+
+
+@lru_cache(maxsize=8)
+def _prefix(method):
+    # werkzeug completa los parámetros por defecto ('scrypt' -> 'scrypt:32768:8:1');
+    # el prefijo del hash guardado se compara con el del método configurado
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, method())
+
+
+def verify(password_hash, password):
+    """True si la contraseña coincide. Lanza HashBusy si no hay turno libre."""
+    return _run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    return password_hash.split('$', 1)[0] != _prefix(method())
@@ -0,0 +1,242 @@
+# app/photos.py
+"""
+Carga masiva de fotos de estudiantes desde un ZIP con archivos `{student_id}.jpg`.
+
+El ZIP no se carga entero en memoria: werkzeug deja la subida en un archivo
+temporal y cada foto se lee por separado. Validar, reorientar, reducir y
+guardar cada imagen corre en un pool de hilos (Pillow libera el GIL al
+decodificar y codificar), con un número acotado de fotos en vuelo. Al final,
+un único UPDATE marca `photo_filename` y `updated_at` de todos los estudiantes
+con foto nueva, para que el roster publique las nuevas versiones.
+"""
+import csv
+import io
+import json
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app, g, request
+from PIL import Image, ImageOps, UnidentifiedImageError
+from sqlalchemy import String, cast, update
+from .models import db, Student, AuditLog
+from .roster import invalidate_roster_cache
+from .campus import cache_namespace
+
+EXTENSIONS = ('.jpg', '.jpeg')
+OK = 'ok'
+ERROR = 'error'
+
+
+def _noop(percent, message=None):
+    pass
+
+
+def photos_root():
+    return os.path.join(current_app.root_path, current_app.config['STUDENT_PHOTOS_FOLDER'])
+
+
+def photo_relpath(filename):
+    """Ruta de una foto dentro de `photos_root()`: cada sede tiene su subcarpeta."""
+    # Los IDs de estudiante se repiten entre sedes: `1234.jpg` de una no es el de otra
+    return os.path.join(cache_namespace(), filename)
+
+
+def photos_dir():
+    """Carpeta de fotos de la sede activa."""
+    return os.path.join(photos_root(), cache_namespace())
+
+
+def _member_id(name):
+    """ID del estudiante a partir del nombre de un archivo del ZIP, o None."""
+    base = os.path.basename(name)
+    stem, ext = os.path.splitext(base)
+    if ext.lower() not in EXTENSIONS or not stem.isdigit():
+        return None
+    return int(stem)
+
+
+def _skip(info):
+    # Carpetas y basura de macOS/Windows que suelen venir en los ZIP
+    base = os.path.basename(info.filename)
+    return info.is_dir() or info.filename.startswith('__MACOSX/') or base.startswith('.') or base == 'Thumbs.db'
+
+
+def _store(data, path, max_side, quality):
+    """Valida, reorienta, reduce y guarda una foto como JPEG. Devuelve un error o None."""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if image.format != 'JPEG':
+                return 'no es un JPEG'
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((max_side, max_side))
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            tmp_path = path + '.tmp'
+            image.save(tmp_path, 'JPEG', quality=quality, optimize=True)
+        os.replace(tmp_path, path)  # atómico: un escáner nunca ve la foto a medias
+    except (UnidentifiedImageError, OSError, ValueError, Image.DecompressionBombError):
+        return 'imagen dañada o ilegible'
+    return None
+
+
+def import_zip(fileobj, user=None, progress=_noop):
+    """
+    Procesa un ZIP de fotos. Devuelve un resumen con los contadores y el
+    resultado de cada archivo `(nombre, estado, detalle)`.
+    """
+    config = current_app.config
+    max_side = config.get('PHOTO_MAX_SIDE', 600)
+    quality = config.get('PHOTO_JPEG_QUALITY', 85)
+    max_bytes = config.get('PHOTO_MAX_FILE_BYTES', 15 * 1024 * 1024)
+    workers = config.get('PHOTO_WORKERS') or min(8, (os.cpu_count() or 1) + 1)
+    directory = photos_dir()
+    os.makedirs(directory, exist_ok=True)
+
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise ValueError('El archivo no es un ZIP válido.')
+
+    active = {id for (id,) in db.session.query(Student.id).filter(Student.deleted_at.is_(None))}
+    results, stored, seen = [], [], set()
+    members = [info for info in archive.infolist() if not _skip(info)]
+    total = len(members) or 1
+    pending = deque()
+
+    def collect(limit):
+        while len(pending) > limit:
+            name, student_id, future = pending.popleft()
+            error = future.result()
+            if error:
+                results.append((name, ERROR, error))
+            else:
+                results.append((name, OK, f'{student_id}.jpg'))
+                stored.append(student_id)
+
+    with archive, ThreadPoolExecutor(max_workers=workers) as pool:
+        for index, info in enumerate(members):
+            student_id = _member_id(info.filename)
+            if student_id is None:
+                results.append((info.filename, ERROR, 'el nombre no es {id}.jpg'))
+            elif student_id not in active:
+                results.append((info.filename, ERROR, 'estudiante no encontrado'))
+            elif student_id in seen:
+                results.append((info.filename, ERROR, 'foto repetida para el mismo estudiante'))
+            elif info.file_size > max_bytes:
+                results.append((info.filename, ERROR, 'archivo demasiado grande'))
+            else:
+                seen.add(student_id)
+                # Solo esta foto en memoria; como mucho 2 por hilo esperando en el pool
+                data = archive.read(info)
+                path = os.path.join(directory, f'{student_id}.jpg')
+                pending.append((info.filename, student_id, pool.submit(_store, data, path, max_side, quality)))
+                collect(workers * 2)
+            if index % 50 == 0:
+                progress(int(90 * index / total), f'Procesando foto {index + 1} de {total}')
+        collect(0)
+
+    if stored:
+        # Un único UPDATE: photo_filename = '<id>.jpg' y nueva versión para el roster
+        db.session.execute(
+            update(Student).where(Student.id.in_(stored)).values(
+                photo_filename=cast(Student.id, String) + '.jpg', updated_at=datetime.utcnow()
+            ).execution_options(synchronize_session=False)
+        )
+    summary = {
+        'total': len(members),
+        'stored': len(stored),
+        'errors': len(results) - len(stored),
+        'files': sorted(results, key=lambda r: (r[1] == OK, r[0])),
+    }
+    db.session.add(AuditLog(
+        user_id=user.id if user is not None else None,
+        action='bulk_photos',
+        details=json.dumps({'total': summary['total'], 'stored': summary['stored'], 'errors': summary['errors']}),
+    ))
+    db.session.commit()
+    invalidate_roster_cache()
+    progress(100, summary_message(summary))
+    return summary
+
+
+def sync_folder():
+    """
+    Asigna `photo_filename` a los estudiantes que tienen un `{id}.jpg` en la
+    carpeta de fotos (`flask sync-photos`). Devuelve (actualizados, sin
+    estudiante, omitidos). Lanza OSError si la carpeta no se puede leer.
+    """
+    updated = not_found = skipped = 0
+    for filename in os.listdir(photos_dir()):
+        stem, ext = os.path.splitext(filename)
+        if ext.lower() not in EXTENSIONS or not stem.isdigit():
+            skipped += 1  # Formato o nombre incorrecto
+            continue
+        student = db.session.get(Student, int(stem))
+        if student is None:
+            not_found += 1
+        elif student.photo_filename != filename:
+            student.photo_filename = filename
+            updated += 1
+        else:
+            skipped += 1  # Ya sincronizado
+    if updated:
+        db.session.commit()
+    return updated, not_found, skipped
+
+
+def split_by_campus(campuses):
+    """
+    Mueve las fotos de la carpeta común (de antes de separar las fotos por sede)
+    a la subcarpeta de la sede cuyo estudiante las usa. Las que usan estudiantes
+    de varias sedes no se mueven: no hay forma de saber de cuál son.
+    Devuelve (movidas, [(archivo, sedes)] ambiguas).
+    """
+    owners = {}
+    for campus in campuses:
+        g.campus = campus
+        try:
+            for (filename,) in db.session.query(Student.photo_filename).filter(Student.photo_filename.isnot(None)):
+                owners.setdefault(os.path.basename(filename), []).append(campus)
+        finally:
+            g.pop('campus', None)
+
+    root = photos_root()
+    moved, ambiguous = 0, []
+    for filename, claimed_by in sorted(owners.items()):
+        source = os.path.join(root, filename)
+        if not os.path.isfile(source):
+            continue
+        if len(claimed_by) > 1:
+            ambiguous.append((filename, claimed_by))
+            continue
+        directory = os.path.join(root, claimed_by[0])
+        os.makedirs(directory, exist_ok=True)
+        os.replace(source, os.path.join(directory, filename))
+        moved += 1
+    return moved, ambiguous
+
+
+def summary_message(summary):
+    return f"{summary['stored']} fotos guardadas de {summary['total']} archivos, {summary['errors']} con errores."
+
+
+def summary_csv(summary):
+    """Resultado por archivo en CSV (descarga de los trabajos en segundo plano)."""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['archivo', 'estado', 'detalle'])
+    writer.writerows(summary['files'])
+    return output.getvalue().encode('utf-8-sig')
+
+
+def init_app(app):
+    """
+    Límite de tamaño propio para la subida del ZIP (MAX_CONTENT_LENGTH es de 5 MB).
+    Se registra antes que CSRFProtect, que lee el formulario en su before_request.
+    """
+    @app.before_request
+    def photo_zip_limit():
+        if request.endpoint == 'routes.upload_photos':
+            request.max_content_length = app.config.get('PHOTO_ZIP_MAX_MB', 500) * 1024 * 1024
@@ -0,0 +1,138 @@
+# app/qr.py
+"""
+Contenido y renderizado de los códigos QR de los estudiantes.
+
+Todos los QR (página imprimible, ZIP de PNGs y endpoint por estudiante) salen
+de aquí, así que el formato del contenido se cambia en un único lugar. Como la
+imagen depende solo del contenido, su ETag es un hash del contenido y las
+imágenes ya renderizadas se cachean en memoria.
+
+Formatos del contenido (`QR_PAYLOAD_FORMAT`):
+- `numeric` (por defecto): el ID seguido de un dígito de control Luhn, p. ej.
+  `1234` → `12344`. Solo dígitos, así que el QR usa el modo numérico: menos
+  módulos que el JSON en modo byte, y se lee antes y desde más lejos.
+- `json`: el formato original, `{"id": 1234}`.
+
+`parse` acepta ambos, para que los carnés ya impresos sigan funcionando.
+"""
+import hashlib
+import io
+import json
+from functools import lru_cache
+from flask import current_app
+import qrcode
+import qrcode.image.svg
+from qrcode.constants import ERROR_CORRECT_L, ERROR_CORRECT_Q
+
+# Cambiar si cambia el aspecto de las imágenes, para invalidar las cachés de los navegadores
+RENDER_VERSION = '1'
+
+FORMATS = {
+    'svg': 'image/svg+xml',
+    'png': 'image/png',
+}
+
+
+PAYLOAD_FORMATS = ('numeric', 'json')
+
+# Mayor valor de `students.id` (INTEGER con signo de 32 bits en MySQL)
+MAX_STUDENT_ID = 2 ** 31 - 1
+
+
+def payload_format():
+    fmt = current_app.config.get('QR_PAYLOAD_FORMAT', 'numeric')
+    return fmt if fmt in PAYLOAD_FORMATS else 'numeric'
+
+
+def check_digit(number):
+    """Dígito de control Luhn de `number` (detecta cualquier dígito mal leído)."""
+    total = 0
+    for position, char in enumerate(reversed(str(number))):
+        digit = int(char)
+        if position % 2 == 0:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return (10 - total % 10) % 10
+
+
+def payload(student_id, fmt=None):
+    """Texto codificado en el QR de un estudiante."""
+    if (fmt or payload_format()) == 'json':
+        return json.dumps({"id": student_id})
+    return f'{student_id}{check_digit(student_id)}'
+
+
+def check_id(student_id):
+    """El ID si cabe en la columna `students.id` (INTEGER con signo). ValueError si no."""
+    student_id = int(student_id)
+    if not 0 < student_id <= MAX_STUDENT_ID:
+        raise ValueError('ID de estudiante fuera de rango.')
+    return student_id
+
+
+def parse(text):
+    """ID del estudiante leído de un QR en cualquiera de los formatos. ValueError si no es válido."""
+    text = str(text).strip()
+    if text.startswith('{'):
+        student_id = json.loads(text).get('id')
+        if isinstance(student_id, bool) or not isinstance(student_id, (int, str)):
+            raise ValueError('QR sin ID de estudiante.')
+        return check_id(student_id)
+    if len(text) < 2 or not text.isdigit():
+        raise ValueError('Formato de QR desconocido.')
+    number, digit = text[:-1], int(text[-1])
+    if check_digit(number) != digit:
+        raise ValueError('Dígito de control del QR incorrecto.')
+    return check_id(number)
+
+
+def scan_student_id(data):
+    """
+    ID del estudiante de una petición de escaneo: `code` (texto del QR tal cual)
+    o `student_id`. ValueError/TypeError si falta o no es válido.
+    """
+    if 'code' in data:
+        return parse(data['code'])
+    return check_id(data['student_id'])
+
+
+def _make(data, box_size, border, image_factory=None):
+    # El contenido numérico cabe en la versión 1 (21x21) incluso con corrección Q
+    # (25% del código recuperable), así que los carnés gastados se siguen leyendo
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=ERROR_CORRECT_Q if data.isdigit() else ERROR_CORRECT_L,
+        box_size=box_size,
+        border=border,
+        image_factory=image_factory,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.make_image(fill_color="black", back_color="white") if image_factory is None else qr.make_image()
+
+
+def png_bytes(data, box_size=10, border=1):
+    buffered = io.BytesIO()
+    _make(data, box_size, border).save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+def svg_bytes(data, border=1):
+    # SVG vectorial: pocos KB y se imprime nítido a cualquier tamaño
+    buffered = io.BytesIO()
+    _make(data, 10, border, qrcode.image.svg.SvgPathImage).save(buffered)
+    return buffered.getvalue()
+
+
+@lru_cache(maxsize=2048)
+def render(data, fmt):
+    """Imagen del QR en `fmt` ('svg' o 'png'), cacheada por contenido."""
+    if fmt == 'svg':
+        return svg_bytes(data)
+    return png_bytes(data)
+
+
+def etag(data, fmt):
+    return hashlib.sha1(f'{RENDER_VERSION}:{fmt}:{data}'.encode()).hexdigest()
@@ -0,0 +1,198 @@
+# app/ratelimit.py
+"""
+Limitador de lecturas (token bucket) para `/api/scan`.
+
+Una cámara trabada o un QR olvidado frente al escáner puede generar decenas de
+peticiones por segundo. Cada petición pasa por tres cubetas, por operador, por
+puerta y por estudiante, y si alguna está vacía se rechaza con 429 y
+`Retry-After` *antes* de tocar la base de datos. Así un dispositivo que falla
+solo agota su propia cubeta y no la latencia de las demás puertas.
+
+Los límites se guardan en la tabla `settings` con el formato `<lecturas>/<segundos>`
+(p. ej. `60/60`; `0` deshabilita esa dimensión) y se cachean en memoria durante
+`SCAN_RATE_LIMIT_CACHE_SECONDS`. Las cubetas y contadores son por proceso: con
+varios workers el límite efectivo es el configurado multiplicado por el número
+de workers, suficiente para cortar ráfagas de un dispositivo.
+"""
+import math
+import threading
+import time
+from functools import wraps
+from flask import current_app, jsonify, request, session
+from .campus import cache_namespace
+from . import qr
+
+DIMENSIONS = ('operator', 'door', 'student')
+
+# clave en la tabla settings -> valor por defecto
+SETTING_KEYS = {
+    'operator': 'scan_limit_operator',
+    'door': 'scan_limit_door',
+    'student': 'scan_limit_student',
+}
+DEFAULT_LIMITS = {
+    'operator': '120/60',
+    'door': '120/60',
+    'student': '5/10',
+}
+
+# Cubetas inactivas que se conservan antes de purgar las que ya están llenas
+MAX_BUCKETS = 10000
+
+
+def parse_limit(value):
+    """'60/60' -> (capacidad, lecturas por segundo); None si está deshabilitado."""
+    value = (value or '').strip()
+    if not value or value == '0':
+        return None
+    count, _, seconds = value.partition('/')
+    count, seconds = int(count), float(seconds or 1)
+    if count <= 0 or seconds <= 0:
+        return None
+    return count, count / seconds
+
+
+class TokenBucketLimiter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}  # clave -> [fichas, último_relleno]
+        self.counters = {dim: {'allowed': 0, 'rejected': 0} for dim in DIMENSIONS}
+        self.rejected_by_key = {}
+
+    def _level(self, key, capacity, rate, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return capacity
+        return min(capacity, bucket[0] + (now - bucket[1]) * rate)
+
+    def hit(self, checks, now=None):
+        """
+        Intenta consumir una ficha de cada cubeta `(dimensión, clave, (capacidad, tasa))`.
+        Solo se consume si todas tienen saldo. Devuelve (permitido, segundos_de_espera, dimensión).
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            levels = [self._level(key, *limit, now) for _, key, limit in checks]
+            wait, blocked = 0.0, None
+            for (dimension, key, (capacity, rate)), level in zip(checks, levels):
+                if level < 1:
+                    needed = (1 - level) / rate
+                    if needed > wait:
+                        wait, blocked = needed, dimension
+            if blocked is not None:
+                self.counters[blocked]['rejected'] += 1
+                blocked_key = next(key for dim, key, _ in checks if dim == blocked)
+                self.rejected_by_key[blocked_key] = self.rejected_by_key.get(blocked_key, 0) + 1
+                return False, wait, blocked
+            for (dimension, key, _), level in zip(checks, levels):
+                self._buckets[key] = [level - 1, now]
+                self.counters[dimension]['allowed'] += 1
+            if len(self._buckets) > MAX_BUCKETS:
+                self._prune(checks, now)
+            return True, 0.0, None
+
+    def _prune(self, checks, now):
+        # Las cubetas sin uso reciente están llenas: borrarlas no cambia nada
+        limits = {dimension: limit for dimension, _, limit in checks}
+        for key, (tokens, last) in list(self._buckets.items()):
+            capacity, rate = limits.get(key[1], (1, 1.0))
+            if tokens + (now - last) * rate >= capacity:
+                del self._buckets[key]
+
+    def stats(self, top=10):
+        with self._lock:
+            offenders = sorted(self.rejected_by_key.items(), key=lambda item: item[1], reverse=True)[:top]
+            return {
+                'counters': {dim: dict(values) for dim, values in self.counters.items()},
+                'active_buckets': len(self._buckets),
+                'top_rejected': [
+                    {'campus': key[0] or None, 'dimension': key[1], 'key': key[2], 'rejected': count}
+                    for key, count in offenders
+                ],
+            }
+
+
+def get_limiter():
+    app = current_app._get_current_object()
+    limiter = app.extensions.get('scan_limiter')
+    if limiter is None:
+        limiter = app.extensions.setdefault('scan_limiter', TokenBucketLimiter())
+    return limiter
+
+
+# Límites leídos de la tabla settings, por sede: namespace -> (leído_en, límites)
+_limits_cache = {}
+
+
+def invalidate_limits():
+    _limits_cache.clear()
+
+
+def current_limits():
+    """Límites activos por dimensión (cacheados unos segundos para no consultar la DB en cada lectura)."""
+    namespace = cache_namespace()
+    ttl = current_app.config.get('SCAN_RATE_LIMIT_CACHE_SECONDS', 30)
+    cached = _limits_cache.get(namespace)
+    now = time.monotonic()
+    if cached and now - cached[0] < ttl:
+        return cached[1]
+
+    from .models import Setting
+    rows = dict(Setting.query.with_entities(Setting.key, Setting.value).filter(
+        Setting.key.in_(SETTING_KEYS.values())
+    ).all())
+    limits = {}
+    for dimension, key in SETTING_KEYS.items():
+        try:
+            limits[dimension] = parse_limit(rows.get(key, DEFAULT_LIMITS[dimension]))
+        except ValueError:
+            current_app.logger.warning("Límite '%s' inválido en settings, se usa el valor por defecto.", key)
+            limits[dimension] = parse_limit(DEFAULT_LIMITS[dimension])
+    _limits_cache[namespace] = (now, limits)
+    return limits
+
+
+def scan_rate_limited(f):
+    """
+    Aplica el limitador a una vista de escaneo. Va *antes* de `login_required`
+    para que las peticiones rechazadas no consulten ni el usuario en la DB:
+    el operador se toma del id guardado en la cookie de sesión.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_app.config.get('SCAN_RATE_LIMIT_ENABLED', True):
+            return f(*args, **kwargs)
+        operator = session.get('_user_id')
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            data = {}
+        if operator is None:
+            return f(*args, **kwargs)  # login_required responderá
+
+        namespace = cache_namespace()
+        limits = current_limits()
+        try:
+            # El mismo ID que resolverá api_scan, venga como `code` (QR) o como `student_id`
+            student = qr.scan_student_id(data)
+        except (KeyError, TypeError, ValueError):
+            student = None  # api_scan responderá 400
+        values = {'operator': operator, 'door': data.get('door'), 'student': student}
+        checks = [
+            (dimension, (namespace, dimension, str(values[dimension])), limits[dimension])
+            for dimension in DIMENSIONS
+            if limits.get(dimension) and values[dimension] is not None
+        ]
+        allowed, wait, dimension = get_limiter().hit(checks)
+        if not allowed:
+            retry_after = max(1, math.ceil(wait))
+            response = jsonify({
+                'success': False,
+                'message': f'Demasiadas lecturas seguidas. Espere {retry_after} s.',
+                'retry_after': retry_after,
+                'limited_by': dimension,
+            })
+            response.status_code = 429
+            response.headers['Retry-After'] = str(retry_after)
+            return response
+        return f(*args, **kwargs)
+    return decorated_function
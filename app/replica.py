@@ -0,0 +1,90 @@
+# app/replica.py
+"""
+Réplica de solo lectura para reportes y paneles.
+
+Las vistas marcadas con `@use_replica` envían sus SELECT a la réplica
+(`SQLALCHEMY_REPLICA_URL`); las escrituras, el flush de la sesión y cualquier
+vista sin marcar (como `api_scan` y su control de cooldown) siguen en el primario.
+
+Guardia de retraso: cada pocos segundos el proceso escribe un latido en la tabla
+`settings` del primario y lo lee en la réplica. Si la réplica va más atrasada
+que `REPLICA_MAX_LAG_SECONDS` (o no responde) se usa el primario.
+"""
+import time
+from datetime import datetime
+from functools import wraps
+import sqlalchemy as sa
+from flask import g, current_app, has_app_context
+
+BIND_KEY = 'replica'
+HEARTBEAT_KEY = 'replica_heartbeat'
+HEARTBEAT_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+_settings = sa.table('settings', sa.column('id'), sa.column('key'), sa.column('value'))
+
+# Estado de la guardia por proceso: (momento_de_la_comprobación, réplica_utilizable)
+_lag_state = {'checked_at': 0.0, 'healthy': False}
+
+
+def use_replica(f):
+    """Marca una vista (o comando) de solo lectura para leer desde la réplica."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.use_replica = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def _heartbeat(primary, replica):
+    now = datetime.utcnow()
+    with primary.begin() as conn:
+        updated = conn.execute(
+            _settings.update().where(_settings.c.key == HEARTBEAT_KEY).values(value=now.strftime(HEARTBEAT_FORMAT))
+        ).rowcount
+        if not updated:
+            conn.execute(_settings.insert().values(key=HEARTBEAT_KEY, value=now.strftime(HEARTBEAT_FORMAT)))
+    with replica.connect() as conn:
+        value = conn.execute(sa.select(_settings.c.value).where(_settings.c.key == HEARTBEAT_KEY)).scalar()
+    if value is None:
+        return None
+    return (now - datetime.strptime(value, HEARTBEAT_FORMAT)).total_seconds()
+
+
+def replica_is_healthy(db):
+    """Comprueba (con caché) que la réplica responde y no va demasiado atrasada."""
+    config = current_app.config
+    max_lag = config.get('REPLICA_MAX_LAG_SECONDS', 10)
+    if max_lag < 0:
+        return True  # Guardia deshabilitada
+    now = time.monotonic()
+    if now - _lag_state['checked_at'] < config.get('REPLICA_LAG_CHECK_INTERVAL', 5):
+        return _lag_state['healthy']
+    try:
+        lag = _heartbeat(db.engines[None], db.engines[BIND_KEY])
+        healthy = lag is not None and lag <= max_lag
+    except sa.exc.SQLAlchemyError as e:
+        current_app.logger.warning('Réplica no disponible, se usa el primario: %s', e)
+        healthy = False
+    _lag_state.update(checked_at=now, healthy=healthy)
+    return healthy
+
+
+def select_engine(db, clause, flushing):
+    """Engine de la réplica si corresponde a esta consulta, o None para el primario."""
+    if flushing or not has_app_context() or not g.get('use_replica'):
+        return None
+    if BIND_KEY not in db.engines or not isinstance(clause, sa.sql.Select):
+        return None
+    if not replica_is_healthy(db):
+        return None
+    return db.engines[BIND_KEY]
+
+
+def init_app(app):
+    """Registra el bind de la réplica. Llamar antes de `db.init_app`."""
+    url = app.config.get('SQLALCHEMY_REPLICA_URL')
+    if not url:
+        return
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    binds[BIND_KEY] = url
+    app.config['SQLALCHEMY_BINDS'] = binds
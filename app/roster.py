@@ -0,0 +1,101 @@
+# app/roster.py
+"""
+Roster compacto de estudiantes para los clientes de escaneo.
+
+El escáner guarda una copia local del roster (IndexedDB) para dar una respuesta
+inmediata en la puerta. Aquí se calcula el snapshot completo y los deltas a
+partir de un token de versión basado en `Student.updated_at`.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from .models import db, Student
+from .campus import cache_namespace
+
+EPOCH = datetime(1970, 1, 1)
+
+# Orden de las columnas de cada fila del roster
+ROSTER_FIELDS = ['id', 'name', 'course', 'authorized', 'photo', 'photo_version']
+
+# Caché en memoria del snapshot completo: {sede: ((version, total), payload)}
+_snapshot_cache = {}
+
+
+def encode_version(dt):
+    """Convierte un datetime UTC (naive) en un token opaco (microsegundos)."""
+    if dt is None:
+        return '0'
+    return str((dt - EPOCH) // timedelta(microseconds=1))
+
+
+def decode_version(token):
+    """Convierte un token de versión en datetime UTC. Lanza ValueError si es inválido."""
+    value = int(token)
+    if value < 0:
+        raise ValueError('Token de versión negativo.')
+    try:
+        return EPOCH + timedelta(microseconds=value)
+    except OverflowError:
+        raise ValueError('Token de versión fuera de rango.')
+
+
+def roster_state():
+    """Devuelve (version, total) del roster con una sola consulta agregada."""
+    max_updated, total = db.session.query(
+        func.max(Student.updated_at), func.count(Student.id)
+    ).filter(Student.deleted_at.is_(None)).one()
+    return encode_version(max_updated), total
+
+
+def _rows(since=None):
+    query = db.session.query(
+        Student.id, Student.name, Student.course, Student.authorized,
+        Student.photo_filename, Student.updated_at
+    ).filter(Student.deleted_at.is_(None))
+    if since is not None:
+        # Se usa >= porque algunos motores (MySQL) guardan DATETIME con precisión de
+        # segundos; repetir una fila en el delta es inofensivo, perderla no.
+        query = query.filter(Student.updated_at >= since)
+    return [
+        [sid, name, course, 1 if authorized else 0, photo,
+         encode_version(updated_at) if photo else None]
+        for sid, name, course, authorized, photo, updated_at in query.order_by(Student.id)
+    ]
+
+
+def build_roster(since_token=None):
+    """
+    Construye el payload del roster.
+
+    Sin `since_token` devuelve el snapshot completo (cacheado por versión).
+    Con token devuelve solo los estudiantes modificados desde esa versión; el
+    cliente compara `total` con su copia local para detectar eliminaciones y
+    pedir un snapshot completo cuando no coinciden.
+    """
+    version, total = roster_state()
+    if since_token is None:
+        key = (version, total)
+        cached_key, payload = _snapshot_cache.get(cache_namespace(), (None, None))
+        if cached_key != key:
+            payload = {
+                'version': version,
+                'total': total,
+                'full': True,
+                'fields': ROSTER_FIELDS,
+                'students': _rows(),
+            }
+            _snapshot_cache[cache_namespace()] = (key, payload)
+        return payload
+
+    since = decode_version(since_token)
+    return {
+        'version': version,
+        'total': total,
+        'full': False,
+        'fields': ROSTER_FIELDS,
+        'students': _rows(since) if encode_version(since) != version else [],
+    }
+
+
+def invalidate_roster_cache():
+    """Descarta el snapshot cacheado de la sede activa (tras cambios masivos)."""
+    _snapshot_cache.pop(cache_namespace(), None)
@@ -3,29 +3,62 @@ import pandas as pd
 import io
 import os 
 from flask import (
-    Blueprint, render_template, redirect, url_for, flash, request, jsonify, Response, current_app, send_from_directory, send_file
+    Blueprint, render_template, redirect, url_for, flash, request, jsonify, Response, current_app, send_from_directory, abort, g
 )
 from flask_login import login_user, logout_user, current_user, login_required
 from werkzeug.utils import secure_filename
-from .models import db, User, Student, Exit, Role, Door
-from .forms import LoginForm, RegistrationForm, StudentForm, ImportForm, SettingsForm, DoorForm, ReportForm, ChangePasswordForm
-from .decorators import admin_required
-import qrcode
-import base64
-import json
+from .models import db, User, Student, Exit, Role, Door, Job
+from .forms import LoginForm, RegistrationForm, StudentForm, ImportForm, SettingsForm, DoorForm, ReportForm, ChangePasswordForm, BulkAuthorizationForm, ExitImportForm, PhotoZipForm
+from .decorators import admin_required, token_required
+from .replica import use_replica
+from .sendfile import send_protected
+from .ratelimit import scan_rate_limited, get_limiter, invalidate_limits, current_limits, SETTING_KEYS, DEFAULT_LIMITS as DEFAULT_SCAN_LIMITS
+from .roster import build_roster, encode_version
+from .assets import DIST_FOLDER, PRECACHE_ASSETS, precache_version
+from .cooldown import check_cooldown, release as release_cooldown
+from .feed import decode_cursor, fetch_page, to_ndjson, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from . import bulk, backfill, telemetry, scan_profile, edge, passwords, photos, history, csrf
+from .telemetry import server_timing
+from . import tasks, jobs, qr
 from datetime import datetime, timedelta, date, time
 from .models import db, User, Student, Exit, Role, Setting # <--- Añadir Setting
 from sqlalchemy import func
-import pytz
-from qrcode.constants import ERROR_CORRECT_L
-import zipfile
-import tempfile
+from sqlalchemy.exc import IntegrityError
+from . import tz
+import mimetypes
 
 bp = Blueprint('routes', __name__)
 # --- Ruta para servir el Service Worker desde la raíz ---
 @bp.route('/sw.js')
 def service_worker():
-    return send_from_directory('static', 'sw.js')
+    # Se renderiza como plantilla para precachear las URLs con hash del manifiesto;
+    # la versión del caché sale del contenido de esos archivos
+    response = Response(
+        render_template('sw.js', cache_version=precache_version(), precache_assets=PRECACHE_ASSETS),
+        mimetype='application/javascript'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# --- Assets con hash: caché inmutable y variantes precomprimidas ---
+@bp.route('/assets/<path:filename>')
+def hashed_asset(filename):
+    directory = os.path.join(current_app.static_folder, DIST_FOLDER)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    served_name = filename
+    encoding = None
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if candidate in request.accept_encodings and os.path.isfile(os.path.join(directory, filename + suffix)):
+            served_name, encoding = filename + suffix, candidate
+            break
+
+    response = send_from_directory(directory, served_name, mimetype=mimetype, max_age=31536000)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+        response.headers.pop('Content-Disposition', None)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
 # --- Rutas de Autenticación ---
 @bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -34,7 +67,16 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
-        if user is None or not user.check_password(form.password.data):
+        try:
+            valid = user is not None and user.check_password(form.password.data)
+            if valid and user.password_needs_rehash():
+                # Parámetros de hash cambiados (PASSWORD_HASH_METHOD): se actualiza ahora que tenemos la contraseña
+                user.set_password(form.password.data)
+                db.session.commit()
+        except passwords.HashBusy:
+            flash('Hay muchos inicios de sesión en curso. Intente de nuevo en unos segundos.', 'warning')
+            return redirect(url_for('routes.login'))
+        if not valid:
             flash('Usuario o contraseña inválidos', 'danger')
             return redirect(url_for('routes.login'))
         login_user(user, remember=form.remember_me.data)
@@ -64,31 +106,21 @@ def register():
 # --- Rutas Principales ---
 @bp.route('/')
 @login_required
+@use_replica
 def dashboard():
     # --- Lógica de cálculo de estadísticas del día ---
 
-    # 1. Cargar la zona horaria local
-    try:
-        local_tz = pytz.timezone(current_app.config.get('LOCAL_TIMEZONE', 'UTC'))
-    except pytz.UnknownTimeZoneError:
-        local_tz = pytz.utc
-
-    # 2. Definir el rango del día actual en la zona horaria local y convertirlo a UTC
-    today_local = datetime.now(local_tz).date()
-    start_of_day_local = local_tz.localize(datetime.combine(today_local, time.min))
-    end_of_day_local = local_tz.localize(datetime.combine(today_local, time.max))
-    
-    start_of_day_utc = start_of_day_local.astimezone(pytz.utc)
-    end_of_day_utc = end_of_day_local.astimezone(pytz.utc)
+    # 1. Rango del día actual (zona horaria local) expresado en UTC
+    start_of_day_utc, end_of_day_utc = tz.day_bounds_utc(tz.today_local())
 
-    # 3. Consultar las salidas del día y agrupar por puerta
+    # 2. Consultar las salidas del día y agrupar por puerta
     # Usamos una consulta de SQLAlchemy para que la base de datos haga el trabajo pesado.
     exits_by_door = db.session.query(
         Door.name,
         func.count(Exit.id)
     ).join(Door, Exit.door_id == Door.id).filter(
         Exit.timestamp >= start_of_day_utc,
-        Exit.timestamp <= end_of_day_utc
+        Exit.timestamp < end_of_day_utc
     ).group_by(Door.name).all()
 
     # Formatear los resultados en un diccionario más fácil de usar en la plantilla
@@ -98,8 +130,8 @@ def dashboard():
     # Calcular el total de salidas del día
     total_exits_today = sum(daily_stats.values())
     
-    # 4. Obtener el total de estudiantes (como antes)
-    student_count = Student.query.count()
+    # 3. Obtener el total de estudiantes (como antes)
+    student_count = Student.active().count()
 
     return render_template(
         'main/dashboard.html',
@@ -113,10 +145,13 @@ def dashboard():
 def scan():
     # Cargar solo las puertas activas para el selector
     active_doors = Door.query.filter_by(is_active=True).order_by(Door.name).all()
-    return render_template('main/scan.html', doors=active_doors)
+    profiles = scan_profile.get_profiles([door.id for door in active_doors])
+    return render_template('main/scan.html', doors=active_doors, scan_profiles=profiles,
+                           default_profile=scan_profile.DEFAULT_PROFILE, resolutions=scan_profile.RESOLUTIONS)
 
 @bp.route('/exits')
 @login_required
+@use_replica
 def list_exits():
     page = request.args.get('page', 1, type=int)
     exits = Exit.query.order_by(Exit.timestamp.desc()).paginate(page=page, per_page=15)
@@ -124,7 +159,34 @@ def list_exits():
 
 # app/routes.py
 
+@bp.route('/exits/import', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def import_exits():
+    """Carga de salidas históricas desde CSV/XLSX (ver app/backfill.py)."""
+    form = ExitImportForm()
+    summary = None
+    if form.validate_on_submit():
+        file = form.file.data
+        filename = secure_filename(file.filename)
+        file_ext = os.path.splitext(filename)[1].lower()
+        if jobs.background_enabled():
+            job_id = jobs.enqueue('import_exits', current_user, params={'dry_run': form.dry_run.data},
+                                  input_file=file, input_name=f'input{file_ext}')
+            return redirect(url_for('routes.job_status', id=job_id))
+        try:
+            df, digest = backfill.read_upload(file.read(), filename)
+            summary = backfill.import_exits(df, digest=digest, default_operator_id=current_user.id,
+                                            dry_run=form.dry_run.data)
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('routes.import_exits'))
+        flash(backfill.summary_message(summary), 'success' if not summary['error_count'] else 'warning')
+    return render_template('main/import_exits.html', form=form, summary=summary, title="Importar Historial")
+
 @bp.route('/api/scan', methods=['POST'])
+@server_timing
+@scan_rate_limited
 @login_required
 def api_scan():
     # --- Obtener el intervalo de cooldown desde la DB ---
@@ -133,11 +195,12 @@ def api_scan():
     cooldown_minutes = int(cooldown_setting.value) if cooldown_setting else 60
 
     data = request.get_json()
-    if not data or 'student_id' not in data or 'door' not in data:
+    if not data or ('student_id' not in data and 'code' not in data) or 'door' not in data:
         return jsonify({'success': False, 'message': 'Datos incompletos.'}), 400
 
     try:
-        student_id = int(data['student_id'])
+        # `code` es el texto leído del QR tal cual (formato numérico o JSON antiguo)
+        student_id = qr.scan_student_id(data)
         # --- CAMBIO AQUÍ: Ahora recibimos un door_id ---
         door_id = int(data['door'])
     except (ValueError, TypeError):
@@ -148,7 +211,7 @@ def api_scan():
     if not door:
         return jsonify({'success': False, 'message': 'Puerta no válida o inactiva.'}), 400
 
-    student = Student.query.get(student_id)
+    student = Student.active().filter_by(id=student_id).first()
     if not student:
         return jsonify({'success': False, 'message': f'Estudiante con ID {student_id} no encontrado.'}), 404
     
@@ -156,26 +219,34 @@ def api_scan():
         return jsonify({'success': False, 'message': f'Salida no autorizada para {student.name}.'}), 403
 
     # --- NUEVA VALIDACIÓN DE COOLDOWN ---
-    last_exit = Exit.query.filter_by(student_id=student.id).order_by(Exit.timestamp.desc()).first()
-    if last_exit:
-        time_since_last_exit = datetime.utcnow() - last_exit.timestamp
-        if time_since_last_exit < timedelta(minutes=cooldown_minutes):
-            minutes_remaining = cooldown_minutes - int(time_since_last_exit.total_seconds() / 60)
-            message = f'Salida ya registrada. Intente de nuevo en {minutes_remaining} min.'
-            return jsonify({'success': False, 'message': message}), 429 # 429: Too Many Requests
-
-    new_exit = Exit(
-        student_id=student.id,
-        student_name=student.name,
-        course=student.course,
-        door_id=door.id,
-        operator_id=current_user.id
-    )
-    db.session.add(new_exit)
-    db.session.commit()
+    # Con la tabla compartida habilitada es una lectura de memoria entre workers
+    last_exit_time, reservation = check_cooldown(student.id, cooldown_minutes)
+    if last_exit_time:
+        time_since_last_exit = datetime.utcnow() - last_exit_time
+        minutes_remaining = cooldown_minutes - int(time_since_last_exit.total_seconds() / 60)
+        message = f'Salida ya registrada. Intente de nuevo en {minutes_remaining} min.'
+        return jsonify({'success': False, 'message': message}), 429 # 429: Too Many Requests
+
+    # Desde aquí la reserva de cooldown se deshace ante cualquier error
+    try:
+        new_exit = Exit(
+            student_id=student.id,
+            student_name=student.name,
+            course=student.course,
+            door_id=door.id,
+            operator_id=current_user.id
+        )
+        db.session.add(new_exit)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        release_cooldown(reservation)
+        raise
     photo_url = None
     if student.photo_filename:
-        photo_url = url_for('routes.student_photo', filename=student.photo_filename, _external=True)
+        # Misma URL versionada que usa el roster local, para aprovechar la foto precargada
+        photo_url = url_for('routes.student_photo', filename=student.photo_filename,
+                            v=encode_version(student.updated_at), _external=True)
 
     return jsonify({
         'success': True,
@@ -183,13 +254,117 @@ def api_scan():
         'student': {'name': student.name, 'course': student.course, 'photo_url': photo_url }
     })
 
+@bp.route('/api/telemetry/scans', methods=['POST'])
+@login_required
+def api_scan_telemetry():
+    """Recibe lotes de tiempos medidos por los escáneres (ver app/telemetry.py)."""
+    try:
+        rows = telemetry.parse_batch(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'stored': telemetry.store_batch(rows)})
+
+TELEMETRY_RANGES = {1: 'Últimas 24 horas', 7: 'Últimos 7 días', 30: 'Últimos 30 días'}
+
+@bp.route('/telemetry')
+@login_required
+@admin_required
+@use_replica
+def scan_latency():
+    """Percentiles de latencia de escaneo por puerta y por dispositivo."""
+    days = request.args.get('days', 1, type=int)
+    if days not in TELEMETRY_RANGES:
+        days = 1
+    stats = telemetry.latency_stats(datetime.utcnow() - timedelta(days=days))
+    return render_template('main/telemetry.html', stats=stats, days=days, ranges=TELEMETRY_RANGES,
+                           title="Latencia de Escaneo")
+
+@bp.route('/api/metrics/scan-limits')
+@token_required('metrics')
+def api_scan_limit_metrics():
+    """Contadores del limitador de lecturas de este proceso, para monitoreo."""
+    stats = get_limiter().stats()
+    stats['limits'] = {
+        dimension: ({'burst': limit[0], 'per_second': limit[1]} if limit else None)
+        for dimension, limit in current_limits().items()
+    }
+    return jsonify(stats)
+
+@bp.route('/api/edge/changes')
+@token_required('edge')
+def api_edge_changes():
+    """Cambios de roster, puertas, usuarios, settings y salidas para una sede remota."""
+    try:
+        exits_after = int(request.args.get('exits_after', 0))
+        payload = edge.changes(g.api_token.name, request.args.get('since') or None, exits_after)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Parámetros inválidos.'}), 400
+    return jsonify(payload)
+
+@bp.route('/api/edge/exits', methods=['POST'])
+@csrf.exempt
+@token_required('edge')
+def api_edge_exits():
+    """Recibe un lote de salidas de una sede remota (idempotente por `source_uid`)."""
+    data = request.get_json(silent=True)
+    try:
+        summary = edge.receive_exits(g.api_token.name, data.get('exits') if isinstance(data, dict) else None)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except IntegrityError:
+        # Otro envío del mismo lote se adelantó: la sede reintentará y verá duplicados
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'Lote en proceso, reintente.'}), 409
+    return jsonify({'success': True, **summary})
+
+@bp.route('/api/roster')
+@login_required
+def api_roster():
+    """
+    Roster compacto para la validación local del escáner.
+    Sin parámetros devuelve el snapshot completo; con `?since=<version>` solo los
+    cambios. Soporta ETag / If-None-Match para que un refresco sin cambios sea un 304.
+    """
+    since = request.args.get('since')
+    try:
+        payload = build_roster(since)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Token de versión inválido.'}), 400
+
+    response = jsonify(payload)
+    response.set_etag(f"{payload['version']}-{payload['total']}-{since or 'full'}")
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+@bp.route('/api/exits/feed')
+@token_required('feed')
+@use_replica
+def api_exits_feed():
+    """
+    Feed NDJSON de salidas posteriores a `cursor`, en orden estable por id.
+    El cursor para la siguiente consulta va en la cabecera `X-Next-Cursor`.
+    """
+    try:
+        after_id = decode_cursor(request.args.get('cursor', ''))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    rows, next_cursor, has_more = fetch_page(after_id, limit)
+    response = Response(''.join(to_ndjson(rows)), mimetype='application/x-ndjson')
+    response.headers['X-Next-Cursor'] = next_cursor
+    response.headers['X-Has-More'] = 'true' if has_more else 'false'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 # --- CRUD de Estudiantes ---
 @bp.route('/students')
 @login_required
 @admin_required
 def list_students():
     page = request.args.get('page', 1, type=int)
-    students = Student.query.order_by(Student.name).paginate(page=page, per_page=15)
+    students = Student.active().order_by(Student.name).paginate(page=page, per_page=15)
     return render_template('students/students.html', students=students)
 
 @bp.route('/students/new', methods=['GET', 'POST'])
@@ -198,16 +373,24 @@ def list_students():
 def create_student():
     form = StudentForm()
     if form.validate_on_submit():
-        if Student.query.get(form.id.data):
+        existing = Student.query.get(form.id.data)
+        if existing and existing.deleted_at is None:
             flash('Ya existe un estudiante con ese ID.', 'danger')
         else:
-            student = Student(id=form.id.data, name=form.name.data, course=form.course.data, authorized=form.authorized.data)
+            if existing:
+                # Estudiante eliminado lógicamente: se restaura con los nuevos datos
+                student = existing
+                student.deleted_at = None
+                student.name, student.course, student.authorized = form.name.data, form.course.data, form.authorized.data
+            else:
+                student = Student(id=form.id.data, name=form.name.data, course=form.course.data, authorized=form.authorized.data)
             # --- LÓGICA DE SUBIDA DE FOTO ---
             if form.photo.data:
                 photo_file = form.photo.data
                 # Guardar el archivo como {student.id}.jpg
                 filename = f"{student.id}.jpg"
-                photo_path = os.path.join(current_app.root_path, current_app.config['STUDENT_PHOTOS_FOLDER'], filename)
+                os.makedirs(photos.photos_dir(), exist_ok=True)
+                photo_path = os.path.join(photos.photos_dir(), filename)
                 photo_file.save(photo_path)
                 student.photo_filename = filename
             db.session.add(student)
@@ -220,7 +403,7 @@ def create_student():
 @login_required
 @admin_required
 def edit_student(id):
-    student = Student.query.get_or_404(id)
+    student = Student.active().filter_by(id=id).first_or_404()
     form = StudentForm(obj=student)
     if form.validate_on_submit():
         student.name = form.name.data
@@ -230,9 +413,13 @@ def edit_student(id):
         if form.photo.data:
             photo_file = form.photo.data
             filename = f"{student.id}.jpg"
-            photo_path = os.path.join(current_app.root_path, current_app.config['STUDENT_PHOTOS_FOLDER'], filename)
+            os.makedirs(photos.photos_dir(), exist_ok=True)
+            photo_path = os.path.join(photos.photos_dir(), filename)
             photo_file.save(photo_path)
             student.photo_filename = filename
+            # El nombre del archivo no cambia; forzamos updated_at para que el roster
+            # publique una nueva versión de la foto y los escáneres la recarguen.
+            student.updated_at = datetime.utcnow()
         db.session.commit()
         flash('Estudiante actualizado exitosamente.', 'success')
         return redirect(url_for('routes.list_students'))
@@ -242,12 +429,66 @@ def edit_student(id):
 @login_required
 @admin_required
 def delete_student(id):
-    student = Student.query.get_or_404(id)
-    db.session.delete(student)
+    student = Student.active().filter_by(id=id).first_or_404()
+    if current_app.config.get('STUDENT_SOFT_DELETE'):
+        # Se conserva el historial de salidas; el estudiante deja de aparecer y de poder salir
+        student.deleted_at = datetime.utcnow()
+    else:
+        # Borrado en bloque: no se cargan en memoria las salidas del estudiante
+        Exit.query.filter_by(student_id=student.id).delete(synchronize_session=False)
+        Student.query.filter_by(id=student.id).delete(synchronize_session=False)
     db.session.commit()
     flash('Estudiante eliminado exitosamente.', 'success')
     return redirect(url_for('routes.list_students'))
 
+@bp.route('/students/<int:id>/history')
+@login_required
+@admin_required
+@use_replica
+def student_history(id):
+    # Incluye estudiantes eliminados lógicamente: su historial se conserva
+    student = Student.query.get_or_404(id)
+    cursor = request.args.get('cursor', '')
+    try:
+        start, end = history.parse_range(request.args.get('from'), request.args.get('to'))
+        rows, next_cursor, has_more = history.fetch_page(student.id, start, end, cursor)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        start, end = history.parse_range(None, None)
+        cursor = ''
+        rows, next_cursor, has_more = history.fetch_page(student.id, start, end)
+    return render_template('students/history.html', student=student, rows=rows, start=start, end=end,
+                           cursor=cursor, next_cursor=next_cursor, has_more=has_more,
+                           title=f"Historial de {student.name}")
+
+@bp.route('/api/students/<int:id>/exits')
+@login_required
+@admin_required
+@use_replica
+def api_student_history(id):
+    """
+    Salidas de un estudiante entre `from` y `to` (YYYY-MM-DD, por defecto el
+    último año), más recientes primero. Para la página siguiente se envía
+    `cursor` con el `next_cursor` recibido.
+    """
+    student = Student.query.get_or_404(id)
+    limit = request.args.get('limit', history.DEFAULT_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, history.MAX_PAGE_SIZE))
+    try:
+        start, end = history.parse_range(request.args.get('from'), request.args.get('to'))
+        rows, next_cursor, has_more = history.fetch_page(student.id, start, end, request.args.get('cursor', ''), limit)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({
+        'success': True,
+        'student': {'id': student.id, 'name': student.name, 'course': student.course},
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'exits': history.to_json(rows),
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+    })
+
 
 # --- Importación de Estudiantes ---
 @bp.route('/students/import', methods=['GET', 'POST'])
@@ -264,44 +505,111 @@ def import_students():
                 flash('Extensión de archivo no válida.', 'danger')
                 return redirect(url_for('routes.import_students'))
             
+            # Con trabajos en segundo plano, la importación no bloquea este worker
+            if jobs.background_enabled():
+                job_id = jobs.enqueue('import_students', current_user, input_file=file, input_name=f'input{file_ext}')
+                return redirect(url_for('routes.job_status', id=job_id))
+
             try:
                 df = pd.read_excel(file)
-                required_columns = ['id', 'name', 'course', 'authorized']
-                if not all(col in df.columns for col in required_columns):
-                    flash(f'El archivo debe contener las columnas: {", ".join(required_columns)}', 'danger')
-                    return redirect(url_for('routes.import_students'))
-                
-                # Proceso de importación
-                added_count = 0
-                updated_count = 0
-                errors = []
-                for index, row in df.iterrows():
-                    student_id = row['id']
-                    student = Student.query.get(student_id)
-                    if student: # Actualizar
-                        student.name = row['name']
-                        student.course = row['course']
-                        student.authorized = bool(row['authorized'])
-                        updated_count += 1
-                    else: # Añadir
-                        new_student = Student(
-                            id=student_id,
-                            name=row['name'],
-                            course=row['course'],
-                            authorized=bool(row['authorized'])
-                        )
-                        db.session.add(new_student)
-                        added_count += 1
-                db.session.commit()
+                added_count, updated_count = tasks.import_students_df(df)
                 flash(f'Importación completa. {added_count} estudiantes añadidos, {updated_count} actualizados.', 'success')
                 return redirect(url_for('routes.list_students'))
 
+            except ValueError as e:
+                flash(str(e), 'danger')
+                return redirect(url_for('routes.import_students'))
             except Exception as e:
                 flash(f'Ocurrió un error al procesar el archivo: {e}', 'danger')
 
     return render_template('students/import.html', form=form)
 
 
+# --- Carga masiva de fotos ---
+@bp.route('/students/photos/upload', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def upload_photos():
+    """ZIP con fotos {student_id}.jpg (ver app/photos.py). Límite propio: PHOTO_ZIP_MAX_MB."""
+    form = PhotoZipForm()
+    summary = None
+    if form.validate_on_submit():
+        if jobs.background_enabled():
+            job_id = jobs.enqueue('import_photos', current_user, input_file=form.file.data, input_name='photos.zip')
+            return redirect(url_for('routes.job_status', id=job_id))
+        try:
+            summary = photos.import_zip(form.file.data.stream, current_user)
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('routes.upload_photos'))
+        flash(photos.summary_message(summary), 'success' if not summary['errors'] else 'warning')
+    return render_template('students/upload_photos.html', form=form, summary=summary, title="Subir Fotos")
+
+
+# --- Autorización masiva de estudiantes ---
+@bp.route('/students/bulk-authorization', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def bulk_authorization():
+    form = BulkAuthorizationForm()
+    form.course.choices = bulk.course_choices()
+    preview = None
+    if form.validate_on_submit():
+        try:
+            ids = bulk.parse_ids(form.student_ids.data)
+            if form.file.data:
+                ids += bulk.read_ids_file(form.file.data)
+        except (ValueError, KeyError) as e:
+            flash(f'No se pudieron leer los IDs: {e}', 'danger')
+            return render_template('students/bulk_authorization.html', form=form, preview=None, title="Autorización Masiva")
+
+        course = form.course.data or None
+        ids = ids or None
+        if course is None and ids is None:
+            flash('Selecciona un curso o indica los IDs de los estudiantes.', 'danger')
+            return render_template('students/bulk_authorization.html', form=form, preview=None, title="Autorización Masiva")
+
+        authorized = form.action.data == 'authorize'
+        if form.submit.data:
+            updated = bulk.set_authorization(authorized, current_user, course=course, ids=ids)
+            flash(f'Autorización actualizada para {updated} estudiantes.', 'success')
+            return redirect(url_for('routes.list_students'))
+        matched, changed = bulk.count_changes(authorized, course=course, ids=ids)
+        preview = {'matched': matched, 'changed': changed}
+
+    return render_template('students/bulk_authorization.html', form=form, preview=preview, title="Autorización Masiva")
+
+@bp.route('/api/students/bulk-authorization', methods=['POST'])
+@login_required
+@admin_required
+def api_bulk_authorization():
+    """
+    JSON: {"authorized": bool, "course": str, "ids": [int], "dry_run": bool}.
+    Con `dry_run` solo devuelve cuántos estudiantes cambiarían.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('authorized'), bool):
+        return jsonify({'success': False, 'message': 'El campo "authorized" es obligatorio.'}), 400
+    course = data.get('course') or None
+    if course is not None and not isinstance(course, str):
+        return jsonify({'success': False, 'message': 'Curso inválido.'}), 400
+    raw_ids = data.get('ids')
+    # Un texto o un número también son iterables/convertibles: se exige una lista
+    if raw_ids is not None and not isinstance(raw_ids, list):
+        return jsonify({'success': False, 'message': 'Lista de IDs inválida.'}), 400
+    try:
+        ids = [qr.check_id(i) for i in raw_ids] if raw_ids else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Lista de IDs inválida.'}), 400
+    if course is None and ids is None:
+        return jsonify({'success': False, 'message': 'Indica un curso o una lista de IDs.'}), 400
+
+    matched, changed = bulk.count_changes(data['authorized'], course=course, ids=ids)
+    if data.get('dry_run', True):
+        return jsonify({'success': True, 'dry_run': True, 'matched': matched, 'changed': changed})
+    updated = bulk.set_authorization(data['authorized'], current_user, course=course, ids=ids)
+    return jsonify({'success': True, 'dry_run': False, 'matched': matched, 'updated': updated})
+
 @bp.route('/students/import/template')
 @login_required
 @admin_required
@@ -333,56 +641,21 @@ def download_qr_codes_zip():
     """
     Genera un archivo PNG para cada estudiante y los comprime en un ZIP para su descarga.
     """
-    students = Student.query.order_by(Student.id).all()
+    students = Student.active().order_by(Student.id).all()
     if not students:
         flash('No hay estudiantes registrados para generar códigos QR.', 'warning')
         return redirect(url_for('routes.list_students'))
 
-    # Usar un directorio temporal para almacenar los archivos PNG y el ZIP
-    with tempfile.TemporaryDirectory() as tmpdir:
-        qr_files_path = os.path.join(tmpdir, 'qr_codes')
-        os.makedirs(qr_files_path)
-        
-        zip_filename = f"qr_codes_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.zip"
-        zip_path = os.path.join(tmpdir, zip_filename)
-
-        # --- Generación de los códigos QR ---
-        for student in students:
-            qr_payload = json.dumps({"id": student.id})
-            
-            # Configuración del QR para alta calidad y márgenes estrechos
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=ERROR_CORRECT_L,
-                box_size=50,  # Aumentamos el tamaño de la caja para mayor resolución
-                border=1,     # Borde mínimo (estrecho)
-            )
-            qr.add_data(qr_payload)
-            qr.make(fit=True)
-
-            # Crear la imagen. El tamaño final será box_size * número de módulos.
-            # Para un QR simple, son 21 módulos. 50 * 21 = 1050px, que es alta resolución.
-            img = qr.make_image(fill_color="black", back_color="white")
-
-            # Guardar el archivo PNG
-            filename = f"{student.id}.png"
-            file_path = os.path.join(qr_files_path, filename)
-            img.save(file_path)
-
-        # --- Creación del archivo ZIP ---
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            for root, dirs, files in os.walk(qr_files_path):
-                for file in files:
-                    # Añadir cada archivo PNG al ZIP
-                    zipf.write(os.path.join(root, file), arcname=file)
-
-        # Enviar el archivo ZIP para su descarga
-        return send_file(
-            zip_path,
-            mimetype='application/zip',
-            as_attachment=True,
-            download_name=zip_filename
-        )
+    if jobs.background_enabled():
+        job_id = jobs.enqueue('qr_zip', current_user)
+        return redirect(url_for('routes.job_status', id=job_id))
+
+    # El ZIP se guarda en disco por versión del roster: se reutiliza mientras no
+    # cambien los estudiantes y el proxy puede enviarlo sin ocupar al worker
+    directory, cached_name = tasks.cached_qr_zip(students)
+    zip_filename = f"qr_codes_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.zip"
+    return send_protected('qr_cache', directory, cached_name, mimetype='application/zip',
+                          as_attachment=True, download_name=zip_filename)
 
 # --- CRUD de Usuarios (Solo Admin) ---
 @bp.route('/users')
@@ -410,6 +683,11 @@ def delete_user(id):
         flash('No puedes eliminar tu propio usuario.', 'danger')
         return redirect(url_for('routes.list_users'))
     user = User.query.get_or_404(id)
+    if db.session.query(Exit.query.filter_by(operator_id=user.id).exists()).scalar():
+        flash('No se puede eliminar un usuario que ha registrado salidas.', 'danger')
+        return redirect(url_for('routes.list_users'))
+    # La auditoría y los trabajos se conservan sin autor
+    user.detach_records()
     db.session.delete(user)
     db.session.commit()
     flash('Usuario eliminado.', 'success')
@@ -443,34 +721,42 @@ def not_found_error(error):
 def forbidden_error(error):
     return render_template('403.html'), 403
 
+QR_PAGE_SIZES = (30, 60, 120, 240)
+
 @bp.route('/students/qrs')
 @login_required
 @admin_required
 def generate_qrs():
-    """Genera una página imprimible con los QR de todos los estudiantes."""
-    students = Student.query.order_by(Student.name).all()
-    students_with_qrs = []
-
-    for student in students:
-        # 1. Crear el payload del QR en formato JSON
-        qr_payload = json.dumps({"id": student.id})
-
-        # 2. Generar la imagen del QR en memoria
-        qr_img = qrcode.make(qr_payload)
-        
-        # 3. Convertir la imagen a base64 para insertarla en el HTML
-        buffered = io.BytesIO()
-        qr_img.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
-
-        students_with_qrs.append({
-            'id': student.id,
-            'name': student.name,
-            'course': student.course,
-            'qr_code': img_str
-        })
-
-    return render_template('students/qrs.html', students_with_qrs=students_with_qrs)
+    """
+    Página imprimible de códigos QR, filtrable por curso y paginada. Las imágenes
+    se cargan de forma diferida desde `student_qr`, así que solo se renderizan
+    los QR que realmente se ven o imprimen.
+    """
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 60, type=int)
+    if per_page not in QR_PAGE_SIZES:
+        per_page = 60
+    course = request.args.get('course', '')
+    query = Student.active()
+    if course:
+        query = query.filter(Student.course == course)
+    students = query.order_by(Student.name).paginate(page=page, per_page=per_page)
+    courses = [c for c, _ in bulk.course_choices() if c not in ('', bulk.ALL_COURSES)]
+    return render_template('students/qrs.html', students=students, courses=courses, course=course,
+                           per_page=per_page, page_sizes=QR_PAGE_SIZES)
+
+@bp.route('/students/<int:id>/qr.<any(svg, png):fmt>')
+@login_required
+@admin_required
+def student_qr(id, fmt):
+    """QR de un estudiante en SVG o PNG, con ETag basado en su contenido."""
+    if not db.session.query(Student.active().filter_by(id=id).exists()).scalar():
+        abort(404)
+    data = qr.payload(id)
+    response = Response(qr.render(data, fmt), mimetype=qr.FORMATS[fmt])
+    response.set_etag(qr.etag(data, fmt))
+    response.headers['Cache-Control'] = 'private, max-age=86400'
+    return response.make_conditional(request)
 
 # app/routes.py
 # ... (después de las otras rutas)
@@ -487,8 +773,18 @@ def app_settings():
             db.session.add(cooldown_setting)
         else:
             cooldown_setting.value = str(form.exit_cooldown_minutes.data)
-        
+
+        # Límites de lecturas por operador, puerta y estudiante
+        for dimension, key in SETTING_KEYS.items():
+            value = getattr(form, key).data.strip()
+            setting = Setting.query.filter_by(key=key).first()
+            if not setting:
+                db.session.add(Setting(key=key, value=value))
+            else:
+                setting.value = value
+
         db.session.commit()
+        invalidate_limits()
         flash('Configuración guardada exitosamente.', 'success')
         return redirect(url_for('routes.app_settings'))
     
@@ -499,7 +795,12 @@ def app_settings():
     else:
         form.exit_cooldown_minutes.data = 60 # Valor por defecto si no existe
 
-    return render_template('main/settings.html', title="Configuración", form=form)
+    limits = {setting.key: setting.value for setting in Setting.query.filter(Setting.key.in_(SETTING_KEYS.values()))}
+    for dimension, key in SETTING_KEYS.items():
+        getattr(form, key).data = limits.get(key, DEFAULT_SCAN_LIMITS[dimension])
+
+    return render_template('main/settings.html', title="Configuración", form=form,
+                           limiter_stats=get_limiter().stats())
 
 
 # --- CRUD de Puertas ---
@@ -519,20 +820,35 @@ def create_door():
     if form.validate_on_submit():
         new_door = Door(name=form.name.data, is_active=form.is_active.data)
         db.session.add(new_door)
+        db.session.flush()
+        scan_profile.save_profile(new_door.id, _profile_from_form(form))
         db.session.commit()
         flash('Puerta creada exitosamente.', 'success')
         return redirect(url_for('routes.list_doors'))
     return render_template('doors/door_form.html', form=form, title="Nueva Puerta")
 
+def _profile_from_form(form):
+    return {
+        'fps': form.scan_fps.data,
+        'qrbox': form.scan_qrbox.data,
+        'resolution': form.scan_resolution.data,
+        'native': form.scan_native.data,
+    }
+
 @bp.route('/doors/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
 @admin_required
 def edit_door(id):
     door = Door.query.get_or_404(id)
     form = DoorForm(obj=door)
+    if request.method == 'GET':
+        profile = scan_profile.get_profile(door.id)
+        form.scan_fps.data, form.scan_qrbox.data = profile['fps'], profile['qrbox']
+        form.scan_resolution.data, form.scan_native.data = profile['resolution'], profile['native']
     if form.validate_on_submit():
         door.name = form.name.data
         door.is_active = form.is_active.data
+        scan_profile.save_profile(door.id, _profile_from_form(form))
         db.session.commit()
         flash('Puerta actualizada exitosamente.', 'success')
         return redirect(url_for('routes.list_doors'))
@@ -543,9 +859,11 @@ def edit_door(id):
 @admin_required
 def delete_door(id):
     door = Door.query.get_or_404(id)
-    if door.exits:
+    # EXISTS en la DB en lugar de cargar toda la colección de salidas de la puerta
+    if db.session.query(Exit.query.filter_by(door_id=door.id).exists()).scalar():
         flash('No se puede eliminar una puerta que tiene registros de salida asociados.', 'danger')
         return redirect(url_for('routes.list_doors'))
+    scan_profile.delete_profile(door.id)
     db.session.delete(door)
     db.session.commit()
     flash('Puerta eliminada exitosamente.', 'success')
@@ -554,61 +872,27 @@ def delete_door(id):
 
 @bp.route('/report', methods=['GET', 'POST'])
 @login_required
+@use_replica
 def daily_report():
     form = ReportForm()
-    selected_date = date.today() # Valor por defecto
+    selected_date = tz.today_local() # Valor por defecto (día local, no el del servidor)
 
     if form.validate_on_submit():
         selected_date = form.report_date.data
     
-    # --- LÓGICA DE ZONA HORARIA MEJORADA ---
+    if 'export' in request.form and jobs.background_enabled():
+        job_id = jobs.enqueue('report_export', current_user, params={'date': selected_date.isoformat()})
+        return redirect(url_for('routes.job_status', id=job_id))
 
-    # 1. Cargar la zona horaria local desde la configuración de la app
-    try:
-        local_tz = pytz.timezone(current_app.config.get('LOCAL_TIMEZONE', 'UTC'))
-    except pytz.UnknownTimeZoneError:
-        local_tz = pytz.utc
-
-    # 2. Crear el inicio y fin del día en la zona horaria LOCAL
-    start_of_day_local = local_tz.localize(datetime.combine(selected_date, time.min))
-    end_of_day_local = local_tz.localize(datetime.combine(selected_date, time.max))
-    
-    # 3. Convertir ese rango a UTC para la consulta en la base de datos
-    start_of_day_utc = start_of_day_local.astimezone(pytz.utc)
-    end_of_day_utc = end_of_day_local.astimezone(pytz.utc)
-    
-    # 4. Realizar la consulta con el rango UTC correcto
-    exits_for_date = Exit.query.filter(
-        Exit.timestamp >= start_of_day_utc,
-        Exit.timestamp <= end_of_day_utc
-    ).order_by(Exit.timestamp.asc()).all()
+    # Salidas del día (rango UTC cacheado en app/tz.py, puerta y operador en el mismo JOIN)
+    # y sus horas locales convertidas en una sola operación
+    exits_for_date, local_times = tasks.report_exits(selected_date)
 
-    # --- FIN DE LA LÓGICA MEJORADA ---
-    
-    # El resto de la función (manejo de exportación) no necesita cambios,
-    # ya que opera sobre `exits_for_date`, que ahora contiene los datos correctos.
     if 'export' in request.form:
-        # (El código de exportación a Excel se mantiene igual)
-        data = {
-            'Fecha y Hora': [(pytz.utc.localize(e.timestamp).astimezone(local_tz)).strftime('%Y-%m-%d %H:%M:%S') for e in exits_for_date],
-            'ID Estudiante': [e.student_id for e in exits_for_date],
-            'Nombre Estudiante': [e.student_name for e in exits_for_date],
-            'Curso': [e.course for e in exits_for_date],
-            'Puerta': [e.door.name for e in exits_for_date],
-            'Operador': [e.operator.username for e in exits_for_date]
-        }
-        df = pd.DataFrame(data)
-        output = io.BytesIO()
-        # ... (resto del código de exportación)
-        writer = pd.ExcelWriter(output, engine='openpyxl')
-        df.to_excel(writer, index=False, sheet_name=f'Salidas_{selected_date.strftime("%Y-%m-%d")}')
-        writer.close()
-        output.seek(0)
-        
         return Response(
-            output,
+            tasks.report_xlsx(selected_date, exits_for_date, local_times),
             mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment;filename=reporte_salidas_{selected_date.strftime('%Y-%m-%d')}.xlsx"}
+            headers={"Content-Disposition": f"attachment;filename={tasks.report_filename(selected_date)}"}
         )
     
     form.report_date.data = selected_date
@@ -616,11 +900,59 @@ def daily_report():
     return render_template('main/report.html', 
                            form=form, 
                            exits=exits_for_date, 
+                           local_times=local_times,
                            selected_date=selected_date,
                            title="Reporte Diario de Salidas")
 
 # --- Ruta para servir las fotos de los estudiantes ---
 @bp.route('/student_photo/<filename>')
+@login_required
 def student_photo(filename):
-    directory = os.path.join(current_app.root_path, current_app.config['STUDENT_PHOTOS_FOLDER'])
-    return send_from_directory(directory, filename)
+    # Subcarpeta de la sede activa; la ruta relativa sirve también para X-Accel-Redirect
+    response = send_protected('photos', photos.photos_root(), photos.photo_relpath(filename))
+    if request.args.get('v'):
+        # URL versionada (roster y api_scan): el contenido nunca cambia
+        response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+# --- Trabajos en segundo plano ---
+def _get_job_or_404(id):
+    job = Job.query.get_or_404(id)
+    if job.created_by != current_user.id and current_user.role != Role.ADMIN:
+        abort(403)
+    return job
+
+@bp.route('/jobs/<int:id>')
+@login_required
+def job_status(id):
+    job = _get_job_or_404(id)
+    return render_template('jobs/job.html', job=job, title="Trabajo en Segundo Plano")
+
+@bp.route('/api/jobs/<int:id>')
+@login_required
+def api_job_status(id):
+    job = _get_job_or_404(id)
+    download_url = None
+    if job.status == jobs.DONE and job.result_filename:
+        download_url = url_for('routes.job_download', id=job.id)
+    return jsonify({
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'download_url': download_url
+    })
+
+@bp.route('/jobs/<int:id>/download')
+@login_required
+def job_download(id):
+    job = _get_job_or_404(id)
+    if job.status != jobs.DONE or not job.result_filename:
+        abort(404)
+    # Ruta relativa al directorio de trabajos, para que coincida con la ubicación interna del proxy
+    return send_protected('jobs', jobs.jobs_root(), jobs.job_relpath(job.id, job.result_filename),
+                          as_attachment=True, download_name=job.result_filename)
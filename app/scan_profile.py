@@ -0,0 +1,82 @@
+# app/scan_profile.py
+"""
+Perfil de lectura del escáner por puerta (fps, tamaño del recuadro de lectura,
+resolución de la cámara y uso del lector nativo `BarcodeDetector`).
+
+Cada perfil se guarda como JSON en la tabla `settings` con la clave
+`scan_profile_door_<id>`; las puertas sin perfil usan `DEFAULT_PROFILE`.
+Bajar fps y resolución reduce el consumo de CPU y batería en tabletas modestas.
+"""
+import json
+from .models import db, Setting
+
+KEY_PREFIX = 'scan_profile_door_'
+
+RESOLUTIONS = {
+    '480x360': (480, 360),
+    '640x480': (640, 480),
+    '1280x720': (1280, 720),
+}
+
+DEFAULT_PROFILE = {
+    'fps': 10,
+    'qrbox': 250,
+    'resolution': '640x480',
+    'native': True,
+}
+
+
+def setting_key(door_id):
+    return f'{KEY_PREFIX}{door_id}'
+
+
+def normalize(profile):
+    """Completa y acota un perfil (los valores fuera de rango vuelven al defecto)."""
+    result = dict(DEFAULT_PROFILE)
+    for key, value in (profile or {}).items():
+        if key in result:
+            result[key] = value
+    try:
+        result['fps'] = min(max(int(result['fps']), 1), 30)
+        result['qrbox'] = min(max(int(result['qrbox']), 150), 600)
+    except (TypeError, ValueError):
+        result['fps'], result['qrbox'] = DEFAULT_PROFILE['fps'], DEFAULT_PROFILE['qrbox']
+    if result['resolution'] not in RESOLUTIONS:
+        result['resolution'] = DEFAULT_PROFILE['resolution']
+    result['native'] = bool(result['native'])
+    return result
+
+
+def _decode(value):
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_profile(door_id):
+    setting = Setting.query.filter_by(key=setting_key(door_id)).first()
+    return normalize(_decode(setting.value) if setting else None)
+
+
+def get_profiles(door_ids):
+    """{door_id: perfil} para varias puertas con una sola consulta."""
+    keys = {setting_key(door_id): door_id for door_id in door_ids}
+    stored = {
+        keys[key]: _decode(value)
+        for key, value in db.session.query(Setting.key, Setting.value).filter(Setting.key.in_(list(keys)))
+    }
+    return {door_id: normalize(stored.get(door_id)) for door_id in door_ids}
+
+
+def save_profile(door_id, profile):
+    value = json.dumps(normalize(profile), sort_keys=True)
+    setting = Setting.query.filter_by(key=setting_key(door_id)).first()
+    if setting is None:
+        db.session.add(Setting(key=setting_key(door_id), value=value))
+    else:
+        setting.value = value
+
+
+def delete_profile(door_id):
+    Setting.query.filter_by(key=setting_key(door_id)).delete(synchronize_session=False)
@@ -0,0 +1,70 @@
+# app/sendfile.py
+"""
+Entrega de archivos protegidos (fotos de estudiantes, ZIPs y exportaciones).
+
+Flask decide si el usuario puede ver el archivo y, según `SENDFILE_MODE`, la
+transferencia de los bytes la hace:
+
+- ''            el propio worker (`send_file`, con soporte de Range, ETag y 304);
+- 'x-sendfile'  Apache (mod_xsendfile) o lighttpd, con la ruta absoluta en `X-Sendfile`;
+- 'x-accel'     nginx, con la ubicación interna en `X-Accel-Redirect`.
+
+Para nginx cada tipo de archivo se publica en una `location internal` cuyo
+prefijo se configura en `SENDFILE_ACCEL_LOCATIONS` (ver README). Las peticiones
+condicionales se responden con 304 en Flask sin pasar por el proxy.
+"""
+import mimetypes
+import os
+from urllib.parse import quote
+from zlib import adler32
+from flask import abort, current_app, request, send_file
+from werkzeug.security import safe_join
+
+MODES = ('', 'x-sendfile', 'x-accel')
+
+
+def _offload(path, kind, relative, mimetype, as_attachment, download_name, max_age):
+    stat = os.stat(path)
+    response = current_app.response_class(mimetype=mimetype)
+    response.last_modified = stat.st_mtime
+    # Mismo ETag que genera send_file: cambiar de modo no invalida las cachés
+    response.set_etag(f'{stat.st_mtime}-{stat.st_size}-{adler32(path.encode()) & 0xFFFFFFFF}')
+    if max_age is not None:
+        response.cache_control.max_age = max_age
+    if as_attachment:
+        response.headers.set('Content-Disposition', 'attachment', filename=download_name or os.path.basename(path))
+    response = response.make_conditional(request)
+    if response.status_code == 304:
+        return response
+
+    if current_app.config.get('SENDFILE_MODE') == 'x-sendfile':
+        response.headers['X-Sendfile'] = path
+    else:
+        locations = current_app.config.get('SENDFILE_ACCEL_LOCATIONS') or {}
+        prefix = locations.get(kind)
+        if not prefix:
+            raise RuntimeError(f"Falta la ubicación interna de '{kind}' en SENDFILE_ACCEL_LOCATIONS.")
+        response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(relative.replace(os.sep, '/'))
+    return response
+
+
+def send_protected(kind, directory, filename, mimetype=None, as_attachment=False, download_name=None, max_age=None):
+    """
+    Envía `directory/filename` (ya autorizado por la vista) según `SENDFILE_MODE`.
+    `kind` identifica la ubicación interna de nginx ('photos', 'jobs', 'qr_cache').
+    """
+    path = safe_join(os.path.abspath(directory), filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    mimetype = mimetype or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    if current_app.config.get('SENDFILE_MODE'):
+        return _offload(path, kind, filename, mimetype, as_attachment, download_name, max_age)
+    return send_file(path, mimetype=mimetype, as_attachment=as_attachment, download_name=download_name,
+                     conditional=True, etag=True, max_age=max_age)
+
+
+def init_app(app):
+    mode = (app.config.get('SENDFILE_MODE') or '').lower()
+    if mode not in MODES:
+        raise ValueError(f"SENDFILE_MODE '{mode}' no válido; use uno de: x-sendfile, x-accel.")
+    app.config['SENDFILE_MODE'] = mode
@@ -0,0 +1,29 @@
+// Decodificación de QR con el lector nativo del navegador (BarcodeDetector)
+// fuera del hilo principal. scanner.js envía recortes del vídeo como ImageBitmap
+// y recibe { text, decodeMs }; text es null si el fotograma no tiene un QR legible.
+let detector = null;
+
+function init() {
+    if (!('BarcodeDetector' in self)) return Promise.resolve(false);
+    return BarcodeDetector.getSupportedFormats()
+        .then(formats => {
+            if (!formats.includes('qr_code')) return false;
+            detector = new BarcodeDetector({ formats: ['qr_code'] });
+            return true;
+        })
+        .catch(() => false);
+}
+
+init().then(supported => self.postMessage({ supported: supported }));
+
+self.onmessage = (event) => {
+    const frame = event.data.frame;
+    const started = performance.now();
+    detector.detect(frame)
+        .then(codes => (codes.length ? codes[0].rawValue : null))
+        .catch(() => null)
+        .then(text => {
+            frame.close();
+            self.postMessage({ text: text, decodeMs: performance.now() - started });
+        });
+};
@@ -9,11 +9,199 @@ document.addEventListener('DOMContentLoaded', function () {
     const csrfToken = document.getElementById('csrf_token').value;
 
     // Sonidos de feedback
-    const audioSuccess = new Audio('/static/audio/success.mp3');
-    const audioError = new Audio('/static/audio/error.mp3');
+    const scannerConfig = document.getElementById('scanner-config').dataset;
+    const audioSuccess = new Audio(scannerConfig.audioSuccess);
+    const audioError = new Audio(scannerConfig.audioError);
     const studentPhoto = document.getElementById('student-photo');
     const photoPlaceholder = document.getElementById('photo-placeholder');
 
+    // --- Roster local (IndexedDB) para validación instantánea ---
+    // El servidor sigue siendo la fuente de verdad: el roster local solo adelanta
+    // la respuesta al operador mientras /api/scan registra la salida.
+    const ROSTER_DB = scannerConfig.rosterDb;  // Una base IndexedDB por sede
+    const ROSTER_REFRESH_MS = 60000;
+    const roster = new Map();
+    let rosterVersion = null;
+    let rosterEtag = null;
+    let rosterDb = null;
+
+    // --- Telemetría de latencia (decodificación, ida y vuelta, foto) ---
+    // Se acumula en memoria y se envía en lotes; ver app/telemetry.py
+    const TELEMETRY_BATCH = 20;
+    const TELEMETRY_FLUSH_MS = 30000;
+    const TELEMETRY_MAX_QUEUE = 500;
+    const telemetryQueue = [];
+    const deviceId = (() => {
+        try {
+            let id = localStorage.getItem('exit-control-device');
+            if (!id) {
+                id = Math.random().toString(16).slice(2, 10);
+                localStorage.setItem('exit-control-device', id);
+            }
+            return id;
+        } catch (e) {
+            return 'anon';
+        }
+    })();
+    let lastFrameAt = performance.now();
+
+    function recordTiming(timing) {
+        const ms = value => (value == null ? null : Math.round(value));
+        telemetryQueue.push([Date.now(), Number(timing.door) || null, timing.status,
+            ms(timing.decode), ms(timing.rtt), ms(timing.server), ms(timing.photo)]);
+        if (telemetryQueue.length > TELEMETRY_MAX_QUEUE) telemetryQueue.splice(0, telemetryQueue.length - TELEMETRY_MAX_QUEUE);
+        if (telemetryQueue.length >= TELEMETRY_BATCH) flushTelemetry();
+    }
+
+    function flushTelemetry() {
+        if (!telemetryQueue.length) return;
+        const samples = telemetryQueue.splice(0, telemetryQueue.length);
+        fetch(scannerConfig.telemetryUrl, {
+            method: 'POST',
+            keepalive: true,  // Permite enviar el último lote al cerrar la página
+            headers: { 'Content-Type': 'application/json', 'X-CSRFToken': csrfToken },
+            body: JSON.stringify({ device: deviceId, samples: samples })
+        }).then(response => {
+            if (!response.ok && response.status >= 500) return Promise.reject(response.status);
+        }).catch(() => {
+            telemetryQueue.unshift(...samples.slice(-TELEMETRY_MAX_QUEUE));  // Se reintenta en el próximo envío
+        });
+    }
+
+    setInterval(flushTelemetry, TELEMETRY_FLUSH_MS);
+    document.addEventListener('visibilitychange', () => {
+        if (document.visibilityState === 'hidden') flushTelemetry();
+    });
+
+    function serverTiming(response) {
+        // Server-Timing: app;dur=12.3
+        const match = /dur=([\d.]+)/.exec(response.headers.get('Server-Timing') || '');
+        return match ? parseFloat(match[1]) : null;
+    }
+
+    function openRosterDb() {
+        return new Promise((resolve, reject) => {
+            if (!('indexedDB' in window)) {
+                reject(new Error('IndexedDB no disponible'));
+                return;
+            }
+            const req = indexedDB.open(ROSTER_DB, 1);
+            req.onupgradeneeded = () => {
+                const idb = req.result;
+                idb.createObjectStore('students', { keyPath: 'id' });
+                idb.createObjectStore('meta');
+            };
+            req.onsuccess = () => resolve(req.result);
+            req.onerror = () => reject(req.error);
+        });
+    }
+
+    function loadRosterFromDb() {
+        return new Promise((resolve) => {
+            const tx = rosterDb.transaction(['students', 'meta'], 'readonly');
+            tx.objectStore('students').openCursor().onsuccess = (event) => {
+                const cursor = event.target.result;
+                if (cursor) {
+                    roster.set(cursor.value.id, cursor.value);
+                    cursor.continue();
+                }
+            };
+            tx.objectStore('meta').get('version').onsuccess = (event) => {
+                const meta = event.target.result;
+                if (meta) {
+                    rosterVersion = meta.version;
+                    rosterEtag = meta.etag;
+                }
+            };
+            tx.oncomplete = () => resolve();
+            tx.onerror = () => resolve();
+        });
+    }
+
+    function saveRosterToDb(rows, full) {
+        if (!rosterDb) return;
+        const tx = rosterDb.transaction(['students', 'meta'], 'readwrite');
+        const store = tx.objectStore('students');
+        if (full) store.clear();
+        rows.forEach(row => store.put(row));
+        tx.objectStore('meta').put({ version: rosterVersion, etag: rosterEtag }, 'version');
+    }
+
+    function applyRoster(payload) {
+        const rows = payload.students.map(values => {
+            const row = {};
+            payload.fields.forEach((field, i) => { row[field] = values[i]; });
+            return row;
+        });
+        if (payload.full) roster.clear();
+        rows.forEach(row => roster.set(row.id, row));
+        rosterVersion = payload.version;
+        saveRosterToDb(rows, payload.full);
+        // Si el total no coincide hubo eliminaciones: pedir el snapshot completo
+        return payload.full || roster.size === payload.total;
+    }
+
+    function refreshRoster(full = false) {
+        const useDelta = !full && rosterVersion !== null;
+        const url = useDelta ? `${scannerConfig.rosterUrl}?since=${encodeURIComponent(rosterVersion)}` : scannerConfig.rosterUrl;
+        const headers = {};
+        if (useDelta && rosterEtag) headers['If-None-Match'] = rosterEtag;
+        return fetch(url, { headers, credentials: 'same-origin' })
+            .then(response => {
+                if (response.status === 304 || !response.ok) return null;
+                rosterEtag = response.headers.get('ETag');
+                return response.json();
+            })
+            .then(payload => {
+                if (payload && !applyRoster(payload)) {
+                    return refreshRoster(true);
+                }
+            })
+            .catch(err => console.warn('No se pudo actualizar el roster:', err));
+    }
+
+    function photoUrlFor(entry) {
+        if (!entry || !entry.photo) return null;
+        return `${scannerConfig.photoBase}${encodeURIComponent(entry.photo)}?v=${entry.photo_version}`;
+    }
+
+    openRosterDb()
+        .then(idb => { rosterDb = idb; return loadRosterFromDb(); })
+        .catch(err => console.warn('Roster local sin persistencia:', err))
+        .finally(() => {
+            refreshRoster();
+            setInterval(refreshRoster, ROSTER_REFRESH_MS);
+        });
+
+    // Respuesta provisional con los datos locales mientras llega la del servidor
+    function showLocalResult(studentId) {
+        const entry = roster.get(Number(studentId));
+        if (!entry) {
+            if (roster.size) showPending(`Estudiante con ID ${studentId} no encontrado.`, true);
+            return;
+        }
+        const details = `Nombre: ${entry.name} | Curso: ${entry.course}`;
+        if (!entry.authorized) {
+            showPending(`Salida no autorizada para ${entry.name}.`, true, details);
+            return;
+        }
+        const photoUrl = photoUrlFor(entry);
+        if (photoUrl) {
+            // Precarga de la foto para que esté lista cuando responda el servidor
+            studentPhoto.src = photoUrl;
+            studentPhoto.classList.remove('hidden');
+            photoPlaceholder.classList.add('hidden');
+        }
+        showPending(`Verificando salida de ${entry.name}...`, false, details);
+    }
+
+    function showPending(message, isError, details = '') {
+        resultContainer.classList.remove('hidden', 'bg-green-100', 'text-green-800', 'bg-red-100', 'text-red-800', 'bg-yellow-100', 'text-yellow-800');
+        resultContainer.classList.add(isError ? 'bg-red-100' : 'bg-yellow-100', isError ? 'text-red-800' : 'text-yellow-800');
+        resultMessage.textContent = message;
+        studentDetails.textContent = details;
+    }
+
     // Función para mostrar el resultado final en la UI
     function showResult(success, message, details = '', photoUrl = null) {
         resultContainer.classList.remove('hidden', 'bg-green-100', 'text-green-800', 'bg-red-100', 'text-red-800', 'bg-yellow-100', 'text-yellow-800');
@@ -55,48 +243,99 @@ document.addEventListener('DOMContentLoaded', function () {
         }, 5000);
     }
 
+    // --- Contenido del QR (ver app/qr.py) ---
+    // Nuevo: solo dígitos, el ID seguido de un dígito de control Luhn.
+    // Antiguo (carnés ya impresos): JSON {"id": 1234}.
+    function luhnDigit(number) {
+        let total = 0;
+        [...number].reverse().forEach((char, position) => {
+            let digit = Number(char);
+            if (position % 2 === 0) {
+                digit *= 2;
+                if (digit > 9) digit -= 9;
+            }
+            total += digit;
+        });
+        return (10 - total % 10) % 10;
+    }
+
+    function parseQr(text) {
+        text = text.trim();
+        if (text.startsWith('{')) {
+            try {
+                const id = Number(JSON.parse(text).id);
+                return Number.isInteger(id) && id > 0 ? id : null;
+            } catch (e) {
+                return null;
+            }
+        }
+        if (!/^\d{2,}$/.test(text)) return null;
+        const number = text.slice(0, -1);
+        return luhnDigit(number) === Number(text.slice(-1)) ? Number(number) : null;
+    }
+
     // Función que se ejecuta cuando se escanea un QR exitosamente
     const onScanSuccess = (decodedText, decodedResult) => {
+        if (scanBusy) return;  // Lectura tardía de un fotograma anterior a la pausa
         // Pausar el escáner para evitar lecturas múltiples
-        html5QrCode.pause();
+        pauseScanning();
+        // Decodificación: el tiempo del lector nativo, o desde el fotograma anterior
+        // (el último sin QR legible) hasta la lectura con html5-qrcode
+        const decodedAt = performance.now();
+        const decode = decodedResult && decodedResult.decodeMs != null ? decodedResult.decodeMs : decodedAt - lastFrameAt;
+        const timing = { door: doorSelect.value, status: 0, decode: decode, rtt: null, server: null, photo: null };
 
-        let studentId;
-        try {
-            const qrData = JSON.parse(decodedText);
-            studentId = qrData.id;
-            if (!studentId) throw new Error("ID no encontrado en el QR");
-        } catch (e) {
+        const studentId = parseQr(decodedText);
+        if (studentId === null) {
             showResult(false, "Error: El formato del QR es inválido.");
-            setTimeout(() => html5QrCode.resume(), 2000); // Reanudar después de un error
+            setTimeout(resumeScanning, 2000); // Reanudar después de un error
             return;
         }
 
+        showLocalResult(studentId);
         const selectedDoor = doorSelect.value;
 
+        let resumeDelay = 2000;
+
         // --- ESTA ES LA PARTE CLAVE: ENVIAR DATOS AL SERVIDOR ---
-        fetch('/api/scan', {
+        const requestStart = performance.now();
+        let respondedAt = null;
+        fetch(scannerConfig.scanUrl, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
                 'X-CSRFToken': csrfToken
             },
             body: JSON.stringify({
-                student_id: studentId,
+                code: decodedText,  // El servidor vuelve a validar el QR (app/qr.py)
                 door: selectedDoor
             })
         })
         .then(response => {
+            timing.status = response.status;
+            timing.server = serverTiming(response);
             if (!response.ok) {
+                // Si el servidor pide esperar (limitador), se respeta antes de volver a leer
+                const retryAfter = parseInt(response.headers.get('Retry-After'), 10);
+                if (retryAfter > 0) resumeDelay = Math.max(resumeDelay, retryAfter * 1000);
                 // Si la respuesta del servidor es un error (ej. 404, 403), capturarlo
                 return response.json().then(err => Promise.reject(err));
             }
             return response.json();
         })
         .then(data => {
+            respondedAt = performance.now();
+            timing.rtt = respondedAt - requestStart;
             // El servidor respondió con éxito (código 200)
             if (data.success) {
                 const details = `Nombre: ${data.student.name} | Curso: ${data.student.course}`;
                 showResult(true, data.message, details, data.student.photo_url);
+                if (data.student.photo_url && studentPhoto.decode) {
+                    // Tiempo hasta que la foto está lista en pantalla (0 si ya estaba precargada)
+                    return studentPhoto.decode()
+                        .then(() => { timing.photo = performance.now() - respondedAt; })
+                        .catch(() => {});
+                }
             } else {
                 // Esto podría ocurrir si el servidor devuelve success: false con un código 200
                 showResult(false, data.message);
@@ -104,13 +343,15 @@ document.addEventListener('DOMContentLoaded', function () {
         })
         .catch(errorData => {
             // Captura errores de red o errores de la respuesta del servidor (4xx, 5xx)
+            if (respondedAt === null && timing.status) timing.rtt = performance.now() - requestStart;
             console.error('Error en la solicitud fetch:', errorData);
             const message = errorData.message || "Error de conexión con el servidor.";
             showResult(false, message);
         })
         .finally(() => {
-            // Reanudar el escáner después de 2 segundos, independientemente del resultado
-            setTimeout(() => html5QrCode.resume(), 2000);
+            recordTiming(timing);
+            // Reanudar el escáner después de 2 segundos (o del Retry-After), independientemente del resultado
+            setTimeout(resumeScanning, resumeDelay);
         });
     };
 
@@ -126,29 +367,195 @@ document.addEventListener('DOMContentLoaded', function () {
         }
     }
 
+    // --- Perfil de lectura de la puerta (ver app/scan_profile.py) ---
+    const scanProfiles = JSON.parse(scannerConfig.scanProfiles);
+    const defaultProfile = JSON.parse(scannerConfig.defaultProfile);
+    const resolutions = JSON.parse(scannerConfig.resolutions);
+
+    function currentProfile() {
+        return scanProfiles[doorSelect.value] || defaultProfile;
+    }
+
+    function videoSize(profile) {
+        const [width, height] = resolutions[profile.resolution] || resolutions[defaultProfile.resolution];
+        return { width: { ideal: width }, height: { ideal: height } };
+    }
+
+    // --- Pausa mientras se muestra un resultado o la página no está visible ---
+    // Sin fotogramas que procesar, la tableta no gasta CPU ni batería decodificando.
+    let scanBusy = false;
+    let engine = null;
+
+    function pauseScanning() {
+        scanBusy = true;
+        if (engine) engine.pause();
+    }
+
+    function resumeScanning() {
+        scanBusy = false;
+        lastFrameAt = performance.now();
+        if (engine && document.visibilityState === 'visible') engine.resume();
+    }
+
+    document.addEventListener('visibilitychange', () => {
+        if (!engine) return;
+        if (document.visibilityState === 'hidden') engine.pause();
+        else if (!scanBusy) engine.resume();
+    });
+
+    // --- Lector nativo: BarcodeDetector en un worker ---
+    // Se comprueba una sola vez si el navegador lo soporta para QR.
+    let qrWorker = null;
+    const nativeSupported = new Promise(resolve => {
+        if (!('BarcodeDetector' in window) || !('Worker' in window) || !('createImageBitmap' in window)
+            || !navigator.mediaDevices) {
+            resolve(false);
+            return;
+        }
+        try {
+            qrWorker = new Worker(scannerConfig.workerUrl);
+        } catch (e) {
+            resolve(false);
+            return;
+        }
+        qrWorker.onmessage = (event) => resolve(Boolean(event.data.supported));
+        qrWorker.onerror = () => resolve(false);
+    }).then(supported => {
+        if (!supported && qrWorker) {
+            qrWorker.terminate();
+            qrWorker = null;
+        }
+        return supported;
+    });
+
+    const reader = document.getElementById('qr-reader');
+
+    function nativeEngine(profile) {
+        let stream = null;
+        let video = null;
+        let timer = null;
+        let inFlight = false;  // Como mucho un fotograma en el worker a la vez
+        let paused = false;
+
+        qrWorker.onmessage = (event) => {
+            inFlight = false;
+            if (paused) return;
+            if (event.data.text) onScanSuccess(event.data.text, { decodeMs: event.data.decodeMs });
+        };
+
+        function grabFrame() {
+            if (paused || inFlight || !video || video.readyState < 2) return;
+            // Solo se decodifica el recuadro central, como el qrbox de html5-qrcode
+            const size = Math.min(profile.qrbox, video.videoWidth, video.videoHeight);
+            const x = (video.videoWidth - size) / 2;
+            const y = (video.videoHeight - size) / 2;
+            inFlight = true;
+            createImageBitmap(video, x, y, size, size)
+                .then(frame => qrWorker.postMessage({ frame: frame }, [frame]))
+                .catch(() => { inFlight = false; });
+        }
+
+        return {
+            start() {
+                const constraints = { facingMode: 'environment', frameRate: { ideal: Math.max(profile.fps, 15) }, ...videoSize(profile) };
+                return navigator.mediaDevices.getUserMedia({ video: constraints, audio: false }).then(mediaStream => {
+                    stream = mediaStream;
+                    video = document.createElement('video');
+                    video.muted = true;
+                    video.playsInline = true;
+                    video.setAttribute('playsinline', '');
+                    video.style.width = '100%';
+                    video.srcObject = stream;
+                    reader.replaceChildren(video);
+                    return video.play();
+                }).then(() => {
+                    timer = setInterval(grabFrame, 1000 / profile.fps);
+                });
+            },
+            pause() {
+                paused = true;
+                if (video) video.pause();
+            },
+            resume() {
+                paused = false;
+                if (video) video.play().catch(() => {});
+            },
+            stop() {
+                clearInterval(timer);
+                if (stream) stream.getTracks().forEach(track => track.stop());
+                reader.replaceChildren();
+                return Promise.resolve();
+            },
+        };
+    }
+
+    // --- Alternativa: html5-qrcode (decodifica en JavaScript en el hilo principal) ---
+    let html5QrCode = null;
+
+    function html5Engine(profile) {
+        if (!html5QrCode) html5QrCode = new Html5Qrcode("qr-reader");
+        const state = () => html5QrCode.getState();
+        return {
+            start() {
+                return Html5Qrcode.getCameras().then(cameras => {
+                    if (!cameras || !cameras.length) {
+                        throw new Error("No se encontró ninguna cámara en este dispositivo.");
+                    }
+                    const cameraId = cameras[cameras.length - 1].id; // Priorizar cámara trasera
+                    return html5QrCode.start(
+                        cameraId,
+                        {
+                            fps: profile.fps,
+                            qrbox: { width: profile.qrbox, height: profile.qrbox },
+                            videoConstraints: { deviceId: { exact: cameraId }, ...videoSize(profile) }
+                        },
+                        onScanSuccess,
+                        (errorMessage) => { lastFrameAt = performance.now(); /* Fotograma sin QR legible */ }
+                    );
+                });
+            },
+            pause() {
+                // pause(true) detiene también el vídeo, no solo la decodificación
+                if (state() === Html5QrcodeScannerState.SCANNING) html5QrCode.pause(true);
+            },
+            resume() {
+                if (state() === Html5QrcodeScannerState.PAUSED) html5QrCode.resume();
+            },
+            stop() {
+                return html5QrCode.isScanning ? html5QrCode.stop() : Promise.resolve();
+            },
+        };
+    }
+
     // --- Lógica de inicialización de la cámara ---
-    const html5QrCode = new Html5Qrcode("qr-reader");
-
-    Html5Qrcode.getCameras().then(cameras => {
-        if (cameras && cameras.length) {
-            const cameraId = cameras[cameras.length - 1].id; // Priorizar cámara trasera
-            showStatus("Iniciando cámara...");
-
-            html5QrCode.start(
-                cameraId,
-                { fps: 10, qrbox: { width: 250, height: 250 } },
-                onScanSuccess,
-                (errorMessage) => { /* No hacer nada en fallos de lectura */ }
-            ).then(() => {
+    // Los arranques se encadenan para que cambiar de puerta rápido no abra dos cámaras.
+    let activeProfile = null;
+    let startChain = Promise.resolve();
+
+    function startScanner() {
+        const profile = currentProfile();
+        if (activeProfile && JSON.stringify(profile) === JSON.stringify(activeProfile)) return startChain;
+        activeProfile = profile;
+        startChain = startChain
+            .then(() => (engine ? engine.stop() : null))
+            .then(() => nativeSupported)
+            .then(native => {
+                engine = native && profile.native ? nativeEngine(profile) : html5Engine(profile);
+                showStatus("Iniciando cámara...");
+                return engine.start();
+            })
+            .then(() => {
                 // Ocultar el mensaje de "Iniciando cámara" una vez que el video está activo
                 resultContainer.classList.add('hidden');
-            }).catch(err => {
-                showStatus(`Error al iniciar la cámara: ${err.message}`, true);
+                lastFrameAt = performance.now();
+                if (scanBusy || document.visibilityState !== 'visible') engine.pause();
+            })
+            .catch(err => {
+                showStatus(`Error al iniciar la cámara: ${err.message || err}`, true);
             });
-        } else {
-            showStatus("No se encontró ninguna cámara en este dispositivo.", true);
-        }
-    }).catch(err => {
-        showStatus(`No se pudo obtener la lista de cámaras: ${err.message}`, true);
-    });
-});
\ No newline at end of file
+        return startChain;
+    }
+
+    doorSelect.addEventListener('change', startScanner);
+    startScanner();
+});
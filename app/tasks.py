@@ -0,0 +1,148 @@
+# app/tasks.py
+"""
+Trabajo pesado de administración: importación de estudiantes, ZIP de códigos QR
+y exportación del reporte diario.
+
+Las funciones son independientes de la petición HTTP para poder ejecutarse
+tanto en línea (dentro de la vista) como en segundo plano desde el worker de
+trabajos (ver app/jobs.py). Reciben un `progress(porcentaje, mensaje)` opcional.
+"""
+import io
+import os
+import tempfile
+import zipfile
+import pandas as pd
+from sqlalchemy.orm import joinedload
+from flask import current_app
+from .models import db, Student, Exit
+from .campus import cache_namespace
+from .roster import roster_state
+from . import tz, qr
+
+REQUIRED_IMPORT_COLUMNS = ['id', 'name', 'course', 'authorized']
+
+
+def _noop(percent, message=None):
+    pass
+
+
+def import_students_df(df, progress=_noop):
+    """
+    Añade o actualiza estudiantes desde un DataFrame. Los existentes se cargan
+    en una sola consulta en lugar de una por fila. Devuelve (añadidos, actualizados).
+    """
+    if not all(col in df.columns for col in REQUIRED_IMPORT_COLUMNS):
+        raise ValueError(f'El archivo debe contener las columnas: {", ".join(REQUIRED_IMPORT_COLUMNS)}')
+
+    ids = [int(v) for v in df['id']]
+    existing = {}
+    for start in range(0, len(ids), 1000):
+        chunk = ids[start:start + 1000]
+        existing.update({s.id: s for s in Student.query.filter(Student.id.in_(chunk))})
+
+    added_count = 0
+    updated_count = 0
+    total = len(df) or 1
+    for index, row in enumerate(df[REQUIRED_IMPORT_COLUMNS].itertuples(index=False)):
+        student_id = int(row.id)
+        student = existing.get(student_id)
+        if student: # Actualizar (y restaurar si estaba eliminado)
+            student.deleted_at = None
+            student.name = row.name
+            student.course = row.course
+            student.authorized = bool(row.authorized)
+            updated_count += 1
+        else: # Añadir
+            student = Student(
+                id=student_id,
+                name=row.name,
+                course=row.course,
+                authorized=bool(row.authorized)
+            )
+            db.session.add(student)
+            existing[student_id] = student
+            added_count += 1
+        if index % 500 == 0:
+            progress(int(90 * index / total), f'Procesando fila {index + 1} de {total}')
+    db.session.commit()
+    progress(100, f'{added_count} estudiantes añadidos, {updated_count} actualizados.')
+    return added_count, updated_count
+
+
+def write_qr_zip(students, output, progress=_noop):
+    """Escribe en `output` (ruta o archivo) un ZIP con un PNG de alta resolución por estudiante."""
+    total = len(students) or 1
+    with zipfile.ZipFile(output, 'w') as zipf:
+        for index, student in enumerate(students):
+            # Alta resolución (box_size=50: 21 módulos * 50 = 1050px) y borde mínimo
+            zipf.writestr(f"{student.id}.png", qr.png_bytes(qr.payload(student.id), box_size=50, border=1))
+            if index % 20 == 0:
+                progress(int(100 * index / total), f'Generando QR {index + 1} de {total}')
+    progress(100, f'{len(students)} códigos QR generados.')
+
+
+def qr_cache_dir():
+    return os.path.join(current_app.instance_path, 'qr_cache')
+
+
+def cached_qr_zip(students):
+    """
+    Devuelve (directorio, nombre) de un ZIP de QRs para la versión actual del
+    roster, generándolo solo si no existe. Las versiones anteriores se borran.
+    """
+    version, total = roster_state()
+    namespace = cache_namespace()
+    prefix = f'qrs-{namespace}-' if namespace else 'qrs-'
+    # El formato del contenido forma parte del nombre: cambiarlo regenera el ZIP
+    name = f'{prefix}{qr.payload_format()}-{version}-{total}.zip'
+    directory = qr_cache_dir()
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                write_qr_zip(students, fh)
+            os.replace(tmp_path, path)  # atómico: otro worker nunca ve un ZIP a medias
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        for old in os.listdir(directory):
+            if old.startswith(prefix) and old.endswith('.zip') and old != name:
+                os.unlink(os.path.join(directory, old))
+    return directory, name
+
+
+def report_exits(selected_date):
+    """Salidas del día local `selected_date` y sus horas locales ya formateadas."""
+    start_of_day_utc, end_of_day_utc = tz.day_bounds_utc(selected_date)
+    exits_for_date = Exit.query.options(
+        joinedload(Exit.door), joinedload(Exit.operator)
+    ).filter(
+        Exit.timestamp >= start_of_day_utc,
+        Exit.timestamp < end_of_day_utc
+    ).order_by(Exit.timestamp.asc()).all()
+    local_times = tz.to_local_series([e.timestamp for e in exits_for_date], fmt='%Y-%m-%d %H:%M:%S').tolist()
+    return exits_for_date, local_times
+
+
+def report_xlsx(selected_date, exits_for_date, local_times):
+    """Genera el XLSX del reporte diario y lo devuelve como bytes."""
+    data = {
+        'Fecha y Hora': local_times,
+        'ID Estudiante': [e.student_id for e in exits_for_date],
+        'Nombre Estudiante': [e.student_name for e in exits_for_date],
+        'Curso': [e.course for e in exits_for_date],
+        'Puerta': [e.door.name for e in exits_for_date],
+        'Operador': [e.operator.username for e in exits_for_date]
+    }
+    df = pd.DataFrame(data)
+    output = io.BytesIO()
+    writer = pd.ExcelWriter(output, engine='openpyxl')
+    df.to_excel(writer, index=False, sheet_name=f'Salidas_{selected_date.strftime("%Y-%m-%d")}')
+    writer.close()
+    return output.getvalue()
+
+
+def report_filename(selected_date):
+    return f"reporte_salidas_{selected_date.strftime('%Y-%m-%d')}.xlsx"
@@ -0,0 +1,145 @@
+# app/telemetry.py
+"""
+Telemetría de latencia de extremo a extremo de los escáneres.
+
+`scanner.js` mide cada escaneo (decodificación en la cámara, ida y vuelta de
+`/api/scan`, y carga de la foto) y envía los tiempos en lotes. El servidor
+añade `Server-Timing` a `/api/scan`, así que la red se obtiene como
+`rtt - server`. Los lotes llegan como listas compactas:
+
+    {"device": "a1b2c3d4", "samples": [[epoch_ms, door_id, status, decode, rtt, server, photo], ...]}
+
+Las muestras se guardan en `scan_timings` y se purgan tras `TELEMETRY_RETENTION_DAYS`.
+"""
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+import pandas as pd
+from flask import current_app, make_response
+from sqlalchemy import insert
+from .models import db, ScanTiming, Door
+
+MAX_BATCH = 200
+# Tiempos mayores se consideran basura (pestaña suspendida, reloj cambiado...)
+MAX_MS = 120000
+PERCENTILES = (0.5, 0.95)
+METRICS = ('decode_ms', 'network_ms', 'server_ms', 'photo_ms', 'total_ms')
+
+_last_purge = {'at': 0.0}
+
+
+def server_timing(f):
+    """Añade `Server-Timing: app;dur=<ms>` con el tiempo de la vista."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        started = time.perf_counter()
+        response = make_response(f(*args, **kwargs))
+        response.headers['Server-Timing'] = f'app;dur={(time.perf_counter() - started) * 1000:.1f}'
+        return response
+    return decorated_function
+
+
+def _ms(value):
+    if value is None:
+        return None
+    value = int(value)
+    return value if 0 <= value <= MAX_MS else None
+
+
+def parse_batch(payload):
+    """Valida un lote y devuelve las filas para `scan_timings`. ValueError si es inválido."""
+    if not isinstance(payload, dict):
+        raise ValueError('Lote inválido.')
+    device = str(payload.get('device') or '')[:16]
+    samples = payload.get('samples')
+    if not device or not isinstance(samples, list):
+        raise ValueError('Faltan device o samples.')
+    now = datetime.utcnow()
+    rows = []
+    for sample in samples[:MAX_BATCH]:
+        try:
+            epoch_ms, door_id, status, decode, rtt, server, photo = sample
+            recorded_at = datetime.utcfromtimestamp(int(epoch_ms) / 1000)
+            row = {
+                'recorded_at': recorded_at if recorded_at <= now else now,
+                'door_id': int(door_id) if door_id is not None else None,
+                'device': device,
+                'status': int(status),
+                'decode_ms': _ms(decode),
+                'rtt_ms': _ms(rtt),
+                'server_ms': _ms(server),
+                'photo_ms': _ms(photo),
+            }
+        except (TypeError, ValueError, OverflowError, OSError):
+            continue  # Se descarta la muestra, no el lote
+        rows.append(row)
+    return rows
+
+
+def store_batch(rows):
+    if rows:
+        db.session.execute(insert(ScanTiming), rows)
+        db.session.commit()
+    _maybe_purge()
+    return len(rows)
+
+
+def _maybe_purge():
+    # Como mucho una vez por hora y proceso
+    now = time.monotonic()
+    if now - _last_purge['at'] < 3600:
+        return
+    _last_purge['at'] = now
+    days = current_app.config.get('TELEMETRY_RETENTION_DAYS', 30)
+    ScanTiming.query.filter(ScanTiming.recorded_at < datetime.utcnow() - timedelta(days=days)).delete(
+        synchronize_session=False
+    )
+    db.session.commit()
+
+
+def load_frame(since, until=None):
+    columns = [ScanTiming.recorded_at, ScanTiming.door_id, ScanTiming.device, ScanTiming.status,
+               ScanTiming.decode_ms, ScanTiming.rtt_ms, ScanTiming.server_ms, ScanTiming.photo_ms]
+    query = db.session.query(*columns).filter(ScanTiming.recorded_at >= since)
+    if until is not None:
+        query = query.filter(ScanTiming.recorded_at < until)
+    df = pd.DataFrame(query.all(), columns=[c.key for c in columns])
+    for column in ('decode_ms', 'rtt_ms', 'server_ms', 'photo_ms'):
+        df[column] = pd.to_numeric(df[column], errors='coerce')
+    df['network_ms'] = (df['rtt_ms'] - df['server_ms']).clip(lower=0)
+    df['total_ms'] = df[['decode_ms', 'rtt_ms']].sum(axis=1, min_count=1) + df['photo_ms'].fillna(0)
+    return df
+
+
+def _summary(df, by):
+    if df.empty:
+        return []
+    grouped = df.groupby(by, dropna=False)
+    quantiles = grouped[list(METRICS)].quantile(list(PERCENTILES)).unstack()
+    counts = grouped.size()
+    errors = grouped['status'].apply(lambda s: int((s >= 500).sum() + (s == 0).sum()))
+    result = []
+    for key in counts.index:
+        row = {'key': key, 'count': int(counts[key]), 'errors': int(errors[key])}
+        for metric in METRICS:
+            for p in PERCENTILES:
+                value = quantiles.loc[key, (metric, p)]
+                row[f'{metric}_p{int(p * 100)}'] = None if pd.isna(value) else int(round(value))
+        result.append(row)
+    return sorted(result, key=lambda r: r['count'], reverse=True)
+
+
+def latency_stats(since, until=None):
+    """Percentiles p50/p95 por puerta y por dispositivo (y globales) en el rango."""
+    df = load_frame(since, until)
+    doors = dict(db.session.query(Door.id, Door.name))
+    by_door = _summary(df, 'door_id')
+    for row in by_door:
+        row['label'] = doors.get(row['key'], 'Sin puerta' if pd.isna(row['key']) else f"Puerta {row['key']}")
+    by_device = _summary(df, 'device')
+    for row in by_device:
+        row['label'] = row['key']
+    overall = _summary(df.assign(all='Todos'), 'all')
+    for row in overall:
+        row['label'] = row['key']
+    return {'count': len(df), 'overall': overall, 'by_door': by_door, 'by_device': by_device}
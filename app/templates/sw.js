@@ -1,13 +1,12 @@
-const CACHE_NAME = 'school-exit-control-v1';
-// Lista de archivos para cachear.
+const CACHE_NAME = 'school-exit-control-{{ cache_version }}';
+// Lista de archivos para cachear (PRECACHE_ASSETS en app/assets.py). La versión del
+// caché es un hash de su contenido, así que cualquier cambio en uno de ellos invalida
+// el caché anterior, con o sin `flask assets-build`.
 const urlsToCache = [
-    '/',
-    '/static/js/scanner.js',
-    '/static/audio/success.mp3',
-    '/static/audio/error.mp3',
-    'https://cdn.tailwindcss.com',
-    'https://unpkg.com/html5-qrcode/html5-qrcode.min.js',
-    'https://unpkg.com/alpinejs@3.x.x/dist/cdn.min.js'
+    '{{ url_for('routes.dashboard') }}',
+{%- for path in precache_assets %}
+    '{{ asset_url(path) }}'{{ ',' if not loop.last }}
+{%- endfor %}
 ];
 
 // Evento 'install': Se dispara cuando el service worker se instala.
@@ -0,0 +1,103 @@
+# app/tz.py
+"""
+Zona horaria local de la aplicación y ventanas de día en UTC.
+
+La base de datos guarda las fechas en UTC "naive". Aquí se concentra toda la
+conversión: el objeto de zona horaria se crea una sola vez, los límites de cada
+día se calculan (y cachean) en un único lugar, y las columnas completas de
+timestamps se convierten con una sola operación vectorizada de pandas.
+
+Los días se manejan como intervalos semiabiertos [inicio, inicio_del_día_siguiente)
+para que los días de 23 o 25 horas por cambio de horario queden bien cubiertos.
+"""
+from datetime import datetime, date, time, timedelta
+from functools import lru_cache
+import pandas as pd
+import pytz
+from flask import current_app
+
+
+@lru_cache(maxsize=8)
+def _zone(name):
+    try:
+        return pytz.timezone(name)
+    except pytz.UnknownTimeZoneError:
+        print(f"ADVERTENCIA: Zona horaria '{name}' no reconocida. Usando UTC por defecto.")
+        return pytz.utc
+
+
+def zone_name(app=None):
+    app = app or current_app
+    return app.config.get('LOCAL_TIMEZONE', 'UTC')
+
+
+def local_zone(app=None):
+    """Zona horaria configurada (cacheada)."""
+    return _zone(zone_name(app))
+
+
+def today_local():
+    return datetime.now(local_zone()).date()
+
+
+def _local_midnight_utc(tz, day):
+    local = tz.normalize(tz.localize(datetime.combine(day, time.min)))
+    return local.astimezone(pytz.utc).replace(tzinfo=None)
+
+
+@lru_cache(maxsize=512)
+def _day_bounds(name, day):
+    tz = _zone(name)
+    return _local_midnight_utc(tz, day), _local_midnight_utc(tz, day + timedelta(days=1))
+
+
+def day_bounds_utc(day):
+    """(inicio, fin) en UTC naive del día local `day`; usar `>= inicio` y `< fin`."""
+    return _day_bounds(zone_name(), day)
+
+
+def range_bounds_utc(start_day, end_day):
+    """(inicio, fin) en UTC naive que cubren los días locales `start_day`..`end_day` inclusive."""
+    return day_bounds_utc(start_day)[0], day_bounds_utc(end_day)[1]
+
+
+def to_local(utc_dt, tz=None):
+    """Convierte un datetime UTC naive a la zona local."""
+    if not isinstance(utc_dt, datetime):
+        return utc_dt
+    return utc_dt.replace(tzinfo=pytz.utc).astimezone(tz or local_zone())
+
+
+def to_local_series(values, fmt=None):
+    """
+    Convierte una columna de datetimes UTC naive a la zona local en una sola
+    operación. Con `fmt` devuelve las fechas ya formateadas como texto.
+    """
+    series = pd.Series(pd.to_datetime(list(values)), dtype='datetime64[ns]')
+    local = series.dt.tz_localize('UTC').dt.tz_convert(local_zone().zone)
+    if fmt:
+        return local.dt.strftime(fmt)
+    return local
+
+
+def local_series_to_utc(values):
+    """
+    Inverso de `to_local_series`: fechas/horas locales (texto o datetime) a UTC
+    naive, en una sola operación. Los valores inválidos, y las horas inexistentes
+    o ambiguas por cambio de horario, quedan como NaT.
+    """
+    series = pd.to_datetime(pd.Series(values), errors='coerce')
+    if series.dt.tz is not None:
+        return series.dt.tz_convert('UTC').dt.tz_localize(None)
+    local = series.dt.tz_localize(local_zone().zone, ambiguous='NaT', nonexistent='NaT')
+    return local.dt.tz_convert('UTC').dt.tz_localize(None)
+
+
+def init_app(app):
+    """Registra el filtro `localtime` en las plantillas."""
+    tz = local_zone(app)
+
+    @app.template_filter('localtime')
+    def localtime_filter(utc_dt):
+        # Devuelve el valor original si no es un objeto datetime
+        return to_local(utc_dt, tz)
@@ -5,6 +5,13 @@ from dotenv import load_dotenv
 basedir = os.path.abspath(os.path.dirname(__file__))
 load_dotenv()
 
+
+def _parse_mapping(value):
+    """Convierte 'a=1;b=2' en {'a': '1', 'b': '2'} (para variables de entorno)."""
+    pairs = (item.split('=', 1) for item in (value or '').split(';') if '=' in item)
+    return {k.strip(): v.strip() for k, v in pairs}
+
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'una-clave-secreta-muy-dificil-de-adivinar'
 
@@ -19,4 +26,82 @@ class Config:
     MAX_CONTENT_LENGTH = 5 * 1024 * 1024  # 5 MB
     UPLOAD_EXTENSIONS = ['.xlsx', '.xls']
     # Carpeta para guardar las fotos de los estudiantes
-    STUDENT_PHOTOS_FOLDER = 'student_photos'
\ No newline at end of file
+    STUDENT_PHOTOS_FOLDER = 'student_photos'
+
+    # --- Tabla de cooldown compartida entre workers (mmap) ---
+    # Solo habilitar si todas las puertas escriben contra este mismo host.
+    COOLDOWN_SHARED_TABLE = os.environ.get('COOLDOWN_SHARED_TABLE', '0') == '1'
+    COOLDOWN_TABLE_PATH = os.environ.get('COOLDOWN_TABLE_PATH')  # Por defecto: instance/cooldown.bin
+    COOLDOWN_TABLE_SIZE = int(os.environ.get('COOLDOWN_TABLE_SIZE', 200000))  # IDs de estudiante cubiertos
+    # Entradas más recientes que esto se creen sin consultar la DB (reservas aún sin guardar)
+    COOLDOWN_RESERVATION_GRACE_SECONDS = int(os.environ.get('COOLDOWN_RESERVATION_GRACE_SECONDS', 10))
+
+    # --- Borrado de estudiantes ---
+    # Con borrado lógico el estudiante se oculta pero se conserva su historial de salidas
+    STUDENT_SOFT_DELETE = os.environ.get('STUDENT_SOFT_DELETE', '0') == '1'
+
+    # --- Sedes (una base de datos por sede) ---
+    # CAMPUS_DATABASES="norte=mysql+pymysql://...;sur=mysql+pymysql://..."
+    CAMPUS_DATABASES = _parse_mapping(os.environ.get('CAMPUS_DATABASES'))
+    # CAMPUS_HOSTS="norte.colegio.edu=norte;sur.colegio.edu=sur"
+    CAMPUS_HOSTS = _parse_mapping(os.environ.get('CAMPUS_HOSTS'))
+    # Permite además elegir la sede con un prefijo en la URL: /norte/scan
+    CAMPUS_URL_PREFIX = os.environ.get('CAMPUS_URL_PREFIX', '0') == '1'
+
+    # --- Réplica de solo lectura (reportes, historial, dashboard) ---
+    SQLALCHEMY_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    # Retraso máximo tolerado antes de volver al primario (-1 deshabilita la guardia)
+    REPLICA_MAX_LAG_SECONDS = int(os.environ.get('REPLICA_MAX_LAG_SECONDS', 10))
+    REPLICA_LAG_CHECK_INTERVAL = 5  # segundos entre comprobaciones por proceso
+
+    # --- Trabajos en segundo plano (requiere `flask jobs-worker` en ejecución) ---
+    JOBS_BACKGROUND = os.environ.get('JOBS_BACKGROUND', '0') == '1'
+    JOBS_MAX_CONCURRENT = int(os.environ.get('JOBS_MAX_CONCURRENT', 2))
+    JOBS_RESULT_TTL_HOURS = 24
+    JOBS_STALE_MINUTES = 60
+
+    # --- Limitador de lecturas en /api/scan (límites en la tabla settings) ---
+    SCAN_RATE_LIMIT_ENABLED = os.environ.get('SCAN_RATE_LIMIT_ENABLED', '1') == '1'
+    SCAN_RATE_LIMIT_CACHE_SECONDS = 30
+
+    # --- Envío de archivos protegidos a través del proxy ---
+    # '' (el worker envía el archivo), 'x-sendfile' (Apache/lighttpd) o 'x-accel' (nginx)
+    SENDFILE_MODE = os.environ.get('SENDFILE_MODE', '')
+    # Ubicaciones `internal` de nginx para cada tipo de archivo (solo modo x-accel)
+    SENDFILE_ACCEL_LOCATIONS = _parse_mapping(
+        os.environ.get('SENDFILE_ACCEL_LOCATIONS',
+                       'photos=/_protected/photos/;jobs=/_protected/jobs/;qr_cache=/_protected/qr_cache/')
+    )
+
+    # --- Contenido de los QR: 'numeric' (ID + dígito de control) o 'json' (formato original) ---
+    QR_PAYLOAD_FORMAT = os.environ.get('QR_PAYLOAD_FORMAT', 'numeric')
+
+    # --- Modo sede remota (edge): sincronización con la instancia central ---
+    EDGE_CENTRAL_URL = os.environ.get('EDGE_CENTRAL_URL', '')
+    EDGE_TOKEN = os.environ.get('EDGE_TOKEN', '')  # Token creado en la central con el nombre de la sede
+    EDGE_SYNC_INTERVAL = int(os.environ.get('EDGE_SYNC_INTERVAL', 15))
+    EDGE_BATCH_SIZE = 500
+    EDGE_TIMEOUT = 30
+
+    # --- Carga masiva de fotos (ZIP con {student_id}.jpg) ---
+    PHOTO_ZIP_MAX_MB = int(os.environ.get('PHOTO_ZIP_MAX_MB', 500))
+    PHOTO_MAX_SIDE = 600  # px; las fotos se reducen a este lado máximo
+    PHOTO_JPEG_QUALITY = 85
+    PHOTO_MAX_FILE_BYTES = 15 * 1024 * 1024
+    PHOTO_WORKERS = int(os.environ.get('PHOTO_WORKERS', 0)) or None  # por defecto, según las CPUs
+
+    # --- Hash de contraseñas (ver app/passwords.py) ---
+    # Formato de werkzeug: 'scrypt', 'scrypt:16384:8:1', 'pbkdf2:sha256:600000'...
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    # Hashes simultáneos en todo el host (entre workers); los demás logins esperan su turno
+    PASSWORD_HASH_CONCURRENCY = int(os.environ.get('PASSWORD_HASH_CONCURRENCY', 2))
+    PASSWORD_HASH_WAIT_SECONDS = 10
+
+    # --- Workers gevent (ver gunicorn.conf.py) ---
+    # Greenlets por worker; el pool de conexiones se dimensiona con este valor
+    WORKER_CONNECTIONS = int(os.environ.get('WORKER_CONNECTIONS', 100))
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0)) or None  # por defecto, uno por greenlet
+    DB_POOL_TIMEOUT = 30
+
+    # --- Telemetría de latencia de los escáneres ---
+    TELEMETRY_RETENTION_DAYS = int(os.environ.get('TELEMETRY_RETENTION_DAYS', 30))
@@ -0,0 +1,21 @@
+# gunicorn.conf.py
+# Configuración de despliegue: `gunicorn run:app` la carga automáticamente.
+#
+#   GUNICORN_WORKER_CLASS=sync    workers clásicos, una petición por proceso (por defecto)
+#   GUNICORN_WORKER_CLASS=gevent  workers cooperativos, WORKER_CONNECTIONS peticiones por proceso
+#
+# Con gevent, gunicorn parchea la librería estándar al arrancar cada worker y
+# app/concurrency.py ajusta el driver de MySQL y el pool de conexiones.
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# La app lee el mismo valor (WORKER_CONNECTIONS) para dimensionar el pool
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 100))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = 5
+# Con gevent la app debe importarse después del parcheo, dentro de cada worker
+preload_app = False
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
@@ -16,6 +16,11 @@ logger = logging.getLogger('alembic.env')
 
 
 def get_engine():
+    # Con varias sedes (app/campus.py) se migra la base de la sede activa
+    from app.campus import current_campus, bind_key
+    campus = current_campus()
+    if campus:
+        return current_app.extensions['migrate'].db.engines[bind_key(campus)]
     try:
         # this works with Flask-SQLAlchemy<3 and Alchemical
         return current_app.extensions['migrate'].db.get_engine()
@@ -0,0 +1,65 @@
+# tests/conftest.py
+"""
+App sobre una base SQLite desechable, con datos mínimos:
+- admin/admin123 (administrador) y oper1/oper123 (operador)
+- puertas 'Puerta A' (1) y 'Puerta B' (2)
+- estudiantes 1-20, autorizados salvo los múltiplos de 3
+"""
+import pytest
+import config
+from app import create_app
+from app.models import db, User, Role, Door, Student
+from app.ratelimit import invalidate_limits
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Crea apps con la configuración de prueba más los valores indicados."""
+    apps = []
+
+    def factory(**overrides):
+        class TestConfig(config.Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'test.db')
+            WTF_CSRF_ENABLED = False
+            TESTING = True
+            COOLDOWN_SHARED_TABLE = False
+
+        for key, value in overrides.items():
+            setattr(TestConfig, key, value)
+        app = create_app(TestConfig, instance_path=str(tmp_path / 'instance'))
+        with app.app_context():
+            # Solo el primario: `db` es global y recuerda los binds (réplica) de otras apps
+            db.create_all(bind_key=None)
+            admin = User(username='admin', role=Role.ADMIN)
+            admin.set_password('admin123')
+            oper = User(username='oper1', role=Role.OPERATOR)
+            oper.set_password('oper123')
+            db.session.add_all([admin, oper, Door(name='Puerta A'), Door(name='Puerta B')])
+            db.session.add_all([
+                Student(id=i, name=f'Estudiante {i}', course='5° A', authorized=i % 3 != 0)
+                for i in range(1, 21)
+            ])
+            db.session.commit()
+        apps.append(app)
+        return app
+
+    invalidate_limits()
+    yield factory
+    for app in apps:
+        with app.app_context():
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+    invalidate_limits()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    return client
@@ -0,0 +1,35 @@
+# tests/test_cooldown.py
+import time
+from app import cooldown
+
+
+def test_overlapping_reservations_do_not_both_pass(app):
+    app.config['COOLDOWN_SHARED_TABLE'] = True
+    with app.app_context():
+        # Primer worker: reserva y todavía no ha guardado la salida
+        last, first = cooldown.check_cooldown(4, 60)
+        assert last is None and first is not None
+        # Segundo worker: la DB no ve la salida, pero la reserva es reciente
+        last, second = cooldown.check_cooldown(4, 60)
+        assert last is not None and second is None
+
+
+def test_stale_entry_is_reclaimed_after_grace(app):
+    app.config['COOLDOWN_SHARED_TABLE'] = True
+    with app.app_context():
+        table = cooldown.get_table()
+        # Reserva abandonada hace rato (sin salida en la DB ni `release`)
+        table.set(4, time.time() - app.config['COOLDOWN_RESERVATION_GRACE_SECONDS'] - 5)
+        last, token = cooldown.check_cooldown(4, 60)
+        assert last is None and token is not None
+        last, token = cooldown.check_cooldown(4, 60)
+        assert last is not None and token is None
+
+
+def test_release_frees_reservation(app):
+    app.config['COOLDOWN_SHARED_TABLE'] = True
+    with app.app_context():
+        _, token = cooldown.check_cooldown(4, 60)
+        cooldown.release(token)
+        last, token = cooldown.check_cooldown(4, 60)
+        assert last is None and token is not None
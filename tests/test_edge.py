@@ -0,0 +1,44 @@
+# tests/test_edge.py
+from datetime import datetime
+import pytest
+from app.models import db, ApiToken, Exit
+
+
+@pytest.fixture
+def edge_headers(app):
+    with app.app_context():
+        api_token, token = ApiToken.generate('norte', scope='edge')
+        db.session.add(api_token)
+        db.session.commit()
+    return {'Authorization': f'Bearer {token}'}
+
+
+def _row(local_id, student_id, timestamp):
+    return [local_id, student_id, f'Estudiante {student_id}', '5° A', 1, timestamp, 'oper1']
+
+
+def test_duplicate_local_ids_in_batch(app, edge_headers):
+    client = app.test_client()
+    rows = [_row(1, 4, '2024-05-02T12:00:00'), _row(1, 4, '2024-05-02T12:00:00'), _row(2, 5, '2024-05-02T12:01:00')]
+    response = client.post('/api/edge/exits', json={'exits': rows}, headers=edge_headers)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['accepted'], body['duplicates'], body['rejected']) == (2, 1, [])
+    with app.app_context():
+        assert Exit.query.count() == 2
+
+    # Reenviar el lote no duplica nada
+    response = client.post('/api/edge/exits', json={'exits': rows}, headers=edge_headers)
+    assert response.get_json()['accepted'] == 0
+    with app.app_context():
+        assert Exit.query.count() == 2
+
+
+def test_aware_timestamps_are_stored_as_utc(app, edge_headers):
+    client = app.test_client()
+    rows = [_row(1, 4, '2024-05-02T07:00:00-05:00'), _row(2, 5, '2024-05-02T12:00:00+00:00')]
+    response = client.post('/api/edge/exits', json={'exits': rows}, headers=edge_headers)
+    assert response.get_json()['accepted'] == 2
+    with app.app_context():
+        timestamps = {e.student_id: e.timestamp for e in Exit.query.all()}
+    assert timestamps == {4: datetime(2024, 5, 2, 12, 0), 5: datetime(2024, 5, 2, 12, 0)}
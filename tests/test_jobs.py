@@ -0,0 +1,19 @@
+# tests/test_jobs.py
+from app.models import db, Job
+
+
+def test_enqueue_from_replica_view(make_app, tmp_path):
+    # Réplica vacía (con el esquema): no ve el trabajo recién creado en el primario
+    app = make_app(JOBS_BACKGROUND=True, REPLICA_MAX_LAG_SECONDS=-1,
+                   SQLALCHEMY_REPLICA_URL='sqlite:///' + str(tmp_path / 'replica.db'))
+    with app.app_context():
+        db.metadata.create_all(db.engines['replica'])
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+
+    response = client.post('/report', data={'report_date': '2024-05-02', 'export': '1'})
+    assert response.status_code == 302
+    with app.app_context():
+        job = Job.query.one()
+        assert response.headers['Location'].endswith(f'/jobs/{job.id}')
+        assert job.kind == 'report_export'
@@ -0,0 +1,36 @@
+# tests/test_passwords.py
+import pytest
+from app import passwords
+
+pytestmark = pytest.mark.skipif(passwords.fcntl is None, reason='requiere fcntl')
+
+
+def test_slots_are_shared_between_processes(tmp_path):
+    # Cada HostSlots abre sus propios descriptores, como un worker distinto
+    first = passwords.HostSlots(str(tmp_path), 1)
+    second = passwords.HostSlots(str(tmp_path), 1)
+    token = first.acquire(timeout=0)
+    assert token is not None
+    assert second.acquire(timeout=0.05) is None
+    first.release(token)
+    assert second.acquire(timeout=0) is not None
+
+
+def test_slots_are_not_shared_between_threads(tmp_path):
+    slots = passwords.HostSlots(str(tmp_path), 2)
+    tokens = [slots.acquire(timeout=0), slots.acquire(timeout=0)]
+    assert None not in tokens
+    assert slots.acquire(timeout=0.05) is None
+
+
+def test_login_busy_when_host_slots_taken(app):
+    with app.app_context():
+        other_worker = passwords.HostSlots(app.instance_path, app.config['PASSWORD_HASH_CONCURRENCY'])
+        tokens = [other_worker.acquire(timeout=0) for _ in range(app.config['PASSWORD_HASH_CONCURRENCY'])]
+    app.config['PASSWORD_HASH_WAIT_SECONDS'] = 0.05
+    with app.app_context(), pytest.raises(passwords.HashBusy):
+        passwords.verify('pbkdf2:sha256:1$salt$hash', 'x')
+    for token in tokens:
+        other_worker.release(token)
+    with app.app_context():
+        assert passwords.verify('pbkdf2:sha256:1$salt$hash', 'x') is False
@@ -0,0 +1,39 @@
+# tests/test_scan.py
+from app import qr
+from app.models import db, Setting
+
+
+def test_rate_limit_student_from_qr_code(app, client):
+    with app.app_context():
+        db.session.add_all([
+            Setting(key='scan_limit_student', value='2/60'),
+            Setting(key='exit_cooldown_minutes', value='0'),
+        ])
+        db.session.commit()
+        code = qr.payload(4)
+    statuses = []
+    for door in (1, 2, 1):
+        response = client.post('/api/scan', json={'code': code, 'door': door})
+        statuses.append(response.status_code)
+    assert statuses == [200, 200, 429]
+    assert response.get_json()['limited_by'] == 'student'
+
+
+def test_parse_rejects_out_of_range_ids():
+    too_big = str(qr.MAX_STUDENT_ID + 1)
+    for text in (too_big + str(qr.check_digit(too_big)), '{"id": "99999999999999999999"}',
+                 '{"id": 99999999999999999999}', '{"id": 0}'):
+        try:
+            qr.parse(text)
+        except ValueError:
+            continue
+        raise AssertionError(f'{text!r} debería ser inválido')
+    assert qr.parse(str(qr.MAX_STUDENT_ID) + str(qr.check_digit(str(qr.MAX_STUDENT_ID)))) == qr.MAX_STUDENT_ID
+
+
+def test_scan_out_of_range_id_returns_400(client):
+    too_big = '9' * 20
+    for data in ({'code': too_big + str(qr.check_digit(too_big)), 'door': 1},
+                 {'code': '{"id": "99999999999999999999"}', 'door': 1},
+                 {'student_id': 2 ** 63, 'door': 1}):
+        assert client.post('/api/scan', json=data).status_code == 400
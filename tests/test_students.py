@@ -0,0 +1,18 @@
+# tests/test_students.py
+import pytest
+from app.models import db, Student
+
+
+@pytest.mark.parametrize('ids', ['123', 5, {'a': 1}, ['1', 'x'], [None], [2 ** 63], True])
+def test_bulk_authorization_rejects_invalid_ids(client, ids):
+    response = client.post('/api/students/bulk-authorization', json={'authorized': True, 'ids': ids})
+    assert response.status_code == 400
+
+
+def test_bulk_authorization_by_ids(app, client):
+    response = client.post('/api/students/bulk-authorization',
+                           json={'authorized': True, 'ids': [3, '6'], 'dry_run': False})
+    assert response.status_code == 200
+    assert response.get_json()['updated'] == 2
+    with app.app_context():
+        assert db.session.get(Student, 3).authorized and db.session.get(Student, 6).authorized